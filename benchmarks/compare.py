@@ -0,0 +1,176 @@
+"""
+Сравнение прогона бенчмарков с базовым: регрессии хранилища, проверки схемы,
+форматирования и обработчиков. Код возврата 1 - есть регрессии (для CI и скриптов).
+
+    python -m benchmarks.compare                                # последние прогоны всех наборов
+    python -m benchmarks.compare benchmarks/results/storage-20260101-120000.json
+    python -m benchmarks.compare new.json --baseline old.json --threshold 0.05
+    python -m benchmarks.compare new.json --save-baseline       # прогон становится базовым
+
+Базовые прогоны - benchmarks/baselines/<набор>.json (хранятся в git),
+прогоны - benchmarks/results/ (не в git).
+
+Замер считается регрессией, если среднее время выросло больше чем на
+--threshold и разница больше шума: --z стандартных ошибок разности средних
+(stdev/sqrt(count) обоих прогонов). Для замеров из одной операции шум
+неизвестен, и решает только порог.
+"""
+
+import argparse
+import json
+import math
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.storage import RESULTS_DIR
+
+BASELINES_DIR = Path(__file__).parent / "baselines"
+
+# Категории замеров по префиксу имени; последняя - все остальное
+CATEGORIES = (
+    ("проверка схемы", "validate_"),
+    ("форматирование", "format_"),
+    ("обработчики", "handler/"),
+    ("хранилище", ""),
+)
+
+
+def category(name: str) -> str:
+    for title, prefix in CATEGORIES:
+        if name.startswith(prefix):
+            return title
+    return CATEGORIES[-1][0]
+
+
+def load_report(path: Path) -> Dict[str, Any]:
+    with open(path, encoding='utf-8') as f:
+        report = json.load(f)
+    if "results" not in report or "suite" not in report:
+        raise ValueError(f"{path}: не похоже на результаты бенчмарка")
+    return report
+
+
+def latest_results() -> List[Path]:
+    """Последний прогон каждого набора в benchmarks/results/"""
+    latest: Dict[str, Path] = {}
+    for path in sorted(RESULTS_DIR.glob("*.json")):
+        try:
+            latest[load_report(path)["suite"]] = path
+        except (ValueError, OSError):
+            continue
+    return list(latest.values())
+
+
+def compare_result(base: Dict[str, float], new: Dict[str, float], threshold: float,
+                   z: float) -> Tuple[float, str]:
+    """Изменение среднего времени (доля) и вердикт: ok, шум, регрессия, ускорение"""
+    if not base.get("mean_ms"):
+        return 0.0, "ok"
+    change = (new["mean_ms"] - base["mean_ms"]) / base["mean_ms"]
+    if abs(change) <= threshold:
+        return change, "ok"
+
+    # Стандартная ошибка разности средних; без разброса (старые прогоны, одна операция) - только порог
+    errors = [
+        result.get("stdev_ms", 0) / math.sqrt(result["count"])
+        for result in (base, new) if result.get("count", 0) > 1
+    ]
+    noise = z * math.sqrt(sum(error ** 2 for error in errors)) if len(errors) == 2 else 0.0
+    if abs(new["mean_ms"] - base["mean_ms"]) <= noise:
+        return change, "шум"
+    return change, "регрессия" if change > 0 else "ускорение"
+
+
+def environment_warnings(base: Dict[str, Any], new: Dict[str, Any]) -> List[str]:
+    warnings = []
+    for key in ("python", "platform", "cpus", "iterations"):
+        if base.get(key) != new.get(key):
+            warnings.append(f"{key}: {base.get(key)} -> {new.get(key)}")
+    return warnings
+
+
+def compare_reports(base: Dict[str, Any], new: Dict[str, Any], threshold: float, z: float) -> int:
+    """Таблица сравнения; возвращает число регрессий"""
+    base_env, new_env = base.get("environment", {}), new.get("environment", {})
+    print(f"\nНабор {new['suite']}: {base_env.get('commit') or '?'} ({base.get('created_at', '')}) -> "
+          f"{new_env.get('commit') or '?'} ({new.get('created_at', '')})")
+    warnings = environment_warnings(base_env, new_env)
+    if warnings:
+        print(f"⚠️ Разное окружение, сравнение менее надежно: {'; '.join(warnings)}")
+
+    regressions = 0
+    current = None
+    names = sorted(set(base["results"]) | set(new["results"]), key=lambda name: (category(name), name))
+    for name in names:
+        if category(name) != current:
+            current = category(name)
+            print(f"\n  {current}")
+            print(f"  {'замер':<40}{'было, мс':>12}{'стало, мс':>12}{'изменение':>11}  вердикт")
+
+        base_result, new_result = base["results"].get(name), new["results"].get(name)
+        if base_result is None or new_result is None:
+            print(f"  {name:<40}{'новый' if base_result is None else 'нет в прогоне':>35}")
+            continue
+
+        change, verdict = compare_result(base_result, new_result, threshold, z)
+        regressions += verdict == "регрессия"
+        mark = {"регрессия": "❌ ", "ускорение": "✅ "}.get(verdict, "")
+        print(f"  {name:<40}{base_result['mean_ms']:>12.3f}{new_result['mean_ms']:>12.3f}"
+              f"{change * 100:>+10.1f}%  {mark}{verdict}")
+    return regressions
+
+
+def save_baseline(path: Path, report: Dict[str, Any]) -> Path:
+    target = BASELINES_DIR / f"{report['suite']}.json"
+    target.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(path, target)
+    print(f"Базовый прогон {report['suite']}: {target}")
+    return target
+
+
+def main(args) -> int:
+    paths = [Path(path) for path in args.results] or latest_results()
+    if not paths:
+        print(f"Нет результатов в {RESULTS_DIR}: запустите python -m benchmarks.storage")
+        return 2
+    if args.baseline and len(paths) != 1:
+        print("--baseline сравнивается с одним прогоном")
+        return 2
+
+    regressions = 0
+    compared = 0
+    for path in paths:
+        report = load_report(path)
+        if args.save_baseline:
+            save_baseline(path, report)
+            continue
+
+        baseline_path = Path(args.baseline) if args.baseline else BASELINES_DIR / f"{report['suite']}.json"
+        if not baseline_path.exists():
+            print(f"Нет базового прогона {baseline_path}: сохраните его через --save-baseline")
+            continue
+        regressions += compare_reports(load_report(baseline_path), report, args.threshold, args.z)
+        compared += 1
+
+    if args.save_baseline:
+        return 0
+    if not compared:
+        return 2
+    print(f"\n{'❌ Регрессий: ' + str(regressions) if regressions else '✅ Регрессий нет'} "
+          f"(порог {args.threshold * 100:.0f}%, шум {args.z:g}σ)")
+    return 1 if regressions else 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Сравнение прогона бенчмарков с базовым")
+    parser.add_argument("results", nargs="*", help="файлы прогонов (по умолчанию последние в benchmarks/results/)")
+    parser.add_argument("--baseline", help="базовый прогон (по умолчанию benchmarks/baselines/<набор>.json)")
+    parser.add_argument("--threshold", type=float, default=0.10, help="допустимое замедление, доля (0.10 = 10%%)")
+    parser.add_argument("--z", type=float, default=3.0, help="разница меньше z стандартных ошибок - шум")
+    parser.add_argument("--save-baseline", action="store_true", help="сохранить прогоны как базовые")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(parse_args()))
@@ -0,0 +1,328 @@
+"""
+Генератор синтетических карточек для бенчмарков и настройки хранилища:
+N карточек по схеме CARD_SCHEMA с заданным распределением городов, статусов,
+длины истории и медиа, кириллическими ФИО. Пишется в несколько процессов,
+counter.txt выставляется на последний номер.
+
+    python -m benchmarks.dataset --cards 9999 --data-dir /tmp/bot-data
+    python -m benchmarks.dataset --cards 5000 --data-dir /tmp/bot-data --moscow-share 0.7 \\
+        --statuses sent_to_review=0.6,approved=0.3,rejected=0.1 --history-mean 30 --media-share 0.4
+
+Схема допускает только 4 цифры в номере, поэтому CLI пишет не больше
+MAX_CARD_ID карточек: каталог остается рабочим, бот продолжает нумерацию
+с counter.txt. Больше карточек (generate_cards для сканирования в
+benchmarks.storage) - только во временный каталог, который бот не открывает:
+номер в карточке там повторяется по модулю 10000.
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+DEFAULT_STATUSES = "sent_to_review=0.45,approved=0.3,rejected=0.15,fio_added=0.05,city_selected=0.05"
+DECISIONS = {"approved": "approved", "rejected": "rejected"}
+MEDIA_TYPES = (("photo", 0.7), ("file", 0.2), ("voice", 0.1))
+CHUNK_SIZE = 2000
+MAX_CARD_ID = 9999  # Номер заявки - 4 цифры
+
+MALE_NAMES = ["Александр", "Дмитрий", "Максим", "Сергей", "Андрей", "Алексей", "Артем", "Илья",
+              "Кирилл", "Михаил", "Никита", "Матвей", "Роман", "Егор", "Иван", "Павел"]
+FEMALE_NAMES = ["Анастасия", "Мария", "Анна", "Виктория", "Екатерина", "Наталья", "Марина",
+                "Полина", "Дарья", "Алина", "Ксения", "Елена", "Ольга", "Татьяна", "Юлия", "Софья"]
+SURNAMES = ["Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов",
+            "Новиков", "Федоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семенов", "Егоров",
+            "Павлов", "Козлов", "Степанов", "Николаев", "Орлов", "Андреев", "Макаров", "Никитин"]
+PATRONYMICS = ["Александров", "Дмитриев", "Сергеев", "Андреев", "Алексеев", "Михайлов", "Иванов",
+               "Павлов", "Викторов", "Николаев", "Владимиров", "Юрьев"]
+TRANSLIT = dict(zip("абвгдеёжзийклмнопрстуфхцчшщъыьэюя",
+                    ["a", "b", "v", "g", "d", "e", "e", "zh", "z", "i", "y", "k", "l", "m", "n", "o",
+                     "p", "r", "s", "t", "u", "f", "kh", "ts", "ch", "sh", "shch", "", "y", "", "e",
+                     "yu", "ya"]))
+EXTRAS = ["Играю в баскетбол {years} лет", "Занимаюсь бегом, {years} года опыта",
+          "Раньше играл в школьной команде", "Хочу попробовать впервые", "КМС, {years} лет в спорте",
+          "Тренируюсь по выходным", ""]
+USER_MESSAGES = ["Добрый день! Когда будет решение?", "Спасибо", "Можно прийти с другом?",
+                 "Во сколько начало?", "Отправил фото", "Подскажите адрес", "Хорошо, понял"]
+
+
+def parse_distribution(text: str) -> Dict[str, float]:
+    """'approved=0.3,rejected=0.1' -> {"approved": 0.3, "rejected": 0.1}"""
+    result = {}
+    for part in text.split(","):
+        key, _, value = part.partition("=")
+        if key.strip():
+            result[key.strip()] = float(value or 1)
+    if not result or sum(result.values()) <= 0:
+        raise ValueError(f"Пустое распределение: {text!r}")
+    return result
+
+
+def transliterate(text: str) -> str:
+    return "".join(TRANSLIT.get(char, char) for char in text.lower())
+
+
+class CardFactory:
+    """Карточки со случайными, но воспроизводимыми (seed) данными"""
+
+    def __init__(self, seed: int = 0, moscow_share: float = 0.5, statuses: Optional[Dict[str, float]] = None,
+                 history_mean: float = 10, history_max: int = 1000, media_share: float = 0.3,
+                 days: int = 30, now: Optional[float] = None):
+        self.rng = random.Random(seed)
+        self.moscow_share = moscow_share
+        self.statuses = statuses or parse_distribution(DEFAULT_STATUSES)
+        self.history_mean = history_mean
+        self.history_max = history_max
+        self.media_share = media_share
+        self.days = days
+        self.now = now or time.time()
+
+    def fio(self) -> tuple:
+        rng = self.rng
+        female = rng.random() < 0.5
+        name = rng.choice(FEMALE_NAMES if female else MALE_NAMES)
+        surname = rng.choice(SURNAMES) + ("а" if female else "")
+        patronymic = rng.choice(PATRONYMICS) + ("на" if female else "ич")
+        return name, surname, f"{surname} {name} {patronymic}"
+
+    def entry(self, ts: float, source: str, entry_type: str, text: str = "", meta: dict = None) -> dict:
+        return {
+            # Как create_history_entry (ISO8601 UTC), но без datetime - в несколько раз быстрее
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(ts)) + f".{int(ts % 1 * 1e6):06d}Z",
+            "source": source,
+            "type": entry_type,
+            "text": text,
+            "meta": meta or {}
+        }
+
+    def history(self, card_id: int, city: str, fio: str, extra: str, status: str,
+                created: float) -> List[dict]:
+        rng = self.rng
+        ts = created
+
+        def step() -> float:
+            return ts + rng.uniform(5, 3600)
+
+        history = [self.entry(ts, "system", "command", f"Создана заявка. Город: {city}")]
+        if status == "city_selected":
+            return history
+
+        ts = step()
+        history.append(self.entry(ts, "user", "text", f"Введено ФИО: {fio}", {"message_id": card_id * 10 + 1}))
+        if status == "fio_added":
+            return history
+        ts = step()
+        history.append(self.entry(ts, "user", "text", f"Дополнительная информация: {extra}",
+                                  {"message_id": card_id * 10 + 2}))
+
+        # Переписка после отправки на модерацию: длинный хвост, как у реальных заявок
+        extra_entries = min(int(rng.expovariate(1 / self.history_mean)) if self.history_mean else 0,
+                            self.history_max)
+        media_types, media_weights = zip(*MEDIA_TYPES)
+        for n in range(extra_entries):
+            ts = step()
+            message_id = card_id * 10_000 + n
+            if rng.random() < self.media_share:
+                media_type = rng.choices(media_types, media_weights)[0]
+                caption = "" if media_type == "voice" or rng.random() < 0.6 else "фото с тренировки"
+                history.append(self.entry(ts, "user", media_type, caption, {
+                    "message_id": message_id,
+                    "file_id": f"AgAC{card_id:x}{n:x}{rng.getrandbits(64):016x}",
+                    "has_caption": bool(caption)
+                }))
+            elif rng.random() < 0.7:
+                history.append(self.entry(ts, "user", "text", rng.choice(USER_MESSAGES), {"message_id": message_id}))
+            else:
+                history.append(self.entry(ts, "admin", "command", "Сообщение от модератора: Уточните рост", {
+                    "admin_id": 900_000 + rng.randint(0, 5), "admin_username": "moderator", "command": "msg"
+                }))
+
+        if status in DECISIONS:
+            ts = step()
+            command = "approve" if status == "approved" else "reject"
+            history.append(self.entry(ts, "admin", "command",
+                                      "Заявка одобрена" if command == "approve" else "Заявка отклонена",
+                                      {"admin_id": 900_000, "admin_username": "moderator", "command": command}))
+        return history
+
+    def card(self, card_id: int) -> Dict[str, Any]:
+        rng = self.rng
+        user_id = 100_000_000 + card_id
+        number = str(card_id % 10000).zfill(4)
+        city = "Москва" if rng.random() < self.moscow_share else "Не Москва"
+        status = rng.choices(list(self.statuses), list(self.statuses.values()))[0]
+        name, surname, fio = self.fio()
+        extra = rng.choice(EXTRAS).format(years=rng.randint(1, 15))
+        created = self.now - rng.uniform(0, self.days * 86400)
+        history = self.history(card_id, city, fio, extra, status, created)
+
+        card = {
+            "id": card_id,
+            "version": len(history),
+            "number": number,
+            "city": city,
+            "fio": fio if status != "city_selected" else "",
+            "account_meta": {
+                "username": f"{transliterate(name)}_{transliterate(surname)}{card_id % 1000}",
+                "user_id": user_id,
+                "first_name": name,
+                "last_name": surname,
+                "language_code": "ru",
+                "is_premium": rng.random() < 0.05,
+                "is_bot": False,
+                "link": f"tg://user?id={user_id}",
+                "bio": rng.choice(["", "", "Люблю спорт", "Москва | баскетбол"]),
+                "additional_profile_info": "",
+                "profile_photo_file_id": f"AgACprofile{user_id:x}" if rng.random() < 0.7 else ""
+            },
+            "extra": extra if status not in ("city_selected", "fio_added") else "",
+            "status": status,
+            "decision": DECISIONS.get(status, "pending"),
+            "history": history
+        }
+        if status in DECISIONS:
+            card["outbox"] = [{
+                "id": f"{rng.getrandbits(48):012x}",
+                "chat_id": user_id,
+                "text": f"Ваша заявка [{number}] одобрена" if status == "approved"
+                        else f"К сожалению, заявка [{number}] отклонена.",
+                "status": "sent",
+                "attempts": 1,
+                "created_at": history[-1]["ts"],
+                "next_attempt_at": created,
+                "last_error": ""
+            }]
+        return card
+
+
+def write_chunk(cards_dir: str, first: int, count: int, seed: int, indent: Optional[int],
+                options: Dict[str, Any]) -> int:
+    """Запись карточек first..first+count-1 (в процессе пула); возвращает байты"""
+    factory = CardFactory(seed=seed * 1_000_003 + first, **options)
+    written = 0
+    for card_id in range(first, first + count):
+        data = json.dumps(factory.card(card_id), ensure_ascii=False, indent=indent)
+        with open(os.path.join(cards_dir, f"{str(card_id).zfill(4)}.json"), 'w', encoding='utf-8') as f:
+            written += f.write(data)
+    return written
+
+
+def generate_cards(cards_dir: Path, first: int, count: int, seed: int = 0,
+                   workers: Optional[int] = None, indent: Optional[int] = 2, **options) -> int:
+    """
+    Карточки first..first+count-1 в cards_dir, параллельно по CHUNK_SIZE.
+    Без fsync и проверки схемы. indent=2 - как пишет бот; indent=None
+    в несколько раз быстрее (json без отступов кодируется на C).
+    Возвращает объем записанного, байт
+    """
+    cards_dir.mkdir(parents=True, exist_ok=True)
+    options.setdefault("now", time.time())
+    chunks = [(first + i, min(CHUNK_SIZE, count - i)) for i in range(0, count, CHUNK_SIZE)]
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(chunks) == 1:
+        return sum(write_chunk(str(cards_dir), start, size, seed, indent, options) for start, size in chunks)
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        futures = [
+            pool.submit(write_chunk, str(cards_dir), start, size, seed, indent, options)
+            for start, size in chunks
+        ]
+        return sum(future.result() for future in futures)
+
+
+def write_counter(counter_file: Path, last_id: int) -> None:
+    """counter.txt - последний выданный номер: следующая заявка получит last_id + 1"""
+    counter_file.write_text(f"{last_id}\n")
+
+
+def read_counter(counter_file: Path) -> int:
+    try:
+        content = counter_file.read_text().strip()
+        return int(content) if content.isdigit() else 0
+    except FileNotFoundError:
+        return 0
+
+
+def validate_sample(cards_dir: Path, first: int, count: int, sample: int, seed: int = 0) -> List[str]:
+    """Проверка случайных карточек по схеме; возвращает ошибки"""
+    from bot.schemas import validate_card
+
+    errors = []
+    rng = random.Random(seed)
+    for card_id in rng.sample(range(first, first + count), min(sample, count)):
+        with open(cards_dir / f"{str(card_id).zfill(4)}.json", encoding='utf-8') as f:
+            is_valid, error = validate_card(json.load(f))
+        if not is_valid:
+            errors.append(f"{card_id}: {error}")
+    return errors
+
+
+def main(args) -> int:
+    # Config читает DATA_DIR при импорте
+    os.environ["DATA_DIR"] = str(Path(args.data_dir).resolve())
+    os.environ.setdefault("ENVIRONMENT", "benchmark")
+    from bot.config import Config
+
+    first = read_counter(Config.COUNTER_FILE) + 1 if args.start is None else args.start
+    last_id = first + args.cards - 1
+    if first < 1 or last_id > MAX_CARD_ID:
+        # Иначе дубли номеров в карточках и counter.txt, с которого бот не продолжит
+        print(f"Номера {first}..{last_id} вне 1..{MAX_CARD_ID}: бот не сможет работать с этим каталогом")
+        return 2
+    options = {
+        "moscow_share": args.moscow_share,
+        "statuses": parse_distribution(args.statuses),
+        "history_mean": args.history_mean,
+        "history_max": args.history_max,
+        "media_share": args.media_share,
+        "days": args.days,
+    }
+
+    started = time.perf_counter()
+    size = generate_cards(
+        Config.CARDS_DIR, first, args.cards, args.seed, args.workers, args.indent or None, **options
+    )
+    elapsed = time.perf_counter() - started
+    write_counter(Config.COUNTER_FILE, max(last_id, read_counter(Config.COUNTER_FILE)))
+
+    print(f"Карточек: {args.cards} ({first}..{last_id}) в {Config.CARDS_DIR}")
+    print(f"Время: {elapsed:.1f}с ({args.cards / elapsed:.0f} карточек/с), объем: {size / 1024 / 1024:.1f}МБ")
+    print(f"counter.txt: {read_counter(Config.COUNTER_FILE)}")
+
+    errors = validate_sample(Config.CARDS_DIR, first, args.cards, args.validate, args.seed)
+    if errors:
+        print(f"Не прошли проверку схемы ({len(errors)}):")
+        for error in errors[:10]:
+            print(f"  {error}")
+        return 1
+    print(f"Проверка схемы: {min(args.validate, args.cards)} случайных карточек - ок")
+    return 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Генератор синтетических карточек")
+    parser.add_argument("--cards", type=int, default=5000, help=f"число карточек (номера до {MAX_CARD_ID})")
+    parser.add_argument("--data-dir", required=True, help="каталог данных (cards/ и counter.txt)")
+    parser.add_argument("--start", type=int, help="первый номер (по умолчанию counter.txt + 1)")
+    parser.add_argument("--moscow-share", type=float, default=0.5, help="доля заявок из Москвы")
+    parser.add_argument("--statuses", default=DEFAULT_STATUSES, help="распределение статусов: status=доля,...")
+    parser.add_argument("--history-mean", type=float, default=10,
+                        help="среднее число записей истории после анкеты (экспоненциальное)")
+    parser.add_argument("--history-max", type=int, default=1000, help="максимум записей истории после анкеты")
+    parser.add_argument("--media-share", type=float, default=0.3, help="доля медиа среди записей истории")
+    parser.add_argument("--days", type=int, default=30, help="заявки за последние N дней")
+    parser.add_argument("--seed", type=int, default=0, help="seed генератора (одинаковый - одинаковые данные)")
+    parser.add_argument("--workers", type=int, help="процессов записи (по умолчанию - число CPU)")
+    parser.add_argument("--indent", type=int, default=2,
+                        help="отступ JSON (2 - как у бота, 0 - без отступов, быстрее)")
+    parser.add_argument("--validate", type=int, default=50, help="проверить по схеме N случайных карточек")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(parse_args()))
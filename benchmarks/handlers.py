@@ -0,0 +1,153 @@
+"""
+Бенчмарки форматирования и обработчиков: полный Application с заглушкой
+Bot API в том же процессе, обновления подаются в application.process_update
+по одному. Замер обработчика - от получения обновления до ответа в Bot API.
+
+    python -m benchmarks.handlers
+    python -m benchmarks.handlers --quick
+    python -m benchmarks.handlers --iterations 200 --output handlers.json
+
+Каталог данных - временный (или --data-dir), как у benchmarks.storage.
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import time
+from typing import Any, Callable, Dict
+
+from benchmarks.dataset import CardFactory
+from benchmarks.storage import measure, print_result, save_results, timing_stats, use_data_dir
+from tools.fake_bot_api import (
+    FAKE_BOT, FAKE_TOKEN, FakeBotApi, make_callback_update, make_chat, make_message_update
+)
+
+MODERATION_CHAT_ID = -1001234567890
+MODERATOR_ID = 900_000
+FIRST_USER_ID = 5_000_000
+
+
+def run_formatting(iterations: int) -> Dict[str, Dict]:
+    from bot.database import CardManager
+    from bot.utils import split_long_message
+
+    results: Dict[str, Dict] = {}
+
+    def record(name: str, operation: Callable[[int], Any], count: int) -> None:
+        results[name] = measure(operation, count)
+        print_result(name, results[name])
+
+    factory = CardFactory(seed=1, history_mean=50)
+    cards = [factory.card(card_id) for card_id in range(1, 1001)]
+    record("format_for_list", lambda i: CardManager.format_for_list(cards[i % len(cards)]), iterations * 20)
+    record("format_detailed", lambda i: CardManager.format_detailed(cards[i % len(cards)]), iterations * 20)
+
+    listing = "\n".join(CardManager.format_for_list(card) for card in cards)
+    record("format_split_long_message/cards=1000", lambda i: split_long_message(listing), iterations)
+    return results
+
+
+async def run_handlers(iterations: int) -> Dict[str, Dict]:
+    api = FakeBotApi()
+    await api.start()
+    os.environ["BOT_API_BASE_URL"] = api.base_url
+
+    # Импорт после настройки окружения: Config читает его при импорте
+    from telegram import Update
+    from bot.main import build_application
+
+    application = build_application(with_updater=False)
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+    results: Dict[str, Dict] = {}
+    update_ids = iter(range(1, 10 ** 9))
+    users = [FIRST_USER_ID + i for i in range(iterations)]
+    card_numbers: Dict[int, str] = {}
+
+    async def record(name: str, make_update: Callable[[int, int], dict]) -> None:
+        timings = []
+        for user_id in users:
+            update = Update.de_json(make_update(next(update_ids), user_id), application.bot)
+            started = time.perf_counter()
+            await application.process_update(update)
+            timings.append(time.perf_counter() - started)
+        results[name] = timing_stats(timings)
+        print_result(name, results[name])
+
+    def city(update_id: int, user_id: int) -> dict:
+        prompt = {"message_id": update_id, "date": int(time.time()), "chat": make_chat(user_id),
+                  "from": FAKE_BOT, "text": "Выбери город"}
+        return make_callback_update(update_id, user_id, "city_Москва", prompt)
+
+    def moderator_command(command: str) -> Callable[[int, int], dict]:
+        def make(update_id: int, user_id: int) -> dict:
+            return make_message_update(
+                update_id, MODERATOR_ID, f"/{command} {card_numbers[user_id]}", MODERATION_CHAT_ID
+            )
+        return make
+
+    try:
+        await record("handler/start", lambda update_id, user_id: make_message_update(update_id, user_id, "/start"))
+        await record("handler/city", city)
+
+        from bot.handlers import user_sessions
+        card_numbers.update({user_id: user_sessions[user_id]["card_number"] for user_id in users})
+
+        await record("handler/fio", lambda update_id, user_id: make_message_update(
+            update_id, user_id, f"Тестов Тест {user_id}"))
+        await record("handler/extra", lambda update_id, user_id: make_message_update(
+            update_id, user_id, "Играю в баскетбол 5 лет"))
+        await record("handler/user_message", lambda update_id, user_id: make_message_update(
+            update_id, user_id, "Когда будет решение?"))
+        await record("handler/info", moderator_command("info"))
+        await record("handler/approve", moderator_command("approve"))
+    finally:
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        await api.stop()
+    return results
+
+
+def main(args) -> int:
+    data_dir, created = use_data_dir(args.data_dir, "bot-bench-handlers-")
+    os.environ.update(
+        BOT_TOKEN=FAKE_TOKEN,
+        MODERATION_CHAT_ID=str(MODERATION_CHAT_ID),
+        METRICS_PORT="0",
+        RECORD_UPDATES="0",
+        SEND_GLOBAL_RATE="100000",
+        SEND_GROUP_RATE_PER_MINUTE="6000000",
+    )
+    iterations = 20 if args.quick else args.iterations
+
+    print(f"Каталог данных: {data_dir}")
+    try:
+        # Обработчики первыми: Config должен прочитать адрес заглушки Bot API
+        results = asyncio.run(run_handlers(iterations))
+        results.update(run_formatting(iterations))
+    finally:
+        if created and not args.keep:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    save_results("handlers", results, iterations, args.output)
+    return 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Бенчмарки форматирования и обработчиков")
+    parser.add_argument("--iterations", type=int, default=100, help="пользователей (обновлений на обработчик)")
+    parser.add_argument("--quick", action="store_true", help="быстрый прогон: 20 пользователей")
+    parser.add_argument("--data-dir", help="пустой каталог данных (по умолчанию временный)")
+    parser.add_argument("--keep", action="store_true", help="не удалять временный каталог данных")
+    parser.add_argument("--output", help="файл результатов (по умолчанию benchmarks/results/)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(parse_args()))
@@ -0,0 +1,233 @@
+"""
+Микробенчмарки хранилища карточек (CardManager, AtomicOperations, validate_card)
+на одноразовом каталоге данных. Каждый замер - ops/sec и p50/p99 одной операции,
+результаты сохраняются в JSON для сравнения изменений хранилища.
+
+    python -m benchmarks.storage
+    python -m benchmarks.storage --quick
+    python -m benchmarks.storage --sizes 1000,10000,100000 --output storage.json
+
+Каталог данных создается во временной папке и удаляется после прогона;
+--data-dir - пустой каталог, который после прогона остается. Сравнение с базовым прогоном:
+python -m benchmarks.compare.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.dataset import generate_cards
+from bot.stats import summarize
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+USER_DATA = {
+    "username": "bench_user",
+    "user_id": 100000,
+    "first_name": "Иван",
+    "last_name": "Петров",
+    "language_code": "ru",
+    "is_premium": False,
+    "is_bot": False,
+    "link": "tg://user?id=100000",
+    "bio": "Играю в баскетбол по выходным",
+    "additional_profile_info": "",
+    "profile_photo_file_id": ""
+}
+
+
+def timing_stats(timings: List[float]) -> Dict[str, float]:
+    """ops/sec, среднее, разброс и перцентили замеров в миллисекундах"""
+    summary = summarize(timings)
+    total = sum(timings)
+    return {
+        "count": summary["count"],
+        "ops_per_sec": round(summary["count"] / total, 2) if total else 0.0,
+        "mean_ms": round(summary["mean"] * 1000, 4),
+        "stdev_ms": round(statistics.stdev(timings) * 1000, 4) if len(timings) > 1 else 0.0,
+        "p50_ms": round(summary["p50"] * 1000, 4),
+        "p99_ms": round(summary["p99"] * 1000, 4),
+        "max_ms": round(summary["max"] * 1000, 4),
+    }
+
+
+def measure(operation: Callable[[int], Any], iterations: int) -> Dict[str, float]:
+    """Замер operation(i) iterations раз"""
+    timings = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        operation(i)
+        timings.append(time.perf_counter() - started)
+    return timing_stats(timings)
+
+
+def print_result(name: str, stats: Dict[str, float]) -> None:
+    print(f"{name:<40} {stats['ops_per_sec']:>10.1f} ops/s  "
+          f"p50 {stats['p50_ms']:>9.3f}мс  p99 {stats['p99_ms']:>9.3f}мс")
+
+
+def history(count: int) -> List[Dict[str, Any]]:
+    from bot.schemas import create_history_entry
+    return [
+        create_history_entry(source="user", entry_type="text", text=f"Сообщение пользователя {i}")
+        for i in range(count)
+    ]
+
+
+def run_benchmarks(iterations: int, history_sizes: List[int], scan_sizes: List[int],
+                   scan_repeats: int) -> Dict[str, Dict]:
+    # Импорт после выбора каталога данных: Config читает DATA_DIR при импорте
+    from bot.config import Config
+    from bot.database import AtomicOperations, CardManager
+    from bot.schemas import create_history_entry, validate_card
+
+    results: Dict[str, Dict] = {}
+
+    def record(name: str, operation: Callable[[int], Any], count: int) -> None:
+        results[name] = measure(operation, count)
+        print_result(name, results[name])
+
+    record("get_next_number", lambda i: AtomicOperations.get_next_number(), iterations)
+
+    created: List[str] = []
+
+    def create(i: int) -> None:
+        card = CardManager.create_card(USER_DATA, USER_DATA["user_id"], "Москва")
+        created.append(card["number"])
+
+    record("create_card", create, iterations)
+    record("load_card", lambda i: CardManager.load_card(created[i % len(created)]), iterations * 5)
+
+    card = CardManager.load_card(created[0])
+    card["history"] = history(50)
+    record("validate_card/history=50", lambda i: validate_card(card), iterations * 5)
+
+    # update_card: карточка с историей заданного размера, каждое обновление добавляет запись
+    entry = create_history_entry(source="admin", entry_type="text", text="Ответ модератора")
+    for size in history_sizes:
+        card_number = created[0]
+        CardManager.modify_card(card_number, lambda c, size=size: c.update(history=history(size)))
+        record(
+            f"update_card/history={size}",
+            lambda i: CardManager.update_card(card_number, {"extra": f"обновление {i}"}, entry),
+            iterations
+        )
+
+    # get_cards_by_city: полный проход по каталогу растущего размера.
+    # Каталог данных пуст до прогона, удаляются только созданные выше карточки
+    for card_number in created:
+        (Config.CARDS_DIR / f"{card_number}.json").unlink(missing_ok=True)
+    seeded = 0
+    for size in sorted(scan_sizes):
+        seed_started = time.perf_counter()
+        generate_cards(Config.CARDS_DIR, seeded + 1, size - seeded)
+        seeded = size
+        print(f"  (наполнение до {size} карточек: {time.perf_counter() - seed_started:.1f}с)")
+        record(
+            f"get_cards_by_city/cards={size}",
+            lambda i: CardManager.get_cards_by_city("Москва"),
+            scan_repeats if size <= 10000 else 1
+        )
+
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=10, cwd=Path(__file__).parent
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def save_results(suite: str, results: Dict[str, Dict], iterations: int, output: Optional[str]) -> Path:
+    """Результаты прогона с окружением (машина, Python, коммит) - в JSON"""
+    report = {
+        "suite": suite,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "commit": git_commit(),
+            "iterations": iterations,
+        },
+        "results": results,
+    }
+
+    path = Path(output) if output else (
+        RESULTS_DIR / f"{suite}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    print(f"\nРезультаты: {path}")
+    return path
+
+
+def use_data_dir(data_dir: Optional[str], prefix: str) -> Tuple[Path, bool]:
+    """
+    Каталог данных прогона; выставляется до импорта bot. Возвращает
+    (каталог, создан ли он здесь): удалять после прогона можно только
+    созданный временный. Каталог из --data-dir должен быть пустым -
+    бенчмарки не должны трогать рабочие данные
+    """
+    if data_dir:
+        path = Path(data_dir)
+        if path.exists() and any(path.iterdir()):
+            raise SystemExit(f"Каталог {path} не пуст: укажите пустой или новый каталог")
+        created = False
+    else:
+        path = Path(tempfile.mkdtemp(prefix=prefix))
+        created = True
+    os.environ["DATA_DIR"] = str(path)
+    os.environ.setdefault("ENVIRONMENT", "benchmark")  # Без отладочного вывода Config
+    return path, created
+
+
+def main(args) -> int:
+    data_dir, created = use_data_dir(args.data_dir, "bot-bench-")
+
+    iterations = 50 if args.quick else args.iterations
+    scan_sizes = [1000] if args.quick else [int(s) for s in args.sizes.split(",")]
+    history_sizes = [10, 1000] if args.quick else [int(s) for s in args.history.split(",")]
+    scan_repeats = 1 if args.quick else args.scan_repeats
+
+    print(f"Каталог данных: {data_dir}")
+    try:
+        results = run_benchmarks(iterations, history_sizes, scan_sizes, scan_repeats)
+    finally:
+        if created and not args.keep:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    save_results("storage", results, iterations, args.output)
+    return 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Микробенчмарки хранилища карточек")
+    parser.add_argument("--iterations", type=int, default=300, help="операций на замер")
+    parser.add_argument("--history", default="10,100,1000", help="размеры истории для update_card")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="число карточек для get_cards_by_city")
+    parser.add_argument("--scan-repeats", type=int, default=3,
+                        help="проходов get_cards_by_city до 10k карточек (дальше - один)")
+    parser.add_argument("--quick", action="store_true", help="быстрый прогон: 50 операций, 1k карточек")
+    parser.add_argument("--data-dir", help="пустой каталог данных (по умолчанию временный)")
+    parser.add_argument("--keep", action="store_true", help="не удалять временный каталог данных")
+    parser.add_argument("--output", help="файл результатов (по умолчанию benchmarks/results/)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(parse_args()))
@@ -0,0 +1,231 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import Config
+from .database import AtomicOperations, CardManager
+from .schemas import create_history_entry
+from .sender import Priority, send_queue
+
+logger = logging.getLogger(__name__)
+
+CITY_FILTERS = {"moscow": "Москва", "nomoscow": "Не Москва", "all": None}
+BROADCAST_ID_RE = re.compile(r"^\d+$")
+STATUSES = [
+    "new", "city_selected", "fio_added", "extra_added",
+    "sent_to_review", "approved", "rejected"
+]
+
+
+def parse_filter(text: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Фильтр рассылки "город[:статус]": moscow, nomoscow:approved, all:rejected.
+    Возвращает (город, статус); ValueError - неизвестный фильтр
+    """
+    city_key, _, status = text.lower().partition(":")
+    if city_key not in CITY_FILTERS:
+        raise ValueError(f"Неизвестный город: {city_key}. Варианты: {', '.join(CITY_FILTERS)}")
+    if status and status not in STATUSES:
+        raise ValueError(f"Неизвестный статус: {status}. Варианты: {', '.join(STATUSES)}")
+    return CITY_FILTERS[city_key], status or None
+
+
+def resolve_recipients(city: Optional[str], status: Optional[str]) -> List[str]:
+    """Номера карточек получателей: по одной (последней) на пользователя"""
+    latest: Dict[int, str] = {}
+    for card in CardManager.query_cards(city, status):
+        latest[card["account_meta"]["user_id"]] = card["number"]
+    return sorted(latest.values())
+
+
+class BroadcastManager:
+    """
+    Рассылки по заявкам. Задание и прогресс хранятся в data/broadcasts/<id>.json
+    и сохраняются после каждой пачки получателей - после рестарта рассылка
+    продолжается с места остановки (resume). Отправка - через общую очередь
+    с приоритетом LOW, поэтому ответы модераторам и решения идут первыми
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.bot = None
+
+    @staticmethod
+    def _path(broadcast_id: str):
+        # id приходит из аргументов команд: только цифры, без выхода из каталога
+        if not BROADCAST_ID_RE.match(broadcast_id):
+            raise ValueError(f"Неверный id рассылки: {broadcast_id}")
+        return Config.BROADCASTS_DIR / f"{broadcast_id}.json"
+
+    def _reserve_id(self, broadcast_id: str) -> str:
+        """Атомарный захват id: файл создается с O_EXCL, параллельные create не совпадут"""
+        while True:
+            try:
+                os.close(os.open(self._path(broadcast_id), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return broadcast_id
+            except FileExistsError:
+                broadcast_id = str(int(broadcast_id) + 1)
+
+    def load(self, broadcast_id: str) -> Optional[Dict[str, Any]]:
+        if not BROADCAST_ID_RE.match(broadcast_id):
+            return None
+        try:
+            with open(self._path(broadcast_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def save(self, job: Dict[str, Any]) -> bool:
+        return AtomicOperations.write_json_atomic(self._path(job["id"]), job, validate=False)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        jobs = [self.load(path.stem) for path in Config.BROADCASTS_DIR.glob("*.json")]
+        return sorted((job for job in jobs if job), key=lambda job: job["id"])
+
+    async def create(self, bot, filter_text: str, text: str, admin_id: int) -> Dict[str, Any]:
+        """Создание задания рассылки (ValueError - неверный фильтр) и запуск"""
+        city, status = parse_filter(filter_text)
+        recipients = await asyncio.to_thread(resolve_recipients, city, status)
+
+        job = {
+            "id": datetime.now().strftime("%Y%m%d%H%M%S"),
+            "filter": filter_text,
+            "text": text,
+            "admin_id": admin_id,
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "status": "running",
+            "recipients": recipients,
+            "done": 0,  # Курсор: обработано получателей
+            "sent": 0,
+            "failed": {}
+        }
+        job["id"] = await asyncio.to_thread(self._reserve_id, job["id"])
+
+        await asyncio.to_thread(self.save, job)
+        self.start(bot, job)
+        return job
+
+    def start(self, bot, job: Dict[str, Any]) -> None:
+        self.bot = bot
+        task = asyncio.get_running_loop().create_task(self._run(job))
+        self._tasks[job["id"]] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job["id"], None))
+
+    async def resume(self, bot) -> int:
+        """Продолжение незавершенных рассылок после рестарта"""
+        jobs = [job for job in await asyncio.to_thread(self.list_jobs) if job["status"] == "running"]
+        for job in jobs:
+            logger.info(f"Рассылка {job['id']}: продолжение с {job['done']}/{len(job['recipients'])}")
+            self.start(bot, job)
+        return len(jobs)
+
+    async def cancel(self, broadcast_id: str) -> bool:
+        job = await asyncio.to_thread(self.load, broadcast_id)
+        if not job or job["status"] != "running":
+            return False
+
+        task = self._tasks.get(broadcast_id)
+        if task:
+            task.cancel()
+            # Дожидаемся сохранения прогресса задачей
+            await asyncio.gather(task, return_exceptions=True)
+            job = await asyncio.to_thread(self.load, broadcast_id)
+
+        job["status"] = "cancelled"
+        await asyncio.to_thread(self.save, job)
+        return True
+
+    async def _send_batch(self, job: Dict[str, Any], card_numbers: List[str]) -> List[str]:
+        """Отправка пачки; возвращает номера карточек, получивших сообщение"""
+        cards = await asyncio.to_thread(CardManager.load_cards, card_numbers)
+
+        futures = {}
+        for card_number, card in cards.items():
+            if not card:
+                job["failed"][card_number] = "заявка не найдена"
+                continue
+            futures[card_number] = send_queue.send_message(
+                self.bot, card["account_meta"]["user_id"], job["text"], Priority.LOW
+            )
+
+        results = await asyncio.gather(*futures.values(), return_exceptions=True)
+
+        delivered = []
+        for card_number, result in zip(futures, results):
+            if isinstance(result, Exception):
+                job["failed"][card_number] = str(result)
+            else:
+                delivered.append(card_number)
+        return delivered
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        total = len(job["recipients"])
+        started = time.monotonic()
+
+        history_entry = create_history_entry(
+            source="admin",
+            entry_type="text",
+            text=job["text"],
+            meta={"admin_id": job["admin_id"], "broadcast_id": job["id"]}
+        )
+
+        # Отмена или остановка бота прерывает цикл; прогресс сохранен после последней пачки
+        while job["done"] < total:
+            batch = job["recipients"][job["done"]:job["done"] + Config.BROADCAST_BATCH_SIZE]
+            delivered = await self._send_batch(job, batch)
+
+            # История пачки - одним пакетным обновлением
+            if delivered:
+                await CardManager.update_cards_async(
+                    {card_number: ({}, history_entry, None) for card_number in delivered}
+                )
+
+            job["sent"] += len(delivered)
+            job["done"] += len(batch)
+            await asyncio.to_thread(self.save, job)
+
+            if job["done"] < total and job["done"] % Config.BROADCAST_PROGRESS_EVERY < len(batch):
+                await self._report(f"Рассылка {job['id']}: {job['done']}/{total}, ошибок {len(job['failed'])}")
+
+        job["status"] = "done"
+        await asyncio.to_thread(self.save, job)
+
+        elapsed = time.monotonic() - started
+        logger.info(f"Рассылка {job['id']} завершена: {job['sent']}/{total} за {elapsed:.1f}с")
+        await self._report(self.format_status(job))
+
+    async def _report(self, text: str) -> None:
+        try:
+            await send_queue.send_message(self.bot, Config.MODERATION_CHAT_ID, text, Priority.HIGH)
+        except Exception as e:
+            logger.error(f"Не удалось отправить отчет о рассылке: {e}")
+
+    @staticmethod
+    def format_status(job: Dict[str, Any]) -> str:
+        """Отчет о рассылке для модераторов"""
+        total = len(job["recipients"])
+        lines = [
+            f"Рассылка {job['id']} ({job['filter']}): {job['status']}",
+            f"Обработано: {job['done']}/{total}, доставлено: {job['sent']}, ошибок: {len(job['failed'])}"
+        ]
+        for card_number, error in list(job["failed"].items())[:20]:
+            lines.append(f"[{card_number}] {error}")
+        if len(job["failed"]) > 20:
+            lines.append(f"... и еще {len(job['failed']) - 20}")
+        return "\n".join(lines)
+
+    async def close(self) -> None:
+        """Остановка рассылок; задания со статусом running продолжатся при запуске"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Глобальный менеджер рассылок
+broadcasts = BroadcastManager()
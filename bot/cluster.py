@@ -0,0 +1,267 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+from typing import List, Optional
+
+from telegram import Bot, Update
+from telegram.error import NetworkError, RetryAfter, TimedOut
+
+from .config import Config
+from .database import write_fence
+from .leader import (
+    CardTailer, LeaderLease, keep_leadership, registration_conversation, wait_for_leadership, warm_sessions
+)
+from .lifecycle import run_application, stop_event_from_signals
+from .recorder import update_recorder
+from .sender import retry_after_seconds
+from .tracing import trace_log
+from .webhook import build_webhook_server, set_webhook
+
+logger = logging.getLogger(__name__)
+
+
+def worker_port(index: int) -> int:
+    """Порт воркера на localhost"""
+    return Config.CLUSTER_BASE_PORT + index
+
+
+def route_update(data: dict, workers: int) -> int:
+    """
+    Номер воркера для обновления: группа модерации - выделенному воркеру,
+    остальное - по user_id % N (сессии пользователя живут в одном процессе)
+    """
+    update = Update.de_json(data, None)
+    chat = update.effective_chat
+    if chat and chat.id == Config.MODERATION_CHAT_ID:
+        return Config.CLUSTER_ADMIN_WORKER % workers
+
+    user = update.effective_user
+    if user:
+        return user.id % workers
+    if chat:
+        return abs(chat.id) % workers
+    return 0
+
+
+# ============================= ВОРКЕР =============================
+
+def worker_main(index: int, workers: int, epoch: Optional[int] = None) -> None:
+    """Точка входа процесса-воркера; epoch - fencing token lease ingress"""
+    from .main import build_application, setup_logging
+
+    logger = setup_logging(suffix=f"-worker{index}")
+    if Config.METRICS_PORT:
+        Config.METRICS_PORT += index
+    update_recorder.path = Config.RECORD_FILE.with_name(f"updates-worker{index}.jsonl")
+    # Ротация одного файла из нескольких процессов небезопасна
+    trace_log.path = Config.TRACE_LOG_FILE.with_name(f"traces-worker{index}.jsonl")
+    # Решения и outbox пишутся, только пока ingress держит lease с этим epoch
+    write_fence.epoch = epoch
+    logger.info(f"Воркер {index}/{workers} запускается на порту {worker_port(index)}")
+    application = build_application(
+        with_updater=False,
+        outbox_owner=index == Config.CLUSTER_ADMIN_WORKER % workers
+    )
+    asyncio.run(serve_worker(application, index))
+
+
+async def serve_worker(application, index: int) -> None:
+    """Прием обновлений от ingress (JSON построчно по TCP) в очередь Application"""
+    stop_event = stop_event_from_signals()
+    server = None
+
+    async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while line := await reader.readline():
+                data = json.loads(line)
+                await application.update_queue.put(Update.de_json(data, application.bot))
+        except (ConnectionError, ValueError) as e:
+            logger.error(f"Воркер {index}: ошибка соединения с ingress: {e}")
+        finally:
+            writer.close()
+
+    async def setup() -> None:
+        nonlocal server
+        # Сессии пользователей своего шарда после рестарта или смены лидера
+        await warm_sessions(
+            CardTailer(), shard=(index, Config.WORKERS), conversation=registration_conversation(application)
+        )
+        server = await asyncio.start_server(handle_connection, "127.0.0.1", worker_port(index))
+
+    async def teardown() -> None:
+        if server:
+            server.close()
+            await server.wait_closed()
+
+    await run_application(application, stop_event, setup, teardown)
+
+
+# ============================= INGRESS =============================
+
+class WorkerLink:
+    """Соединение ingress -> воркер; порядок обновлений сохраняется"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.writer = None
+        self.lock = asyncio.Lock()
+        self.sent = 0
+        self.failed = 0
+
+    async def send(self, data: dict) -> None:
+        """Передача обновления воркеру; ConnectionError - воркер так и не ответил"""
+        line = (json.dumps(data, ensure_ascii=False) + "\n").encode("utf-8")
+
+        async with self.lock:
+            for attempt in range(Config.CLUSTER_CONNECT_RETRIES):
+                try:
+                    if self.writer is None or self.writer.is_closing():
+                        _, self.writer = await asyncio.open_connection("127.0.0.1", worker_port(self.index))
+                    self.writer.write(line)
+                    await self.writer.drain()
+                    self.sent += 1
+                    return
+                except OSError as e:
+                    self.writer = None
+                    logger.warning(f"Воркер {self.index} недоступен ({e}), попытка {attempt + 1}")
+                    await asyncio.sleep(min(0.1 * 2 ** attempt, 2.0))
+
+        self.failed += 1
+        raise ConnectionError(f"воркер {self.index} недоступен")
+
+    async def close(self) -> None:
+        if self.writer:
+            self.writer.close()
+
+
+class Supervisor:
+    """Ingress процесс: получает обновления и раздает их N воркерам"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.context = multiprocessing.get_context("spawn")
+        self.processes: List = [None] * workers
+        self.links = [WorkerLink(i) for i in range(workers)]
+        self.stopping = False
+        self.epoch: Optional[int] = None  # Fencing token для воркеров при выборе лидера
+
+    def start_worker(self, index: int) -> None:
+        process = self.context.Process(
+            target=worker_main,
+            args=(index, self.workers, self.epoch),
+            name=f"bot-worker-{index}"
+        )
+        process.start()
+        self.processes[index] = process
+        logger.info(f"Запущен воркер {index} (pid {process.pid})")
+
+    async def deliver(self, data: dict) -> None:
+        await self.links[route_update(data, self.workers)].send(data)
+
+    async def watch_workers(self) -> None:
+        """Перезапуск упавших воркеров"""
+        while not self.stopping:
+            await asyncio.sleep(1)
+            for index, process in enumerate(self.processes):
+                if not self.stopping and not process.is_alive():
+                    logger.error(f"Воркер {index} завершился с кодом {process.exitcode}, перезапуск")
+                    self.start_worker(index)
+
+    async def poll(self, bot: Bot) -> None:
+        """Long polling в ingress процессе"""
+        await bot.delete_webhook()
+        offset = 0
+        while not self.stopping:
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=30, allowed_updates=Update.ALL_TYPES)
+            except RetryAfter as e:
+                await asyncio.sleep(retry_after_seconds(e))
+                continue
+            except (NetworkError, TimedOut) as e:
+                logger.warning(f"Ошибка getUpdates: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            for update in updates:
+                try:
+                    await self.deliver(update.to_dict())
+                except ConnectionError as e:
+                    # offset не сдвигаем: обновление вернется в следующем getUpdates,
+                    # к тому времени watch_workers перезапустит воркер
+                    logger.error(f"Обновление {update.update_id} не доставлено ({e}), повтор")
+                    await asyncio.sleep(1)
+                    break
+                offset = update.update_id + 1
+
+    async def run(self) -> int:
+        stop_event = stop_event_from_signals()
+
+        # Standby ingress не запускает воркеров до получения lease
+        lease = None
+        heartbeat = None
+        if Config.LEADER_ELECTION:
+            lease = LeaderLease(Config.LEADER_LEASE_FILE, Config.LEADER_LEASE_TTL)
+            if not await wait_for_leadership(lease, stop_event):
+                return 0
+            self.epoch = lease.epoch
+            heartbeat = asyncio.create_task(keep_leadership(lease, stop_event))
+
+        for index in range(self.workers):
+            self.start_worker(index)
+        watcher = asyncio.create_task(self.watch_workers())
+
+        bot = Bot(Config.BOT_TOKEN, base_url=Config.BOT_API_BASE_URL)
+        await bot.initialize()
+        webhook_server = None
+        poller = None
+
+        try:
+            if Config.UPDATE_MODE == "webhook":
+                webhook_server = build_webhook_server(self.deliver)
+                await webhook_server.start()
+                await set_webhook(bot)
+            else:
+                poller = asyncio.create_task(self.poll(bot))
+
+            await stop_event.wait()
+        finally:
+            self.stopping = True
+            watcher.cancel()
+            if poller:
+                poller.cancel()
+            if webhook_server:
+                await webhook_server.stop()
+            for link in self.links:
+                await link.close()
+            await bot.shutdown()
+            await asyncio.to_thread(self.stop_workers)
+            if heartbeat:
+                heartbeat.cancel()
+            if lease and not lease.lost:
+                await asyncio.to_thread(lease.release)
+
+        return 1 if lease and lease.lost else 0
+
+    def stop_workers(self) -> None:
+        """SIGTERM воркерам и ожидание корректного завершения"""
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        for index, process in enumerate(self.processes):
+            process.join(Config.CLUSTER_STOP_TIMEOUT)
+            if process.is_alive():
+                logger.error(f"Воркер {index} не остановился, kill")
+                process.kill()
+
+
+def run_supervisor() -> int:
+    """Запуск кластера: ingress + Config.WORKERS воркеров"""
+    workers = Config.WORKERS
+
+    # Лимиты Telegram общие на бота: делим их между воркерами
+    os.environ["SEND_GLOBAL_RATE"] = str(Config.SEND_GLOBAL_RATE / workers)
+    os.environ["SEND_GROUP_RATE_PER_MINUTE"] = str(Config.SEND_GROUP_RATE_PER_MINUTE / workers)
+
+    return asyncio.run(Supervisor(workers).run())
@@ -12,15 +12,25 @@ class Config:
     BASE_DIR = Path(__file__).parent.parent
 
     # ПАПКИ ПО ТЗ - для разработки на Windows
-    DATA_DIR = BASE_DIR / "data"
+    # DATA_DIR из окружения - отдельный каталог данных (бенчмарки, стенды)
+    DATA_DIR = Path(os.getenv("DATA_DIR", BASE_DIR / "data"))
     CARDS_DIR = DATA_DIR / "cards"
     LOGS_DIR = DATA_DIR / "logs"
     TMP_DIR = DATA_DIR / "tmp"
+    LOCKS_DIR = TMP_DIR / "locks"
+    BROADCASTS_DIR = DATA_DIR / "broadcasts"
     COUNTER_FILE = DATA_DIR / "counter.txt"
+    MESSAGE_INDEX_FILE = DATA_DIR / "message_index.jsonl"
+    TRACE_LOG_FILE = LOGS_DIR / "traces.jsonl"
+    RECORDINGS_DIR = DATA_DIR / "recordings"
+    RECORD_FILE = RECORDINGS_DIR / "updates.jsonl"
 
     # Токен бота (ОБЯЗАТЕЛЬНО заполнить в .env)
     BOT_TOKEN = os.getenv("BOT_TOKEN", "")
 
+    # Адрес Bot API (для локального Bot API сервера или заглушки в тестах)
+    BOT_API_BASE_URL = os.getenv("BOT_API_BASE_URL", "https://api.telegram.org/bot")
+
     # ID группы модерации
     MODERATION_CHAT_ID = int(os.getenv("MODERATION_CHAT_ID", "-1000000000000"))
 
@@ -37,13 +47,107 @@ class Config:
     # Регулярные выражения ТОЧНО ПО ТЗ
     INFO_PATTERN = r"^/info\s+(\d{1,4})$"
     MSG_PATTERN = r"^/msg\s+(\d{1,4})\s+(.+)$"
-    APPROVE_PATTERN = r"^/approve\s+(\d{1,4})$"
-    REJECT_PATTERN = r"^/reject\s+(\d{1,4})$"
+    APPROVE_PATTERN = r"^/approve\s+([\d\s,-]+)$"  # Номера и диапазоны: /approve 12 15 20-35
+    REJECT_PATTERN = r"^/reject\s+([\d\s,-]+)$"
+
+    # Режим получения обновлений: polling или webhook
+    UPDATE_MODE = os.getenv("UPDATE_MODE", "polling")
+
+    # Webhook: встроенный HTTP сервер (TLS завершается на nginx перед ним)
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # Публичный https URL для setWebhook
+    WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+    WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+
+    # Параллельная обработка обновлений (порядок по пользователю и заявке сохраняется)
+    UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "16"))
+    UPDATE_MAX_PENDING = 10000
+
+    # Кластер: ingress процесс + WORKERS воркеров (шардирование по user_id)
+    WORKERS = int(os.getenv("WORKERS", "1"))
+    CLUSTER_BASE_PORT = int(os.getenv("CLUSTER_BASE_PORT", "8600"))  # Воркер i слушает порт base + i
+    CLUSTER_ADMIN_WORKER = 0  # Воркер для команд из группы модерации
+    CLUSTER_CONNECT_RETRIES = 10
+    CLUSTER_STOP_TIMEOUT = 15  # секунд
+
+    # Метрики Prometheus: GET http://METRICS_LISTEN:METRICS_PORT/metrics (0 - выключено).
+    # Воркер кластера i слушает METRICS_PORT + i
+    METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+    # Монитор задержки event loop: блокирующие вызовы в обработчиках
+    LOOP_MONITOR = os.getenv("LOOP_MONITOR", "1") == "1"
+    LOOP_MONITOR_INTERVAL = 0.05  # Период замера, секунд
+    LOOP_LAG_THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD", "0.1"))  # секунд; дольше - блокировка со стеком
+    LOOP_LAG_REPORT_INTERVAL = 300  # Перцентили задержки в лог, секунд
+
+    # Профилирование по /profile и SIGUSR1 (результат - в data/logs и группу модерации)
+    PROFILE_DEFAULT_SECONDS = 30
+    PROFILE_MAX_SECONDS = 300
+    PROFILE_SIGNAL_SECONDS = float(os.getenv("PROFILE_SIGNAL_SECONDS", "30"))
+    PROFILE_SAMPLE_INTERVAL = 0.005  # Период выборки стеков, секунд
+
+    # Отчет о памяти /mem и SIGUSR2 (tracemalloc включается только по запросу)
+    MEM_TOP_ALLOCATIONS = 15
+    MEM_TRACE_FRAMES = 1  # Глубина стека аллокации; больше - точнее, но дороже
+
+    # Трассировка обновлений: trace дольше порога пишется в data/logs/traces.jsonl
+    TRACING = os.getenv("TRACING", "1") == "1"
+    TRACE_SLOW_THRESHOLD = float(os.getenv("TRACE_SLOW_THRESHOLD", "1.0"))  # секунд
+
+    # Запись входящих обновлений для воспроизведения (python -m tools.replay)
+    RECORD_UPDATES = os.getenv("RECORD_UPDATES", "0") == "1"
+    RECORD_SCRUB = os.getenv("RECORD_SCRUB", "1") == "1"  # Обезличивание имен, текстов и id
+    RECORD_SALT = os.getenv("RECORD_SALT", "")  # Соль псевдонимов id пользователей
+    RECORD_MAX_BYTES = 50 * 1024 * 1024
+    RECORD_BACKUP_COUNT = 20
+
+    # Выбор лидера: несколько экземпляров на одной data/, работает держатель lease
+    LEADER_ELECTION = os.getenv("LEADER_ELECTION", "0") == "1"
+    LEADER_LEASE_FILE = DATA_DIR / "leader.lease"
+    LEADER_LEASE_TTL = float(os.getenv("LEADER_LEASE_TTL", "10"))  # секунд
+    LEADER_HEARTBEAT = 3  # Продление lease, секунд
+    LEADER_RETRY_INTERVAL = 1  # Попытки захвата lease в standby, секунд
 
     # Настройки
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
     MAX_HISTORY_SIZE = 1000
+    CARD_UPDATE_RETRIES = 3  # Оптимистичные попытки update_card до записи под блокировкой
     MAX_MESSAGE_LENGTH = 4096
+    MAX_CAPTION_LENGTH = 1024
+    MESSAGE_INDEX_MAX_AGE = 30 * 24 * 3600  # Ответы на посты старше 30 дней не маршрутизируются
+    MESSAGE_INDEX_MAX_SIZE = 100000
+    BULK_MAX_CARDS = 200  # Максимум заявок в одной команде /approve, /reject
+
+    # Лимиты исходящих сообщений (очередь отправки)
+    SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))  # сообщений в секунду
+    SEND_GROUP_RATE_PER_MINUTE = float(os.getenv("SEND_GROUP_RATE_PER_MINUTE", "20"))
+    SEND_GROUP_BURST = 10
+    SEND_PRIVATE_RATE = 1.0  # сообщений в секунду на личный чат
+    SEND_PRIVATE_BURST = 3
+    SEND_MAX_RETRIES = 5
+    SEND_QUEUE_WARN_DEPTH = 100
+
+    # Outbox уведомлений о решениях (хранится в карточке, переживает рестарт)
+    OUTBOX_RETRY_BASE = 5  # Первая пауза между попытками, секунд
+    OUTBOX_RETRY_MAX = 3600  # Максимальная пауза, секунд
+    OUTBOX_MAX_ATTEMPTS = 10
+
+    # Рассылки /broadcast (идут с низким приоритетом в общей очереди отправки)
+    BROADCAST_BATCH_SIZE = 25  # Получателей между сохранениями прогресса
+    BROADCAST_PROGRESS_EVERY = 100  # Отчет о прогрессе в группу модерации
+
+    # Склейка сообщений пользователя в дайджест для группы модерации
+    DIGEST_WINDOW = float(os.getenv("DIGEST_WINDOW", "3"))  # секунд
+    DIGEST_MAX_ITEMS = 20
+
+    # Кэш профилей Telegram (bio, фото профиля)
+    PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "3600"))  # секунд
+    PROFILE_CACHE_NEGATIVE_TTL = 300  # секунд, для неудачных запросов
+    PROFILE_CACHE_MAX_SIZE = 10000
+    ENRICHMENT_WAIT_TIMEOUT = 2.0  # секунд ожидания профиля перед отправкой на модерацию
 
     # Режим разработки
     DEBUG = os.getenv("ENVIRONMENT", "development") == "development"
@@ -55,7 +159,10 @@ def init_directories():
         Config.DATA_DIR,
         Config.CARDS_DIR,
         Config.LOGS_DIR,
-        Config.TMP_DIR
+        Config.TMP_DIR,
+        Config.LOCKS_DIR,
+        Config.BROADCASTS_DIR,
+        Config.RECORDINGS_DIR
     ]
 
     for directory in directories:
@@ -88,6 +195,18 @@ def check_config():
     if Config.MODERATION_CHAT_ID == -1000000000000:
         warnings.append("⚠️ MODERATION_CHAT_ID не установлен в .env файле (бот не сможет отправлять в группу)")
 
+    if Config.UPDATE_MODE not in ("polling", "webhook"):
+        errors.append(f"❌ UPDATE_MODE должен быть polling или webhook, а не {Config.UPDATE_MODE}")
+
+    if Config.WORKERS < 1:
+        errors.append("❌ WORKERS должен быть не меньше 1")
+
+    if Config.UPDATE_MODE == "webhook":
+        if not Config.WEBHOOK_URL:
+            errors.append("❌ WEBHOOK_URL не установлен в .env файле (нужен для режима webhook)")
+        if not Config.WEBHOOK_SECRET:
+            warnings.append("⚠️ WEBHOOK_SECRET не установлен (webhook принимает запросы без проверки)")
+
     if Config.PAYMENT_URL == "https://payment.example.com/standard":
         warnings.append("⚠️ PAYMENT_URL не изменен в .env файле (используется тестовый URL)")
 
@@ -1,9 +1,13 @@
 import os
 import json
+import time
+import random
+import asyncio
 import logging
 import tempfile
+from contextlib import AsyncExitStack, ExitStack, contextmanager, asynccontextmanager
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Callable, Optional, Dict, Any, List, Union
 from datetime import datetime
 
 # Для блокировок
@@ -14,10 +18,109 @@ else:  # Linux/Mac
 
 from .config import Config
 from .schemas import validate_card, create_history_entry
+from .metrics import STORAGE_SECONDS
 
 logger = logging.getLogger(__name__)
 
 
+class VersionConflict(Exception):
+    """Карточка изменена другим писателем после чтения"""
+
+
+# apply может вернуть SKIPPED: изменение не нужно (проверено по свежей карточке), запись не выполняется
+SKIPPED = "skipped"
+
+
+@contextmanager
+def named_lock(name: str):
+    """
+    Межпроцессная блокировка по имени (карточка, lease лидера).
+    Для Windows - lock файл через O_EXCL, для Linux - fcntl.flock
+    """
+    lock_file = Config.LOCKS_DIR / f"{name}.lock"
+
+    if os.name == 'nt':  # Windows
+        start_time = time.time()
+        while True:
+            try:
+                lock_fd = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_RDWR)
+                break
+            except FileExistsError:
+                if time.time() - start_time > 10:
+                    raise TimeoutError(f"Не удалось получить блокировку {name}")
+                time.sleep(0.01)
+
+        try:
+            yield
+        finally:
+            os.close(lock_fd)
+            os.unlink(lock_file)
+    else:  # Linux/Mac
+        # Lock файл не удаляем: иначе два процесса могут взять flock на разные inode
+        with open(lock_file, 'a') as lock_f:
+            fcntl.flock(lock_f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_f.fileno(), fcntl.LOCK_UN)
+
+
+class FencingError(Exception):
+    """Процесс больше не держит lease лидера: запись отклонена"""
+
+
+class WriteFence:
+    """
+    Fencing token лидера - epoch lease, полученный при захвате. Перед записью
+    решений и outbox под named_lock("leader") проверяется, что lease на диске
+    все еще с этим epoch и не истек; запись идет, не отпуская блокировку,
+    поэтому новый лидер не вклинится между проверкой и записью.
+    epoch None - выбор лидера выключен, проверки нет
+    """
+
+    def __init__(self):
+        self.epoch: Optional[int] = None
+        self.suspended = False  # Пропущен heartbeat: записи отклоняются до продления lease
+        self.rejected = 0
+
+    def _holds(self) -> bool:
+        try:
+            with open(Config.LEADER_LEASE_FILE, 'r', encoding='utf-8') as f:
+                lease = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return False
+        return lease.get("epoch") == self.epoch and lease.get("expires_at", 0) > time.time()
+
+    def check(self) -> bool:
+        """Держит ли процесс lease сейчас (без записи)"""
+        if self.epoch is None:
+            return True
+        if self.suspended:
+            return False
+        with named_lock("leader"):
+            return self._holds()
+
+    @contextmanager
+    def guard(self, enabled: bool = True):
+        """Блок записи под fencing: FencingError, если lease уже не наш"""
+        if not enabled or self.epoch is None:
+            yield
+            return
+
+        with named_lock("leader"):
+            if self.suspended or not self._holds():
+                self.rejected += 1
+                raise FencingError(f"Lease лидера с epoch {self.epoch} потерян, запись отклонена")
+            yield
+
+    def stats(self) -> Dict[str, Any]:
+        return {"epoch": self.epoch or 0, "suspended": int(self.suspended), "rejected": self.rejected}
+
+
+# Fencing записей процесса; epoch выставляет leader.py после захвата lease
+write_fence = WriteFence()
+
+
 class AtomicOperations:
     """Атомарные операции по ТЗ"""
 
@@ -58,14 +161,14 @@ class AtomicOperations:
                         os.unlink(lock_file)
             else:  # Linux/Mac
                 # Используем fcntl.flock как в ТЗ
+                # Lock файл не удаляем: иначе несколько процессов могут
+                # одновременно держать flock на разных inode
                 with open(lock_file, 'w') as lock_f:
                     fcntl.flock(lock_f.fileno(), fcntl.LOCK_EX)
                     try:
                         return AtomicOperations._increment_counter()
                     finally:
                         fcntl.flock(lock_f.fileno(), fcntl.LOCK_UN)
-                        if lock_file.exists():
-                            lock_file.unlink()
 
         except Exception as e:
             logger.error(f"Ошибка атомарного счетчика: {e}")
@@ -97,29 +200,33 @@ class AtomicOperations:
         return next_value
 
     @staticmethod
-    def write_json_atomic(file_path: Path, data: dict) -> bool:
-        """Атомарная запись JSON файла"""
+    def write_json_atomic(file_path: Path, data: dict, validate: bool = True) -> bool:
+        """Атомарная запись JSON файла (validate - проверка по схеме карточки)"""
         temp_path = file_path.with_suffix('.json.tmp')
 
         try:
             # Записываем во временный файл
             with open(temp_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-                f.flush()
+                with STORAGE_SECONDS.time(op="write"):
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                    f.flush()
                 if hasattr(f, 'fileno'):
-                    os.fsync(f.fileno())
+                    with STORAGE_SECONDS.time(op="fsync"):
+                        os.fsync(f.fileno())
 
             # Валидация JSON перед заменой
             with open(temp_path, 'r', encoding='utf-8') as f:
-                loaded_data = json.load(f)
-                is_valid, error_msg = validate_card(loaded_data)
+                with STORAGE_SECONDS.time(op="validate"):
+                    loaded_data = json.load(f)
+                    is_valid, error_msg = validate_card(loaded_data) if validate else (True, "")
                 if not is_valid:
                     logger.error(f"Невалидный JSON: {error_msg}")
                     os.remove(temp_path)
                     return False
 
             # Атомарная замена
-            os.replace(temp_path, file_path)
+            with STORAGE_SECONDS.time(op="replace"):
+                os.replace(temp_path, file_path)
             return True
 
         except Exception as e:
@@ -131,6 +238,68 @@ class AtomicOperations:
                     pass
             return False
 
+    @staticmethod
+    def write_card_cas(card_number: str, card: dict, expected_version: int) -> bool:
+        """
+        Запись карточки с проверкой версии (compare-and-swap).
+        Бросает VersionConflict, если версия на диске не равна expected_version
+        """
+        file_path = Config.CARDS_DIR / f"{card_number}.json"
+
+        with named_lock(card_number):
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    current_version = json.load(f).get("version", 0)
+            except FileNotFoundError:
+                current_version = None
+
+            if current_version != expected_version:
+                raise VersionConflict(
+                    f"Карточка {card_number}: версия {current_version}, ожидалась {expected_version}"
+                )
+
+            card["version"] = expected_version + 1
+            return AtomicOperations.write_json_atomic(file_path, card)
+
+
+class CardLocks:
+    """Асинхронные блокировки карточек внутри процесса (по одной на карточку)"""
+
+    def __init__(self):
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._holders: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def acquire(self, card_number: str):
+        key = card_number.zfill(4)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._holders[key] = self._holders.get(key, 0) + 1
+
+        try:
+            async with lock:
+                yield
+        finally:
+            self._holders[key] -= 1
+            if not self._holders[key]:
+                del self._holders[key]
+                del self._locks[key]
+
+    @asynccontextmanager
+    async def acquire_many(self, card_numbers: List[str]):
+        """Блокировки нескольких карточек в порядке номеров (без взаимных блокировок)"""
+        async with AsyncExitStack() as stack:
+            for card_number in sorted({n.zfill(4) for n in card_numbers}):
+                await stack.enter_async_context(self.acquire(card_number))
+            yield
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+card_locks = CardLocks()
+
 
 class CardManager:
     """Управление карточками заявок"""
@@ -146,6 +315,7 @@ class CardManager:
             # Формируем карточку
             card = {
                 "id": card_id,
+                "version": 1,
                 "number": card_number,
                 "city": city,
                 "fio": "",
@@ -184,11 +354,13 @@ class CardManager:
             if not file_path.exists():
                 return None
 
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            with STORAGE_SECONDS.time(op="load"):
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
 
             # Валидация
-            is_valid, error_msg = validate_card(data)
+            with STORAGE_SECONDS.time(op="load_validate"):
+                is_valid, error_msg = validate_card(data)
             if not is_valid:
                 logger.error(f"Невалидная карточка {card_number}: {error_msg}")
                 # Логируем ошибку
@@ -205,22 +377,198 @@ class CardManager:
             return None
 
     @staticmethod
-    def update_card(card_number: str, updates: dict, history_entry: dict = None) -> bool:
-        """Обновление карточки"""
-        card = CardManager.load_card(card_number)
-        if not card:
+    def modify_card(card_number: str, apply: Callable[[dict], Optional[str]],
+                    fenced: bool = False) -> Union[bool, str]:
+        """
+        Изменение карточки функцией apply: чтение -> изменение -> запись с проверкой
+        версии. После CARD_UPDATE_RETRIES конфликтов - под блокировкой карточки.
+        Если apply вернул SKIPPED, карточка не пишется и возвращается SKIPPED.
+        fenced - запись с внешними последствиями (решение, outbox): только пока
+        процесс держит lease лидера, иначе False
+        """
+        try:
+            return CardManager._modify_card(card_number.zfill(4), apply, fenced)
+        except FencingError as e:
+            logger.warning(f"Карточка {card_number}: {e}")
             return False
 
-        # Обновляем поля
-        card.update(updates)
+    @staticmethod
+    def _modify_card(card_number: str, apply: Callable[[dict], Optional[str]], fenced: bool) -> Union[bool, str]:
+
+        for attempt in range(Config.CARD_UPDATE_RETRIES):
+            card = CardManager.load_card(card_number)
+            if not card:
+                return False
+
+            if apply(card) == SKIPPED:
+                return SKIPPED
+
+            # Сохраняем, если карточку не изменили с момента чтения
+            try:
+                with write_fence.guard(fenced):
+                    return AtomicOperations.write_card_cas(card_number, card, card.get("version", 0))
+            except VersionConflict as e:
+                logger.debug(f"{e}, повтор {attempt + 1}")
+                # Случайная пауза, чтобы конкурирующие писатели разошлись
+                time.sleep(random.uniform(0, 0.002 * (attempt + 1)))
+
+        # Высокая конкуренция: пишем под блокировкой, конфликт невозможен.
+        # Блокировка лидера всегда берется раньше блокировок карточек
+        with write_fence.guard(fenced), named_lock(card_number):
+            card = CardManager.load_card(card_number)
+            if not card:
+                return False
+
+            if apply(card) == SKIPPED:
+                return SKIPPED
+            card["version"] = card.get("version", 0) + 1
+            return AtomicOperations.write_json_atomic(Config.CARDS_DIR / f"{card_number}.json", card)
+
+    @staticmethod
+    def update_card(card_number: str, updates: dict, history_entry: dict = None,
+                    outbox_entry: dict = None) -> bool:
+        """
+        Обновление полей карточки. outbox_entry - уведомление пользователю,
+        записывается в той же операции, что и изменения
+        """
+        return CardManager.modify_card(
+            card_number, CardManager._changes(updates, history_entry, outbox_entry), fenced=outbox_entry is not None
+        )
+
+    @staticmethod
+    def _changes(updates: dict, history_entry: dict = None,
+                 outbox_entry: dict = None) -> Callable[[dict], None]:
+        """apply для modify_card: поля, запись истории и уведомление"""
+        def apply(card: dict) -> None:
+            # Обновляем поля
+            card.update(updates)
+
+            # Добавляем историю
+            if history_entry:
+                card["history"].append(history_entry)
+
+            if outbox_entry:
+                card.setdefault("outbox", []).append(outbox_entry)
+
+        return apply
+
+    @staticmethod
+    async def modify_card_async(card_number: str, apply: Callable[[dict], Optional[str]],
+                                fenced: bool = False) -> Union[bool, str]:
+        """
+        Изменение карточки без блокировки event loop: запись в потоке,
+        изменения одной карточки внутри процесса идут по очереди
+        """
+        async with card_locks.acquire(card_number):
+            return await asyncio.to_thread(CardManager.modify_card, card_number, apply, fenced)
+
+    @staticmethod
+    async def update_card_async(card_number: str, updates: dict, history_entry: dict = None,
+                                outbox_entry: dict = None) -> bool:
+        """Асинхронная версия update_card"""
+        async with card_locks.acquire(card_number):
+            return await asyncio.to_thread(
+                CardManager.update_card, card_number, updates, history_entry, outbox_entry
+            )
+
+    @staticmethod
+    def modify_cards(applies: Dict[str, Callable[[dict], Optional[str]]],
+                     fenced: bool = False) -> Dict[str, Union[bool, str]]:
+        """
+        Пакетное изменение {номер: apply} под блокировками всех карточек:
+        сначала все карточки читаются, меняются и проверяются по схеме,
+        и только потом пишутся. Если хоть одна не найдена или не прошла
+        проверку, не пишется ни одна; карточки, для которых apply вернул
+        SKIPPED, не пишутся. Ошибка записи посреди пакета (диск)
+        не откатывает уже записанные - результат по каждой карточке.
+        fenced - как у modify_card
+        """
+        # Блокировки в порядке номеров - без взаимных блокировок; CAS-писатели ждут
+        card_numbers = sorted(applies, key=lambda card_number: card_number.zfill(4))
+        results = {card_number: False for card_number in card_numbers}
+
+        with ExitStack() as stack:
+            try:
+                stack.enter_context(write_fence.guard(fenced))
+            except FencingError as e:
+                logger.warning(f"Пакет не записан: {e}")
+                return results
+            for card_number in card_numbers:
+                stack.enter_context(named_lock(card_number.zfill(4)))
+
+            cards = {}
+            for card_number in card_numbers:
+                card = CardManager.load_card(card_number)
+                if not card:
+                    logger.error(f"Пакет не записан: карточка {card_number} не найдена")
+                    return results
+
+                if applies[card_number](card) == SKIPPED:
+                    results[card_number] = SKIPPED
+                    continue
+                is_valid, error_msg = validate_card(card)
+                if not is_valid:
+                    logger.error(f"Пакет не записан: карточка {card_number} невалидна: {error_msg}")
+                    return results
+                card["version"] = card.get("version", 0) + 1
+                cards[card_number] = card
+
+            for card_number, card in cards.items():
+                results[card_number] = AtomicOperations.write_json_atomic(
+                    Config.CARDS_DIR / f"{card_number.zfill(4)}.json", card
+                )
+
+        failed = [card_number for card_number, result in results.items() if not result]
+        if failed:
+            written = [card_number for card_number, result in results.items() if result is True]
+            logger.error(f"Пакет записан частично: записаны {written or '-'}, ошибки {failed}")
+        return results
+
+    @staticmethod
+    def update_cards(batch: Dict[str, tuple]) -> Dict[str, bool]:
+        """
+        Пакетное обновление: {номер: (updates, history_entry, outbox_entry)},
+        семантика modify_cards. Результат по каждой карточке
+        """
+        return CardManager.modify_cards(
+            {card_number: CardManager._changes(*changes) for card_number, changes in batch.items()},
+            fenced=any(len(changes) > 2 and changes[2] for changes in batch.values())
+        )
 
-        # Добавляем историю
-        if history_entry:
-            card["history"].append(history_entry)
+    @staticmethod
+    async def modify_cards_async(applies: Dict[str, Callable[[dict], Optional[str]]],
+                                 fenced: bool = False) -> Dict[str, Union[bool, str]]:
+        """Пакетное изменение одним вызовом в потоке"""
+        async with card_locks.acquire_many(list(applies)):
+            return await asyncio.to_thread(CardManager.modify_cards, applies, fenced)
+
+    @staticmethod
+    async def update_cards_async(batch: Dict[str, tuple]) -> Dict[str, bool]:
+        """Пакетное обновление одним вызовом в потоке"""
+        async with card_locks.acquire_many(list(batch)):
+            return await asyncio.to_thread(CardManager.update_cards, batch)
 
-        # Сохраняем
-        file_path = Config.CARDS_DIR / f"{card_number.zfill(4)}.json"
-        return AtomicOperations.write_json_atomic(file_path, card)
+    @staticmethod
+    def query_cards(city: Optional[str] = None, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Карточки по городу и статусу (None - любой), по возрастанию номера"""
+        cards = []
+        for file_path in Config.CARDS_DIR.glob("*.json"):
+            card = CardManager.load_card(file_path.stem)
+            if not card:
+                continue
+            if city and card.get("city") != city:
+                continue
+            if status and card.get("status") != status:
+                continue
+            cards.append(card)
+
+        cards.sort(key=lambda x: x["id"])
+        return cards
+
+    @staticmethod
+    def load_cards(card_numbers: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Загрузка нескольких карточек"""
+        return {card_number: CardManager.load_card(card_number) for card_number in card_numbers}
 
     @staticmethod
     def get_cards_by_city(city: str) -> List[Dict[str, Any]]:
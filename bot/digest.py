@@ -0,0 +1,142 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import Config
+from .sender import send_queue, Priority
+from .message_index import message_index
+from .utils import split_long_message
+
+logger = logging.getLogger(__name__)
+
+
+class ModerationDigest:
+    """
+    Склейка сообщений пользователя для группы модерации.
+    Всё, что пришло по одной заявке за окно DIGEST_WINDOW секунд, уходит
+    в порядке поступления: подряд идущий текст - одним постом [NNNN],
+    подряд идущие медиа - одним вызовом forwardMessages после поста
+    со строками-уведомлениями о них.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._buffers: Dict[str, Dict[str, Any]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+        # Метрики
+        self.items = 0
+        self.posts = 0
+
+    def add_text(self, bot, card_number: str, text: str) -> None:
+        """Добавление текстового сообщения пользователя"""
+        self._add(bot, card_number, text)
+
+    def add_media(self, bot, card_number: str, from_chat_id: int, message_id: int, notice: str) -> None:
+        """Добавление медиа: пересылка оригинала и строка-уведомление в дайджесте"""
+        self._add(bot, card_number, notice, (from_chat_id, message_id))
+
+    def _add(self, bot, card_number: str, line: str, media: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+        buffer = self._buffers.get(card_number)
+        if buffer is None:
+            buffer = {"bot": bot, "items": []}
+            self._buffers[card_number] = buffer
+            self._tasks[card_number] = asyncio.get_running_loop().create_task(
+                self._flush_later(card_number)
+            )
+
+        buffer["items"].append((line, media))
+        self.items += 1
+
+        # Слишком большой дайджест отправляем сразу
+        if len(buffer["items"]) >= Config.DIGEST_MAX_ITEMS:
+            task = self._tasks.pop(card_number, None)
+            if task:
+                task.cancel()
+            self._tasks[card_number] = asyncio.get_running_loop().create_task(self.flush(card_number))
+
+        return buffer
+
+    async def _flush_later(self, card_number: str) -> None:
+        await asyncio.sleep(self.window)
+        await self.flush(card_number)
+
+    @staticmethod
+    def format_digest(card_number: str, lines: List[str]) -> str:
+        """Текст дайджеста с префиксом [NNNN] по ТЗ"""
+        if len(lines) == 1:
+            return f"[{card_number}] пользователь: {lines[0]}"
+        return "\n".join([f"[{card_number}] пользователь ({len(lines)}):"] + lines)
+
+    @staticmethod
+    def runs(items: List[Tuple[str, Optional[Tuple[int, int]]]]) -> List[Tuple[List[str], Optional[int], List[int]]]:
+        """
+        Разбиение на отрезки (строки, чат медиа, message_id медиа) в порядке поступления:
+        текст после медиа начинает новый отрезок, медиа дописываются к текущему
+        """
+        runs: List[Tuple[List[str], Optional[int], List[int]]] = []
+        for line, media in items:
+            if runs:
+                lines, from_chat_id, message_ids = runs[-1]
+                same_chat = media is not None and from_chat_id in (None, media[0])
+                if not message_ids or same_chat:
+                    lines.append(line)
+                    if media:
+                        runs[-1] = (lines, media[0], message_ids + [media[1]])
+                    continue
+            runs.append(([line], media[0] if media else None, [media[1]] if media else []))
+        return runs
+
+    async def flush(self, card_number: str) -> None:
+        """Отправка накопленного по заявке"""
+        task = self._tasks.pop(card_number, None)
+        if task and task is not asyncio.current_task():
+            task.cancel()
+
+        buffer = self._buffers.pop(card_number, None)
+        if not buffer:
+            return
+
+        bot = buffer["bot"]
+        futures = []
+
+        # Отрезки в порядке поступления: пост со строками, затем пересылка его медиа.
+        # Одна очередь чата и один приоритет - порядок вызовов сохраняется
+        for lines, from_chat_id, message_ids in self.runs(buffer["items"]):
+            for part in split_long_message(self.format_digest(card_number, lines)):
+                futures.append(send_queue.send_message(bot, Config.MODERATION_CHAT_ID, part, Priority.LOW))
+            if message_ids:
+                futures.append(send_queue.submit(
+                    bot.forward_messages,
+                    Config.MODERATION_CHAT_ID,
+                    Priority.LOW,
+                    from_chat_id=from_chat_id,
+                    message_ids=message_ids
+                ))
+
+        self.posts += 1
+
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Ошибка отправки дайджеста [{card_number}]: {result}")
+
+        # Ответ модератора на пересланное или дайджест уйдет пользователю
+        message_index.add_results(card_number, [r for r in results if not isinstance(r, Exception)])
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики склейки"""
+        return {
+            "pending_cards": len(self._buffers),
+            "items": self.items,
+            "posts": self.posts,
+        }
+
+    async def close(self) -> None:
+        """Отправка всего накопленного при остановке"""
+        for card_number in list(self._buffers):
+            await self.flush(card_number)
+
+
+# Глобальный буфер дайджестов для группы модерации
+moderation_digest = ModerationDigest(Config.DIGEST_WINDOW)
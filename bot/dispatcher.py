@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Dict, List
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from .config import Config
+from .metrics import UPDATES_TOTAL
+from .recorder import update_recorder
+from .tracing import record_span, trace
+from .utils import expand_card_token
+
+logger = logging.getLogger(__name__)
+
+class KeyedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Параллельная обработка обновлений с сохранением порядка по ключам.
+    Обновления одного пользователя и одной заявки выполняются строго
+    последовательно, разные пользователи и заявки - параллельно,
+    не более `concurrency` обработчиков одновременно.
+    """
+
+    def __init__(self, concurrency: int, max_pending: int, sessions: Dict[int, Dict[str, Any]] = None):
+        # Семафор базового класса ограничивает число ожидающих задач,
+        # собственный - число реально выполняющихся обработчиков
+        super().__init__(max_concurrent_updates=max_pending)
+        self.concurrency = concurrency
+        self.sessions = sessions if sessions is not None else {}
+        self._running = asyncio.BoundedSemaphore(concurrency)
+        self._tails: Dict[str, asyncio.Future] = {}
+
+        # Метрики
+        self.active = 0
+        self.waiting = 0
+        self.processed = 0
+
+    def update_keys(self, update: object) -> List[str]:
+        """Ключи упорядочивания: пользователь и затронутые заявки"""
+        if not isinstance(update, Update):
+            return []
+
+        keys = []
+        user = update.effective_user
+        if user:
+            keys.append(f"user:{user.id}")
+
+            # Сообщения пользователя относятся к его текущей заявке
+            session = self.sessions.get(user.id)
+            if session and update.effective_chat and update.effective_chat.type == "private":
+                keys.append(f"card:{session['card_number']}")
+        elif update.effective_chat:
+            keys.append(f"chat:{update.effective_chat.id}")
+
+        # Команды модераторов: номера и диапазоны заявок в начале аргументов
+        message = update.effective_message
+        if message and message.text and message.text.startswith("/"):
+            for token in message.text.replace(",", " ").split()[1:]:
+                card_numbers = expand_card_token(token)
+                if card_numbers is None:
+                    break
+                keys.extend(f"card:{card_number}" for card_number in card_numbers)
+
+        # Кнопки модерации: callback_data "mod:<действие>:<номер>"
+        query = update.callback_query
+        if query and query.data and query.data.startswith("mod:"):
+            keys.append(f"card:{query.data.rsplit(':', 1)[-1]}")
+
+        return sorted(set(keys))
+
+    @staticmethod
+    def trace_attrs(update: object) -> Dict[str, Any]:
+        """Атрибуты trace обновления: id, пользователь, команда или кнопка"""
+        if not isinstance(update, Update):
+            return {}
+        attrs: Dict[str, Any] = {"update_id": update.update_id}
+        if update.effective_user:
+            attrs["user_id"] = update.effective_user.id
+        message = update.effective_message
+        if message and message.text and message.text.startswith("/"):
+            attrs["command"] = message.text.split(maxsplit=1)[0]
+        elif update.callback_query and update.callback_query.data:
+            attrs["callback"] = update.callback_query.data
+        return attrs
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        update_recorder.record(update)
+        with trace("update", **self.trace_attrs(update)):
+            await self._process_ordered(update, coroutine)
+
+    async def _process_ordered(self, update: object, coroutine: Awaitable[Any]) -> None:
+        loop = asyncio.get_running_loop()
+
+        # Встаем в очередь по всем ключам синхронно, в порядке поступления:
+        # так цепочки не могут образовать цикл
+        keys = self.update_keys(update)
+        previous = [self._tails[key] for key in keys if key in self._tails]
+        done = loop.create_future()
+        for key in keys:
+            self._tails[key] = done
+
+        try:
+            self.waiting += 1
+            started = time.perf_counter()
+            try:
+                for future in previous:
+                    await asyncio.shield(future)
+            except asyncio.CancelledError:
+                coroutine.close()
+                raise
+            finally:
+                self.waiting -= 1
+
+            async with self._running:
+                # Ожидание обновлений с теми же ключами и свободного слота
+                record_span("dispatcher.wait", time.perf_counter() - started, keys=len(keys))
+                self.active += 1
+                try:
+                    await coroutine
+                finally:
+                    self.active -= 1
+                    self.processed += 1
+                    UPDATES_TOTAL.inc()
+        finally:
+            done.set_result(None)
+            for key in keys:
+                if self._tails.get(key) is done:
+                    del self._tails[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики диспетчера"""
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "waiting": self.waiting,
+            "keys": len(self._tails),
+            "processed": self.processed,
+        }
+
+
+def build_update_processor(sessions: Dict[int, Dict[str, Any]]) -> KeyedUpdateProcessor:
+    """Диспетчер обновлений по настройкам Config"""
+    return KeyedUpdateProcessor(
+        Config.UPDATE_CONCURRENCY,
+        Config.UPDATE_MAX_PENDING,
+        sessions
+    )
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Any
+
+from .config import Config
+from .database import CardManager
+
+logger = logging.getLogger(__name__)
+
+
+class ProfileCache:
+    """
+    Кэш данных профиля из Telegram (bio через getChat, фото профиля).
+    TTL для удачных запросов, короткий TTL для неудачных,
+    одновременные запросы по одному пользователю делят один запрос к API.
+    """
+
+    def __init__(self, ttl: float, negative_ttl: float, max_size: int):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()  # user_id -> (expires, data)
+        self._inflight: Dict[int, asyncio.Future] = {}
+
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    async def get(self, bot, user_id: int) -> Dict[str, str]:
+        """Данные профиля пользователя (из кэша или из Telegram)"""
+        entry = self._entries.get(user_id)
+        if entry and entry[0] > time.monotonic():
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return dict(entry[1])
+
+        inflight = self._inflight.get(user_id)
+        if inflight is None:
+            self.misses += 1
+            inflight = asyncio.ensure_future(self._load(bot, user_id))
+            self._inflight[user_id] = inflight
+
+        # shield: отмена одного ожидающего не отменяет общий запрос
+        return dict(await asyncio.shield(inflight))
+
+    async def _load(self, bot, user_id: int) -> Dict[str, str]:
+        try:
+            data, complete = await self.fetch(bot, user_id)
+            self._store(user_id, data, self.ttl if complete else self.negative_ttl)
+            if not complete:
+                self.failures += 1
+            return data
+        finally:
+            self._inflight.pop(user_id, None)
+
+    @staticmethod
+    async def fetch(bot, user_id: int) -> tuple:
+        """
+        Запрос bio и фото профиля параллельно.
+        Возвращает (данные, были ли оба запроса успешны)
+        """
+        chat, photos = await asyncio.gather(
+            bot.get_chat(user_id),
+            bot.get_user_profile_photos(user_id, limit=1),
+            return_exceptions=True
+        )
+
+        data = {}
+        complete = True
+
+        if isinstance(chat, Exception):
+            logger.debug(f"Не удалось получить bio для пользователя {user_id}: {chat}")
+            complete = False
+        elif chat.bio:
+            data["bio"] = chat.bio
+            data["additional_profile_info"] = chat.bio
+
+        if isinstance(photos, Exception):
+            logger.debug(f"Не удалось получить фото профиля для {user_id}: {photos}")
+            complete = False
+        elif photos.total_count > 0:
+            # Берем фото с наивысшим разрешением (последнее в массиве)
+            photo = photos.photos[0][-1]
+            data["profile_photo_file_id"] = photo.file_id
+            logger.debug(f"Получено фото профиля для {user_id}: {photo.file_id[:20]}...")
+
+        return data, complete
+
+    def _store(self, user_id: int, data: Dict[str, str], ttl: float) -> None:
+        self._entries[user_id] = (time.monotonic() + ttl, data)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        """Сброс кэша пользователя"""
+        self._entries.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики кэша"""
+        return {
+            "size": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "failures": self.failures,
+        }
+
+
+# Глобальный кэш профилей
+profile_cache = ProfileCache(
+    Config.PROFILE_CACHE_TTL,
+    Config.PROFILE_CACHE_NEGATIVE_TTL,
+    Config.PROFILE_CACHE_MAX_SIZE
+)
+
+# Фоновые задачи дополнения карточек: card_number -> task
+_card_tasks: Dict[str, asyncio.Task] = {}
+
+
+def start_card_enrichment(bot, card_number: str, user_id: int) -> None:
+    """Запуск фонового дополнения account_meta карточки (bio, фото профиля)"""
+    task = asyncio.get_running_loop().create_task(_enrich_card(bot, card_number, user_id))
+    _card_tasks[card_number] = task
+
+    def _forget(finished: asyncio.Task) -> None:
+        if _card_tasks.get(card_number) is finished:
+            del _card_tasks[card_number]
+
+    task.add_done_callback(_forget)
+
+
+async def _enrich_card(bot, card_number: str, user_id: int) -> None:
+    try:
+        data = await profile_cache.get(bot, user_id)
+        if not data:
+            return
+
+        # Под блокировкой карточки меняются только поля профиля, остальное account_meta не трогаем
+        def apply(card: dict) -> None:
+            card["account_meta"].update(data)
+
+        if not await CardManager.modify_card_async(card_number, apply):
+            logger.error(f"Не удалось дополнить профиль в карточке {card_number}")
+    except Exception as e:
+        logger.error(f"Ошибка дополнения профиля карточки {card_number}: {e}")
+
+
+async def wait_card_enrichment(card_number: str, timeout: float = None) -> bool:
+    """
+    Ожидание фонового дополнения карточки не дольше timeout секунд.
+    Возвращает False, если не успели
+    """
+    task = _card_tasks.get(card_number)
+    if task is None:
+        return True
+
+    if timeout is None:
+        timeout = Config.ENRICHMENT_WAIT_TIMEOUT
+
+    try:
+        await asyncio.wait_for(asyncio.shield(task), timeout)
+        return True
+    except asyncio.TimeoutError:
+        logger.warning(f"Профиль для карточки {card_number} не получен за {timeout}с")
+        return False
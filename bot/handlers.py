@@ -1,13 +1,23 @@
 import re
+import asyncio
 import logging
-from typing import Dict, Any
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from datetime import datetime, timezone
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from telegram import Chat, Message, Update, User, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 
 from .config import Config
-from .database import CardManager
+from .database import SKIPPED, CardManager
 from .schemas import create_history_entry
-from .utils import get_user_metadata, split_long_message, format_card_for_moderation
+from .sender import send_queue, Priority
+from .digest import moderation_digest
+from .enrichment import start_card_enrichment, wait_card_enrichment
+from .outbox import create_outbox_entry, notification_outbox
+from .broadcast import broadcasts
+from .message_index import message_index
+from .profiler import profiler
+from .memory import memory_inspector
+from .utils import get_user_metadata, split_long_message, format_card_for_moderation, parse_card_numbers
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +28,60 @@ SELECTING_CITY, ENTERING_FIO, ENTERING_EXTRA = range(3)
 user_sessions: Dict[int, Dict[str, Any]] = {}
 
 
+# Шаг диалога регистрации по статусу карточки; остальные статусы - диалог завершен
+CONVERSATION_STATES = {"new": SELECTING_CITY, "city_selected": ENTERING_FIO, "fio_added": ENTERING_EXTRA}
+
+
+def conversation_key(conversation: ConversationHandler, user_id: int) -> tuple:
+    """
+    Ключ диалога пользователя в личном чате - тем же _get_key, что строит PTB,
+    поэтому ключ следует настройкам per_chat/per_user обработчика.
+    _get_key и _conversations - внутренние API python-telegram-bot (версия
+    закреплена в requirements.txt); при обновлении PTB проверить restore_sessions
+    """
+    chat = Chat(user_id, Chat.PRIVATE)
+    message = Message(0, datetime.now(timezone.utc), chat, from_user=User(user_id, "", False))
+    return conversation._get_key(Update(0, message=message))
+
+
+def restore_sessions(cards: List[Dict[str, Any]], shard: Optional[Tuple[int, int]] = None,
+                     conversation: Optional[ConversationHandler] = None) -> int:
+    """
+    Восстановление user_sessions по карточкам (после рестарта или смены лидера).
+    Берется последняя заявка пользователя; shard=(i, n) - только user_id % n == i.
+    conversation - ConversationHandler регистрации: его состояние тоже
+    восстанавливается по статусу, иначе ФИО и extra после рестарта не принимаются
+    """
+    steps = {"new": "fio", "city_selected": "fio", "fio_added": "extra"}
+    restored = 0
+
+    for card in cards:
+        user_id = card.get("account_meta", {}).get("user_id")
+        if user_id is None or (shard and user_id % shard[1] != shard[0]):
+            continue
+
+        current = user_sessions.get(user_id)
+        if current and int(current["card_number"]) > card["id"]:
+            continue
+
+        user_sessions[user_id] = {
+            "card_number": card["number"],
+            "city": card["city"],
+            "step": steps.get(card["status"], "completed")
+        }
+
+        if conversation is not None:
+            key = conversation_key(conversation, user_id)
+            state = CONVERSATION_STATES.get(card["status"])
+            if state is None:
+                conversation._conversations.pop(key, None)
+            else:
+                conversation._conversations[key] = state
+        restored += 1
+
+    return restored
+
+
 # ============================= ОБРАБОТЧИКИ ДЛЯ ПОЛЬЗОВАТЕЛЕЙ =============================
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -42,36 +106,16 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
 
 
 async def city_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Обработка выбора города с получением фото профиля"""
+    """Обработка выбора города; фото профиля и bio дополняются в фоне"""
     query = update.callback_query
     await query.answer()
 
     user = update.effective_user
     city = query.data.replace("city_", "")
 
-    # Получаем метаданные пользователя
+    # Базовые метаданные пользователя, без запросов к Telegram
     user_meta = get_user_metadata(user)
 
-    # Пробуем получить bio через getChat
-    try:
-        chat = await context.bot.get_chat(user.id)
-        if chat.bio:
-            user_meta["bio"] = chat.bio
-            user_meta["additional_profile_info"] = chat.bio
-    except Exception as e:
-        logger.debug(f"Не удалось получить bio для пользователя {user.id}: {e}")
-
-    # ПОЛУЧАЕМ ФОТО ПРОФИЛЯ (по ТЗ)
-    try:
-        photos = await context.bot.get_user_profile_photos(user.id, limit=1)
-        if photos.total_count > 0:
-            # Берем фото с наивысшим разрешением (последнее в массиве)
-            photo = photos.photos[0][-1]
-            user_meta["profile_photo_file_id"] = photo.file_id
-            logger.debug(f"Получено фото профиля для {user.id}: {photo.file_id[:20]}...")
-    except Exception as e:
-        logger.debug(f"Не удалось получить фото профиля для {user.id}: {e}")
-
     # Создаем карточку
     card = CardManager.create_card(user_meta, user.id, city)
 
@@ -79,6 +123,9 @@ async def city_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         await query.edit_message_text("Ошибка создания заявки. Попробуйте снова /start")
         return ConversationHandler.END
 
+    # bio и фото профиля (по ТЗ) дописываются в карточку фоновой задачей
+    start_card_enrichment(context.bot, card["number"], user.id)
+
     # Сохраняем сессию
     user_sessions[user.id] = {
         "card_number": card["number"],
@@ -116,7 +163,7 @@ async def handle_fio(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     )
 
     # Обновляем карточку
-    success = CardManager.update_card(
+    success = await CardManager.update_card_async(
         card_number,
         {"fio": fio, "status": "fio_added"},
         history_entry
@@ -159,7 +206,7 @@ async def handle_extra(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     )
 
     # Обновляем карточку
-    success = CardManager.update_card(
+    success = await CardManager.update_card_async(
         card_number,
         {"extra": extra, "status": "sent_to_review"},
         history_entry
@@ -170,10 +217,11 @@ async def handle_extra(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
         del user_sessions[user.id]
         return ConversationHandler.END
 
-    # Отправляем заявку в группу модерации
+    # Отправляем заявку в группу модерации, дождавшись профиля (с дедлайном)
+    await wait_card_enrichment(card_number)
     card = CardManager.load_card(card_number)
     if card:
-        await send_to_moderation_group(card, context)
+        send_to_moderation_group(card, context)
 
     await update.message.reply_text(
         "Ваша заявка отправлена на модерацию. "
@@ -214,7 +262,7 @@ async def handle_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE
             meta={"message_id": message.message_id}
         )
 
-        CardManager.update_card(card_number, {}, history_entry)
+        await CardManager.update_card_async(card_number, {}, history_entry)
 
     elif message.photo or message.document or message.voice or message.video or message.audio:
         # Медиа сообщение
@@ -249,20 +297,15 @@ async def handle_user_media(update: Update, context: ContextTypes.DEFAULT_TYPE,
     else:
         return
 
-    # Пересылаем в группу модерации
-    try:
-        await message.forward(chat_id=Config.MODERATION_CHAT_ID)
-
-        # Отправляем текстовое уведомление
-        caption_text = f" ({caption})" if caption else ""
-        text = f"[{card_number}] пользователь: {media_type}{caption_text}"
-
-        await context.bot.send_message(
-            chat_id=Config.MODERATION_CHAT_ID,
-            text=text
-        )
-    except Exception as e:
-        logger.error(f"Ошибка пересылки медиа: {e}")
+    # Пересылка и уведомление уходят в группу модерации пачкой (дайджест)
+    caption_text = f" ({caption})" if caption else ""
+    moderation_digest.add_media(
+        context.bot,
+        card_number,
+        message.chat_id,
+        message.message_id,
+        f"{media_type}{caption_text}"
+    )
 
     # Записываем в историю
     history_entry = create_history_entry(
@@ -276,49 +319,138 @@ async def handle_user_media(update: Update, context: ContextTypes.DEFAULT_TYPE,
         }
     )
 
-    CardManager.update_card(card_number, {}, history_entry)
-
-
-async def send_to_moderation_group(card: dict, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Отправка заявки в группу модерации С ФОТО ПРОФИЛЯ по ТЗ"""
+    await CardManager.update_card_async(card_number, {}, history_entry)
+
+
+def moderation_keyboard(card_number: str, decided: bool = False) -> InlineKeyboardMarkup:
+    """Кнопки под заявкой в группе модерации (после решения - только Инфо)"""
+    info = InlineKeyboardButton("ℹ️ Инфо", callback_data=f"mod:info:{card_number}")
+    if decided:
+        return InlineKeyboardMarkup([[info]])
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("✅ Одобрить", callback_data=f"mod:approve:{card_number}"),
+        InlineKeyboardButton("❌ Отклонить", callback_data=f"mod:reject:{card_number}"),
+        info
+    ]])
+
+
+def send_in_background(future: asyncio.Future, what: str,
+                       on_result: Optional[Callable[[Any], None]] = None) -> asyncio.Future:
+    """
+    Отправка в группу модерации без ожидания: обработчик не держит слот
+    диспетчера, пока очередь группы (20 сообщений в минуту) разбирается.
+    Результат - в on_result, ошибка - в лог
+    """
+    def done(finished: asyncio.Future) -> None:
+        if finished.cancelled():
+            return
+        if finished.exception() is not None:
+            logger.error(f"Ошибка отправки ({what}): {finished.exception()}")
+        elif on_result:
+            on_result(finished.result())
+
+    future.add_done_callback(done)
+    return future
+
+
+def send_to_moderation_group(card: dict, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Отправка заявки в группу модерации С ФОТО ПРОФИЛЯ по ТЗ. Заявка ставится
+    в очередь без ожидания; индекс сообщений и лог - по факту отправки
+    """
     try:
-        # 1. ОТПРАВЛЯЕМ ФОТО ПРОФИЛЯ ЕСЛИ ЕСТЬ (по ТЗ)
-        photo_file_id = card['account_meta'].get('profile_photo_file_id')
-        if photo_file_id:
-            try:
-                await context.bot.send_photo(
-                    chat_id=Config.MODERATION_CHAT_ID,
-                    photo=photo_file_id,
-                    caption=f"[{card['number']}] Фото профиля"  # Префикс по ТЗ
-                )
-            except Exception as e:
-                logger.error(f"Ошибка отправки фото профиля: {e}")
-
-        # 2. Отправляем текстовое сообщение
         message = format_card_for_moderation(card)
+        photo_file_id = card['account_meta'].get('profile_photo_file_id')
 
-        for part in split_long_message(message):
-            await context.bot.send_message(
-                chat_id=Config.MODERATION_CHAT_ID,
-                text=part
+        # 1. ФОТО ПРОФИЛЯ С ТЕКСТОМ ЗАЯВКИ В ПОДПИСИ - ОДИН ВЫЗОВ API
+        if photo_file_id and len(message) <= Config.MAX_CAPTION_LENGTH:
+            post = send_queue.submit(
+                context.bot.send_photo,
+                Config.MODERATION_CHAT_ID,
+                Priority.NORMAL,
+                photo=photo_file_id,
+                caption=message,  # Начинается с префикса [NNNN] по ТЗ
+                reply_markup=moderation_keyboard(card['number'])
             )
 
-        logger.info(f"Заявка {card['number']} отправлена в группу модерации")
+            def photo_sent(finished: asyncio.Future) -> None:
+                if finished.cancelled():
+                    return
+                if finished.exception() is None:
+                    moderation_posted(card['number'], [finished.result()])
+                    return
+                # Без фото профиля - только текст заявки
+                logger.error(f"Ошибка отправки фото профиля: {finished.exception()}")
+                send_card_parts(card['number'], message, None, context)
+
+            post.add_done_callback(photo_sent)
+            return
+
+        send_card_parts(card['number'], message, photo_file_id, context)
 
     except Exception as e:
         logger.error(f"Ошибка отправки в группу модерации: {e}")
 
 
+def send_card_parts(card_number: str, message: str, photo_file_id: Optional[str],
+                    context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Текст не помещается в подпись: фото и текст отдельно.
+    Ставим в очередь сразу всё, чтобы части заявки шли подряд
+    """
+    futures = []
+    if photo_file_id:
+        futures.append(send_queue.submit(
+            context.bot.send_photo,
+            Config.MODERATION_CHAT_ID,
+            Priority.NORMAL,
+            photo=photo_file_id,
+            caption=f"[{card_number}] Фото профиля"  # Префикс по ТЗ
+        ))
+
+    # Кнопки модерации - под последней частью заявки
+    parts = split_long_message(message)
+    for i, part in enumerate(parts):
+        markup = moderation_keyboard(card_number) if i == len(parts) - 1 else None
+        futures.append(send_queue.send_message(
+            context.bot, Config.MODERATION_CHAT_ID, part, Priority.NORMAL, reply_markup=markup
+        ))
+
+    def sent(results: List[Any]) -> None:
+        errors = [result for result in results if isinstance(result, BaseException)]
+        posts = [result for result in results if not isinstance(result, BaseException)]
+        if errors:
+            message_index.add_results(card_number, posts)
+            logger.error(f"Ошибка отправки в группу модерации: {errors[0]}")
+        else:
+            moderation_posted(card_number, posts)
+
+    send_in_background(asyncio.gather(*futures, return_exceptions=True), f"заявка {card_number}", sent)
+
+
+def moderation_posted(card_number: str, posts: List[Any]) -> None:
+    """Заявка в группе: ответы модераторов на ее сообщения уйдут пользователю"""
+    message_index.add_results(card_number, posts)
+    logger.info(f"Заявка {card_number} отправлена в группу модерации")
+
+
 async def forward_text_to_moderation(message, card_number: str, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Пересылка текста в группу модерации (асинхронная версия)"""
-    text = f"[{card_number}] пользователь: {message.text}"
-
-    # Разделяем если длинное
-    for part in split_long_message(text):
-        await context.bot.send_message(
-            chat_id=Config.MODERATION_CHAT_ID,
-            text=part
-        )
+    """Пересылка текста в группу модерации (склеивается в дайджест по заявке)"""
+    moderation_digest.add_text(context.bot, card_number, message.text)
+
+
+async def reply_to_moderator(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str) -> asyncio.Future:
+    """
+    Ответ на команду в группе модерации через очередь отправки. Не ждет
+    отправки (лимит группы): возвращает future, ошибка - в лог
+    """
+    return send_in_background(send_queue.send_message(
+        context.bot,
+        update.effective_chat.id,
+        text,
+        Priority.HIGH,
+        reply_to_message_id=update.message.message_id
+    ), "ответ модератору")
 
 
 # ============================= АДМИН КОМАНДЫ =============================
@@ -330,7 +462,7 @@ async def admin_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         return
 
     if not context.args:
-        await update.message.reply_text("Использование: /info <номер>")
+        await reply_to_moderator(update, context, "Использование: /info <номер>")
         return
 
     input_number = context.args[0]
@@ -338,21 +470,21 @@ async def admin_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     # Проверяем формат
     match = re.match(Config.INFO_PATTERN, f"/info {input_number}")
     if not match:
-        await update.message.reply_text("Неверный формат номера. Используйте: /info 123")
+        await reply_to_moderator(update, context, "Неверный формат номера. Используйте: /info 123")
         return
 
     card_number = match.group(1).zfill(4)
     card = CardManager.load_card(card_number)
 
     if not card:
-        await update.message.reply_text(f"Заявка {card_number} не найдена")
+        await reply_to_moderator(update, context, f"Заявка {card_number} не найдена")
         return
 
     # Отправляем информацию о карточке
     info_text = CardManager.format_detailed(card)
 
     for part in split_long_message(info_text):
-        await update.message.reply_text(part)
+        await reply_to_moderator(update, context, part)
 
     # Логируем команду
     log_admin_command(update, "info", card_number)
@@ -364,7 +496,7 @@ async def admin_msg(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         return
 
     if not context.args or len(context.args) < 2:
-        await update.message.reply_text("Использование: /msg <номер> <текст>")
+        await reply_to_moderator(update, context, "Использование: /msg <номер> <текст>")
         return
 
     input_number = context.args[0]
@@ -373,24 +505,21 @@ async def admin_msg(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     # Проверяем формат
     match = re.match(Config.MSG_PATTERN, f"/msg {input_number} {text}")
     if not match:
-        await update.message.reply_text("Неверный формат. Используйте: /msg 123 Текст сообщения")
+        await reply_to_moderator(update, context, "Неверный формат. Используйте: /msg 123 Текст сообщения")
         return
 
     card_number = match.group(1).zfill(4)
     card = CardManager.load_card(card_number)
 
     if not card:
-        await update.message.reply_text(f"Заявка {card_number} не найдена")
+        await reply_to_moderator(update, context, f"Заявка {card_number} не найдена")
         return
 
     user_id = card["account_meta"]["user_id"]
 
     try:
         # Отправляем сообщение пользователю
-        await context.bot.send_message(
-            chat_id=user_id,
-            text=text
-        )
+        await send_queue.send_message(context.bot, user_id, text, Priority.HIGH)
 
         # Записываем в историю
         history_entry = create_history_entry(
@@ -404,150 +533,304 @@ async def admin_msg(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             }
         )
 
-        CardManager.update_card(card_number, {}, history_entry)
+        await CardManager.update_card_async(card_number, {}, history_entry)
 
-        await update.message.reply_text(f"Сообщение отправлено пользователю {card_number}")
+        await reply_to_moderator(update, context, f"Сообщение отправлено пользователю {card_number}")
 
         # Логируем команду
         log_admin_command(update, "msg", card_number)
 
     except Exception as e:
-        await update.message.reply_text(f"Ошибка отправки: {str(e)}")
+        await reply_to_moderator(update, context, f"Ошибка отправки: {str(e)}")
 
 
-async def admin_approve(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Команда /approve <NNNN> (асинхронная версия)"""
-    if update.effective_chat.id != Config.MODERATION_CHAT_ID:
-        return
+CARD_PREFIX_RE = re.compile(r"^\[(\d{4})\]")
 
-    if not context.args:
-        await update.message.reply_text("Использование: /approve <номер>")
-        return
-
-    input_number = context.args[0]
 
-    # Проверяем формат
-    match = re.match(Config.APPROVE_PATTERN, f"/approve {input_number}")
-    if not match:
-        await update.message.reply_text("Неверный формат. Используйте: /approve 123")
+async def moderator_reply(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Ответ (reply) модератора на пост бота в группе модерации уходит
+    пользователю заявки: номер берется из индекса message_id -> заявка.
+    В индексе только посты заявок и пересланные сообщения пользователей,
+    вывод команд модераторов (/info) пользователю не адресуется
+    """
+    message = update.message
+    replied = message.reply_to_message
+
+    card_number = message_index.get(replied.message_id)
+    if card_number is None:
+        # Посты бота до появления индекса: префикс [NNNN] по ТЗ.
+        # Сообщения модераторов с таким префиксом - переписка, а не пост заявки
+        if not replied.from_user or replied.from_user.id != context.bot.id:
+            return
+        match = CARD_PREFIX_RE.match(replied.text or replied.caption or "")
+        if not match:
+            return  # Обычная переписка модераторов
+        card_number = match.group(1)
+
+    card = await asyncio.to_thread(CardManager.load_card, card_number)
+    if not card:
         return
 
-    card_number = match.group(1).zfill(4)
-    card = CardManager.load_card(card_number)
+    user_id = card["account_meta"]["user_id"]
+    text = message.text or message.caption or ""
 
-    if not card:
-        await update.message.reply_text(f"Заявка {card_number} не найдена")
+    try:
+        if message.text:
+            await send_queue.send_message(context.bot, user_id, text, Priority.HIGH)
+        else:
+            # Медиа копируем как есть, вместе с подписью
+            await send_queue.submit(
+                context.bot.copy_message, user_id, Priority.HIGH,
+                from_chat_id=message.chat.id, message_id=message.message_id
+            )
+    except Exception as e:
+        await reply_to_moderator(update, context, f"Ошибка отправки пользователю {card_number}: {e}")
         return
 
-    # Создаем запись истории
     history_entry = create_history_entry(
         source="admin",
         entry_type="command",
-        text="Заявка одобрена",
+        text=f"Сообщение от модератора: {text}" if text else "Медиа от модератора",
         meta={
             "admin_id": update.effective_user.id,
             "admin_username": update.effective_user.username or "",
-            "command": "approve"
+            "command": "reply",
+            "message_id": message.message_id
         }
     )
+    await CardManager.update_card_async(card_number, {}, history_entry)
+
+    # Подтверждение реакцией, без отдельного сообщения в чат и без ожидания очереди группы
+    send_in_background(send_queue.submit(
+        context.bot.set_message_reaction, message.chat.id, Priority.LOW,
+        message_id=message.message_id, reaction="👍"
+    ), "реакция на ответ модератора")
+
+    log_admin_command(update, "reply", card_number)
+
+
+DECISIONS = {
+    "approve": {
+        "decision": "approved",
+        "pattern": Config.APPROVE_PATTERN,
+        "history": "Заявка одобрена",
+        "done": "одобрена",
+        "done_many": "Одобрено",
+        "mark": "✅ Одобрена",
+    },
+    "reject": {
+        "decision": "rejected",
+        "pattern": Config.REJECT_PATTERN,
+        "history": "Заявка отклонена",
+        "done": "отклонена",
+        "done_many": "Отклонено",
+        "mark": "❌ Отклонена",
+    },
+}
+
+
+def decision_message(decision: str, card_number: str) -> str:
+    """Текст уведомления пользователю о решении"""
+    if decision == "approved":
+        return Config.APPROVE_MESSAGE.format(number=card_number, url=Config.PAYMENT_URL)
+    return Config.REJECT_MESSAGE.format(number=card_number)
+
+
+async def record_decisions(cards: Dict[str, dict], command: str, admin) -> Tuple[List[str], List[str], List[str]]:
+    """
+    Запись решения по загруженным карточкам одним пакетом; уведомления
+    пользователям ставятся в outbox. Возвращает (записаны, пропущены, ошибки)
+    """
+    options = DECISIONS[command]
+    decision = options["decision"]
 
-    # Обновляем статус
-    success = CardManager.update_card(
-        card_number,
-        {
-            "status": "approved",
-            "decision": "approved"
-        },
-        history_entry
+    # Создаем запись истории
+    history_entry = create_history_entry(
+        source="admin",
+        entry_type="command",
+        text=options["history"],
+        meta={
+            "admin_id": admin.id,
+            "admin_username": admin.username or "",
+            "command": command
+        }
     )
 
-    if not success:
-        await update.message.reply_text("Ошибка обновления статуса")
+    # Решение и уведомление пользователю пишутся одной операцией,
+    # отправку выполняет outbox в фоне
+    outbox_entries = {
+        card_number: create_outbox_entry(card["account_meta"]["user_id"], decision_message(decision, card_number))
+        for card_number, card in cards.items()
+    }
+
+    def decide(card_number: str):
+        def apply(card: dict) -> Optional[str]:
+            # Уже принятое решение не повторяем (и не дублируем уведомление);
+            # проверка по карточке под блокировкой, а не по загруженной ранее
+            if card["decision"] == decision:
+                return SKIPPED
+            card.update(status=decision, decision=decision)
+            card["history"].append(history_entry)
+            card.setdefault("outbox", []).append(outbox_entries[card_number])
+        return apply
+
+    results = await CardManager.modify_cards_async(
+        {card_number: decide(card_number) for card_number in cards}, fenced=True
+    )
+
+    done = []
+    skipped = []
+    failed = []
+    for card_number, result in results.items():
+        if result == SKIPPED:
+            skipped.append(card_number)
+        elif not result:
+            failed.append(card_number)
+        else:
+            notification_outbox.schedule(card_number, outbox_entries[card_number])
+            done.append(card_number)
+
+    return done, skipped, failed
+
+
+async def apply_decision(update: Update, context: ContextTypes.DEFAULT_TYPE, command: str) -> None:
+    """
+    Общая часть /approve и /reject для одной заявки или пакета (/approve 12 15 20-35).
+    Пакет проверяется целиком, статусы пишутся одним пакетом, уведомления
+    пользователям уходят через outbox и очередь отправки
+    """
+    if update.effective_chat.id != Config.MODERATION_CHAT_ID:
         return
 
-    # Отправляем сообщение пользователю
-    user_id = card["account_meta"]["user_id"]
+    options = DECISIONS[command]
+
+    if not context.args:
+        await reply_to_moderator(update, context, f"Использование: /{command} <номер> [номер|начало-конец ...]")
+        return
+
+    # Проверяем формат
+    match = re.match(options["pattern"], f"/{command} {' '.join(context.args)}")
     try:
-        await context.bot.send_message(
-            chat_id=user_id,
-            text=Config.APPROVE_MESSAGE.format(
-                number=card_number,
-                url=Config.PAYMENT_URL
-            )
-        )
-    except Exception as e:
-        await update.message.reply_text(f"Заявка одобрена, но не удалось уведомить пользователя: {e}")
+        if not match:
+            raise ValueError("Неверный формат")
+        card_numbers = parse_card_numbers(match.group(1).split())
+    except ValueError as e:
+        await reply_to_moderator(update, context, f"{e}. Используйте: /{command} 123 или /{command} 12 15 20-35")
+        return
 
-    await update.message.reply_text(f"Заявка {card_number} одобрена")
+    cards = await asyncio.to_thread(CardManager.load_cards, card_numbers)
+    missing = [number for number, card in cards.items() if not card]
+    if missing:
+        await reply_to_moderator(update, context, f"Заявки не найдены: {', '.join(missing)}. Ничего не изменено")
+        return
 
-    # Логируем команду
-    log_admin_command(update, "approve", card_number)
+    done, skipped, failed = await record_decisions(cards, command, update.effective_user)
+    for card_number in done:
+        log_admin_command(update, command, card_number)
+
+    # Одна заявка - короткий ответ, как раньше
+    if len(card_numbers) == 1:
+        card_number = card_numbers[0]
+        if failed:
+            text = "Ошибка обновления статуса"
+        elif skipped:
+            text = f"Заявка {card_number} уже {options['done']}"
+        else:
+            text = f"Заявка {card_number} {options['done']}"
+        await reply_to_moderator(update, context, text)
+        return
+
+    lines = [f"{options['done_many']}: {len(done)} из {len(card_numbers)}"]
+    if done:
+        lines.append(", ".join(done))
+    if skipped:
+        lines.append(f"Решение уже принято: {', '.join(skipped)}")
+    if failed:
+        lines.append(f"Ошибка обновления: {', '.join(failed)}")
+
+    for part in split_long_message("\n".join(lines)):
+        await reply_to_moderator(update, context, part)
+
+
+async def admin_approve(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Команда /approve <NNNN> [NNNN|начало-конец ...] (асинхронная версия)"""
+    await apply_decision(update, context, "approve")
 
 
 async def admin_reject(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Команда /reject <NNNN> (асинхронная версия)"""
-    if update.effective_chat.id != Config.MODERATION_CHAT_ID:
-        return
+    """Команда /reject <NNNN> [NNNN|начало-конец ...] (асинхронная версия)"""
+    await apply_decision(update, context, "reject")
 
-    if not context.args:
-        await update.message.reply_text("Использование: /reject <номер>")
-        return
 
-    input_number = context.args[0]
+def mark_moderation_post(context: ContextTypes.DEFAULT_TYPE, message, card_number: str, mark: str) -> None:
+    """Отметка решения в самом посте заявки (без ожидания очереди группы); кнопки решения убираются"""
+    markup = moderation_keyboard(card_number, decided=True)
+    edit = {"message_id": message.message_id, "reply_markup": markup}
 
-    # Проверяем формат
-    match = re.match(Config.REJECT_PATTERN, f"/reject {input_number}")
-    if not match:
-        await update.message.reply_text("Неверный формат. Используйте: /reject 123")
-        return
+    if message.caption is not None:
+        caption = f"{message.caption}\n\n{mark}"
+        if len(caption) <= Config.MAX_CAPTION_LENGTH:
+            func, edit["caption"] = context.bot.edit_message_caption, caption
+        else:
+            func = context.bot.edit_message_reply_markup
+    else:
+        text = f"{message.text}\n\n{mark}"
+        if len(text) <= Config.MAX_MESSAGE_LENGTH:
+            func, edit["text"] = context.bot.edit_message_text, text
+        else:
+            func = context.bot.edit_message_reply_markup
+
+    send_in_background(
+        send_queue.submit(func, message.chat.id, Priority.HIGH, **edit), f"отметка решения в посте заявки {card_number}"
+    )
 
-    card_number = match.group(1).zfill(4)
-    card = CardManager.load_card(card_number)
 
+async def moderation_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Кнопки Одобрить / Отклонить / Инфо под заявкой в группе модерации"""
+    query = update.callback_query
+    if not query.message or query.message.chat.id != Config.MODERATION_CHAT_ID:
+        await query.answer()
+        return
+
+    _, action, card_number = query.data.split(":", 2)
+    card = await asyncio.to_thread(CardManager.load_card, card_number)
     if not card:
-        await update.message.reply_text(f"Заявка {card_number} не найдена")
+        await query.answer(f"Заявка {card_number} не найдена", show_alert=True)
         return
 
-    # Создаем запись истории
-    history_entry = create_history_entry(
-        source="admin",
-        entry_type="command",
-        text="Заявка отклонена",
-        meta={
-            "admin_id": update.effective_user.id,
-            "admin_username": update.effective_user.username or "",
-            "command": "reject"
-        }
-    )
+    if action == "info":
+        await query.answer()
+        for part in split_long_message(CardManager.format_detailed(card)):
+            send_in_background(send_queue.send_message(
+                context.bot, Config.MODERATION_CHAT_ID, part, Priority.HIGH,
+                reply_to_message_id=query.message.message_id
+            ), f"инфо по заявке {card_number}")
+        log_admin_command(update, "info", card_number)
+        return
 
-    # Обновляем статус
-    success = CardManager.update_card(
-        card_number,
-        {
-            "status": "rejected",
-            "decision": "rejected"
-        },
-        history_entry
-    )
+    if action not in DECISIONS:
+        await query.answer()
+        return
 
-    if not success:
-        await update.message.reply_text("Ошибка обновления статуса")
+    options = DECISIONS[action]
+    done, skipped, failed = await record_decisions({card_number: card}, action, update.effective_user)
+
+    if failed:
+        await query.answer("Ошибка обновления статуса", show_alert=True)
+        return
+    if skipped:
+        await query.answer(f"Заявка {card_number} уже {options['done']}")
         return
 
-    # Отправляем сообщение пользователю
-    user_id = card["account_meta"]["user_id"]
-    try:
-        await context.bot.send_message(
-            chat_id=user_id,
-            text=Config.REJECT_MESSAGE.format(number=card_number)
-        )
-    except Exception as e:
-        await update.message.reply_text(f"Заявка отклонена, но не удалось уведомить пользователя: {e}")
+    # Ответ на нажатие - всплывающее уведомление, без сообщений в чат
+    await query.answer(f"Заявка {card_number} {options['done']}")
 
-    await update.message.reply_text(f"Заявка {card_number} отклонена")
+    admin = update.effective_user
+    who = f"@{admin.username}" if admin.username else admin.full_name
+    mark_moderation_post(context, query.message, card_number, f"{options['mark']}: {who}")
 
-    # Логируем команду
-    log_admin_command(update, "reject", card_number)
+    log_admin_command(update, action, card_number)
 
 
 async def admin_list_moscow(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -558,7 +841,7 @@ async def admin_list_moscow(update: Update, context: ContextTypes.DEFAULT_TYPE)
     cards = CardManager.get_cards_by_city("Москва")
 
     if not cards:
-        await update.message.reply_text("Нет заявок из Москвы")
+        await reply_to_moderator(update, context, "Нет заявок из Москвы")
         return
 
     # Формируем список
@@ -570,7 +853,7 @@ async def admin_list_moscow(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     # Разделяем на части если длинно
     for part in split_long_message(result, 3000):
-        await update.message.reply_text(part)
+        await reply_to_moderator(update, context, part)
 
     log_admin_command(update, "list_moscow", "")
 
@@ -583,7 +866,7 @@ async def admin_list_nomoscow(update: Update, context: ContextTypes.DEFAULT_TYPE
     cards = CardManager.get_cards_by_city("Не Москва")
 
     if not cards:
-        await update.message.reply_text("Нет заявок не из Москвы")
+        await reply_to_moderator(update, context, "Нет заявок не из Москвы")
         return
 
     # Формируем список
@@ -595,15 +878,118 @@ async def admin_list_nomoscow(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     # Разделяем на части если длинно
     for part in split_long_message(result, 3000):
-        await update.message.reply_text(part)
+        await reply_to_moderator(update, context, part)
 
     log_admin_command(update, "list_nomoscow", "")
 
 
+async def admin_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Команда /broadcast <город[:статус]> <текст>: рассылка заявителям"""
+    if update.effective_chat.id != Config.MODERATION_CHAT_ID:
+        return
+
+    # Текст берем из сообщения целиком, чтобы сохранить переносы строк
+    parts = update.message.text.split(maxsplit=2)
+    if len(parts) < 3:
+        await reply_to_moderator(
+            update, context,
+            "Использование: /broadcast <moscow|nomoscow|all>[:статус] <текст>\n"
+            "Пример: /broadcast moscow:approved Занятие переносится на 19:00"
+        )
+        return
+
+    try:
+        job = await broadcasts.create(context.bot, parts[1], parts[2], update.effective_user.id)
+    except ValueError as e:
+        await reply_to_moderator(update, context, str(e))
+        return
+
+    await reply_to_moderator(
+        update, context,
+        f"Рассылка {job['id']} запущена: получателей {len(job['recipients'])}\n"
+        f"Статус: /broadcast_status {job['id']}, отмена: /broadcast_cancel {job['id']}"
+    )
+    log_admin_command(update, "broadcast", "")
+
+
+async def admin_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Команда /profile [секунды] [stack|cprofile]: профиль работающего бота"""
+    if update.effective_chat.id != Config.MODERATION_CHAT_ID:
+        return
+
+    args = context.args or []
+    try:
+        seconds = float(args[0]) if args else Config.PROFILE_DEFAULT_SECONDS
+    except ValueError:
+        await reply_to_moderator(update, context, "Использование: /profile [секунды] [stack|cprofile]")
+        return
+    mode = args[1].lower() if len(args) > 1 else "stack"
+
+    # Профиль идет в фоне: команда не держит очередь обработчика модератора
+    try:
+        seconds = profiler.start(context.bot, seconds, mode)
+    except (ValueError, RuntimeError) as e:
+        await reply_to_moderator(update, context, str(e))
+        return
+
+    await reply_to_moderator(update, context, f"Профилирование ({mode}) на {seconds:.0f}с запущено")
+    log_admin_command(update, "profile", "")
+
+
+async def admin_mem(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Команда /mem [stop]: отчет о памяти (первый вызов включает tracemalloc)"""
+    if update.effective_chat.id != Config.MODERATION_CHAT_ID:
+        return
+
+    if context.args and context.args[0].lower() == "stop":
+        memory_inspector.stop()
+        await reply_to_moderator(update, context, "Трассировка аллокаций выключена")
+        return
+
+    for part in split_long_message(await memory_inspector.report_async(), 3000):
+        await reply_to_moderator(update, context, part)
+    log_admin_command(update, "mem", "")
+
+
+async def admin_broadcast_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Команда /broadcast_status [id]: прогресс рассылки (без id - последней)"""
+    if update.effective_chat.id != Config.MODERATION_CHAT_ID:
+        return
+
+    if context.args:
+        job = await asyncio.to_thread(broadcasts.load, context.args[0])
+    else:
+        jobs = await asyncio.to_thread(broadcasts.list_jobs)
+        job = jobs[-1] if jobs else None
+
+    if not job:
+        await reply_to_moderator(update, context, "Рассылка не найдена")
+        return
+
+    await reply_to_moderator(update, context, broadcasts.format_status(job))
+
+
+async def admin_broadcast_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Команда /broadcast_cancel <id>"""
+    if update.effective_chat.id != Config.MODERATION_CHAT_ID:
+        return
+
+    if not context.args:
+        await reply_to_moderator(update, context, "Использование: /broadcast_cancel <id>")
+        return
+
+    if await broadcasts.cancel(context.args[0]):
+        await reply_to_moderator(update, context, f"Рассылка {context.args[0]} отменена")
+        log_admin_command(update, "broadcast_cancel", "")
+    else:
+        await reply_to_moderator(update, context, f"Рассылка {context.args[0]} не найдена или уже завершена")
+
+
 def log_admin_command(update: Update, command: str, card_number: str) -> None:
     """Логирование админ-команд"""
     admin = update.effective_user
-    timestamp = update.message.date.isoformat()
+    # Для нажатий кнопок сообщения команды нет - берем текущее время
+    timestamp = (update.message.date if update.message else datetime.now(timezone.utc)).isoformat()
 
     log_entry = (
         f"{timestamp} - "
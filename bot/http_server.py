@@ -0,0 +1,170 @@
+import asyncio
+import json
+import logging
+from http import HTTPStatus
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit, parse_qsl
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 10 * 1024 * 1024
+READ_TIMEOUT = 10.0  # Секунд на заголовки и тело начатого запроса
+IDLE_TIMEOUT = 30.0  # Секунд ожидания следующего запроса keep-alive соединения
+
+
+class Request:
+    """Входящий HTTP запрос"""
+
+    def __init__(self, method: str, target: str, headers: Dict[str, str], body: bytes):
+        parts = urlsplit(target)
+        self.method = method
+        self.path = parts.path
+        self.query = dict(parse_qsl(parts.query))
+        self.headers = headers  # Имена заголовков в нижнем регистре
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body.decode("utf-8")) if self.body else {}
+
+
+# Ответ обработчика: (статус, content-type, тело)
+Response = Tuple[int, str, bytes]
+Handler = Callable[[Request], Awaitable[Response]]
+
+
+def json_response(data, status: int = 200) -> Response:
+    return status, "application/json", json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+def text_response(text: str, status: int = 200, content_type: str = "text/plain; charset=utf-8") -> Response:
+    return status, content_type, text.encode("utf-8")
+
+
+class HttpServer:
+    """
+    Минимальный HTTP/1.1 сервер на asyncio (keep-alive, Content-Length).
+    Без внешних зависимостей; используется для webhook и служебных эндпоинтов.
+    Медленный клиент не держит слот: запрос читается не дольше read_timeout,
+    простаивающее keep-alive соединение закрывается через idle_timeout
+    """
+
+    def __init__(self, host: str, port: int, max_connections: int = 100,
+                 read_timeout: float = READ_TIMEOUT, idle_timeout: float = IDLE_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        self.read_timeout = read_timeout
+        self.idle_timeout = idle_timeout
+        self.active_connections = 0
+        self._routes: Dict[Tuple[str, str], Handler] = {}
+        self._prefix_routes: Dict[Tuple[str, str], Handler] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def route(self, method: str, path: str, handler: Handler, prefix: bool = False) -> None:
+        """Регистрация обработчика (prefix=True - по префиксу пути)"""
+        routes = self._prefix_routes if prefix else self._routes
+        routes[(method.upper(), path)] = handler
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        # Если порт 0 - запоминаем выданный системой
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"HTTP сервер слушает {self.host}:{self.port}")
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _find_handler(self, method: str, path: str) -> Optional[Handler]:
+        handler = self._routes.get((method, path))
+        if handler:
+            return handler
+        for (route_method, prefix), handler in self._prefix_routes.items():
+            if route_method == method and path.startswith(prefix):
+                return handler
+        return None
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        if self.active_connections >= self.max_connections:
+            await self._write_response(writer, (503, "text/plain", b"Too many connections"), keep_alive=False)
+            writer.close()
+            return
+
+        self.active_connections += 1
+        try:
+            while True:
+                request, keep_alive = await self._read_request(reader)
+                if request is None:
+                    break
+
+                handler = self._find_handler(request.method, request.path)
+                if handler is None:
+                    response = text_response("Not Found", 404)
+                else:
+                    try:
+                        response = await handler(request)
+                    except Exception as e:
+                        logger.error(f"Ошибка обработки {request.method} {request.path}: {e}", exc_info=True)
+                        response = text_response("Internal Server Error", 500)
+
+                await self._write_response(writer, response, keep_alive)
+                if not keep_alive:
+                    break
+        except asyncio.TimeoutError:
+            logger.debug(f"HTTP соединение закрыто: запрос не получен за {self.read_timeout}с")
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            logger.debug(f"HTTP соединение закрыто: {e}")
+        except asyncio.CancelledError:
+            # Остановка event loop с открытым keep-alive соединением
+            pass
+        finally:
+            self.active_connections -= 1
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[Optional[Request], bool]:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+        except asyncio.TimeoutError:
+            return None, False  # Простаивающее keep-alive соединение
+        if not request_line:
+            return None, False
+
+        # Остаток запроса - под общим таймаутом (asyncio.TimeoutError)
+        return await asyncio.wait_for(self._read_rest(reader, request_line), self.read_timeout)
+
+    @staticmethod
+    async def _read_rest(reader: asyncio.StreamReader, request_line: bytes) -> Tuple[Request, bool]:
+        method, target, version = request_line.decode("latin-1").strip().split(" ", 2)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length", "0"))
+        if length > MAX_BODY_SIZE:
+            raise ValueError(f"Слишком большое тело запроса: {length}")
+        body = await reader.readexactly(length) if length else b""
+
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+        return Request(method.upper(), target, headers, body), keep_alive
+
+    @staticmethod
+    async def _write_response(writer: asyncio.StreamWriter, response: Response, keep_alive: bool) -> None:
+        status, content_type, body = response
+        head = (
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            "\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
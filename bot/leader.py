@@ -0,0 +1,252 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import Application, ConversationHandler
+
+from .config import Config
+from .database import named_lock, write_fence
+from .handlers import restore_sessions
+from .lifecycle import run_application, stop_event_from_signals
+from .sender import send_queue
+from .webhook import application_deliver, build_webhook_server, set_webhook
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLease:
+    """
+    Lease лидера в файле: {holder, epoch, expires_at}. Чтение-изменение-запись
+    под flock, лидер продлевает lease каждые LEADER_HEARTBEAT секунд.
+    Если лидер не продлил lease за LEADER_LEASE_TTL - его место свободно.
+    epoch растет при каждой смене держателя - fencing token для write_fence.
+    Методы блокируются на flock и fsync - из event loop вызываются через to_thread
+    """
+
+    def __init__(self, path: Path, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.valid_until = 0.0  # По monotonic: до этого момента lease точно наш
+        self.epoch = 0
+        self.lost = False
+        self.released = False
+
+    def read(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write(self, lease: Dict[str, Any]) -> None:
+        temp_path = self.path.with_suffix('.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(lease, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+    def try_acquire(self) -> bool:
+        """Захват или продление lease; False - lease держит другой живой процесс"""
+        started = time.monotonic()
+        now = time.time()
+
+        with named_lock("leader"):
+            # Продление из потока могло задержаться дольше release при остановке
+            if self.released:
+                return False
+            lease = self.read()
+            if lease.get("holder") not in (None, self.holder) and lease.get("expires_at", 0) > now:
+                return False
+
+            # Продление сохраняет epoch, захват - увеличивает
+            epoch = lease.get("epoch", 0) + (lease.get("holder") != self.holder)
+            self._write({
+                "holder": self.holder,
+                "epoch": epoch,
+                "pid": os.getpid(),
+                "renewed_at": now,
+                "expires_at": now + self.ttl,
+            })
+
+        self.valid_until = started + self.ttl
+        self.epoch = epoch
+        return True
+
+    def release(self) -> None:
+        """Освобождение lease для мгновенного переключения на standby"""
+        with named_lock("leader"):
+            self.released = True
+            if self.read().get("holder") == self.holder:
+                self._write({"holder": None, "epoch": self.epoch, "expires_at": 0})
+
+
+class CardTailer:
+    """Поиск изменившихся карточек по mtime (прогрев кэшей standby)"""
+
+    def __init__(self):
+        self._seen: Dict[str, int] = {}
+
+    def changed_cards(self) -> List[Dict[str, Any]]:
+        cards = []
+        with os.scandir(Config.CARDS_DIR) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    mtime = entry.stat().st_mtime_ns
+                    if self._seen.get(entry.name) == mtime:
+                        continue
+                    # Без валидации по схеме: нужны только номер, статус и user_id
+                    with open(entry.path, 'r', encoding='utf-8') as f:
+                        cards.append(json.load(f))
+                    self._seen[entry.name] = mtime
+                except (OSError, ValueError) as e:
+                    logger.debug(f"Пропуск {entry.name}: {e}")
+        return cards
+
+
+def registration_conversation(application: Application) -> Optional[ConversationHandler]:
+    """ConversationHandler регистрации: его состояния восстанавливаются вместе с сессиями"""
+    for handler in application.handlers.get(0, []):
+        if isinstance(handler, ConversationHandler):
+            return handler
+    return None
+
+
+async def warm_sessions(tailer: CardTailer, shard: Optional[Tuple[int, int]] = None,
+                        conversation: Optional[ConversationHandler] = None) -> int:
+    """Подтягивание сессий пользователей из изменившихся карточек; обход каталога - в потоке"""
+    cards = await asyncio.to_thread(tailer.changed_cards)
+    restored = restore_sessions(cards, shard, conversation)
+    if restored:
+        logger.info(f"Восстановлено сессий пользователей: {restored}")
+    return restored
+
+
+async def wait_for_leadership(lease: LeaderLease, stop_event: asyncio.Event,
+                              on_standby: Callable[[], Awaitable[Any]] = None) -> bool:
+    """Режим standby до захвата lease; False - остановлены раньше"""
+    logged = False
+    while not stop_event.is_set():
+        if await asyncio.to_thread(lease.try_acquire):
+            logger.info(f"Получено лидерство: {lease.holder}")
+            return True
+
+        if not logged:
+            holder = (await asyncio.to_thread(lease.read)).get("holder")
+            logger.info(f"Standby: лидер {holder}")
+            logged = True
+
+        if on_standby:
+            await on_standby()
+
+        try:
+            await asyncio.wait_for(stop_event.wait(), Config.LEADER_RETRY_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+    return False
+
+
+def suspend_work(reason: str) -> None:
+    """Пропущен heartbeat: отправка и fenced записи стоят до продления lease"""
+    if not write_fence.suspended:
+        logger.warning(f"Отправка и запись решений приостановлены: {reason}")
+    write_fence.suspended = True
+    send_queue.pause()
+
+
+def resume_work() -> None:
+    if write_fence.suspended:
+        logger.info("Lease продлен, отправка и запись решений возобновлены")
+    write_fence.suspended = False
+    send_queue.resume()
+
+
+async def keep_leadership(lease: LeaderLease, stop_event: asyncio.Event) -> None:
+    """
+    Heartbeat лидера. Пропущенный heartbeat сразу приостанавливает отправку
+    и записи решений; потеря lease - остановка процесса
+    """
+    while not stop_event.is_set():
+        await asyncio.sleep(Config.LEADER_HEARTBEAT)
+        try:
+            if await asyncio.to_thread(lease.try_acquire):
+                resume_work()
+                continue
+            logger.error("Lease лидера перехвачен другим процессом")
+        except Exception as e:
+            logger.error(f"Ошибка продления lease: {e}")
+            suspend_work(str(e))
+            if time.monotonic() < lease.valid_until - Config.LEADER_HEARTBEAT:
+                continue  # Lease еще действует, попробуем снова
+
+        suspend_work("lease потерян")
+        lease.lost = True
+        stop_event.set()
+        return
+
+
+def update_source(application: Application):
+    """setup/teardown источника обновлений по UPDATE_MODE"""
+    if Config.UPDATE_MODE == "webhook":
+        server = build_webhook_server(application_deliver(application))
+
+        async def setup() -> None:
+            await server.start()
+            await set_webhook(application.bot)
+
+        return setup, server.stop
+
+    async def start_polling() -> None:
+        await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+
+    async def stop_polling() -> None:
+        if application.updater.running:
+            await application.updater.stop()
+
+    return start_polling, stop_polling
+
+
+async def serve_as_leader(application: Application) -> int:
+    """
+    Запуск с выбором лидера: обновления принимает только держатель lease,
+    standby прогревает сессии и подхватывает работу после истечения lease
+    """
+    stop_event = stop_event_from_signals()
+    lease = LeaderLease(Config.LEADER_LEASE_FILE, Config.LEADER_LEASE_TTL)
+    tailer = CardTailer()
+    conversation = registration_conversation(application)
+
+    if not await wait_for_leadership(lease, stop_event, lambda: warm_sessions(tailer, conversation=conversation)):
+        return 0
+    write_fence.epoch = lease.epoch
+
+    # Догоняем изменения, сделанные прежним лидером до передачи lease
+    await warm_sessions(tailer, conversation=conversation)
+
+    heartbeat = asyncio.create_task(keep_leadership(lease, stop_event))
+    setup, teardown = update_source(application)
+    try:
+        await run_application(application, stop_event, setup, teardown)
+    finally:
+        heartbeat.cancel()
+        if not lease.lost:
+            await asyncio.to_thread(lease.release)
+
+    # Потеря lease - ненулевой код, systemd перезапустит процесс как standby
+    return 1 if lease.lost else 0
+
+
+def run_with_leader_election(application: Application) -> int:
+    """Синхронная обертка, как run_polling"""
+    return asyncio.run(serve_as_leader(application))
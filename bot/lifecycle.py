@@ -0,0 +1,48 @@
+import asyncio
+import signal
+from typing import Awaitable, Callable, Optional
+
+from telegram.ext import Application
+
+
+def stop_event_from_signals() -> asyncio.Event:
+    """Событие остановки, выставляемое по SIGINT/SIGTERM"""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):  # Windows
+            pass
+    return stop_event
+
+
+async def run_application(
+    application: Application,
+    stop_event: asyncio.Event,
+    setup: Optional[Callable[[], Awaitable[None]]] = None,
+    teardown: Optional[Callable[[], Awaitable[None]]] = None,
+) -> None:
+    """
+    Жизненный цикл Application как в run_polling (включая post_* хуки),
+    но с собственным источником обновлений: setup запускает его, teardown останавливает
+    """
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+
+    try:
+        if setup:
+            await setup()
+        await application.start()
+        await stop_event.wait()
+    finally:
+        if teardown:
+            await teardown()
+        if application.running:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional
+
+from .config import Config
+from .metrics import registry, running_handlers
+from .stats import percentile
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG_SECONDS = registry.histogram(
+    "bot_loop_lag_seconds", "Задержка планирования event loop",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+LOOP_BLOCKS = registry.counter(
+    "bot_loop_blocks_total", "Блокировки event loop дольше порога", ("handler",)
+)
+
+STACK_LIMIT = 12  # Кадров стека в отчете о блокировке
+
+
+class LoopLagMonitor:
+    """
+    Монитор задержки event loop. Задача в цикле спит interval секунд
+    и меряет, насколько позже проснулась - это время, на которое
+    цикл был занят чужим синхронным кодом. Поток-сторож проверяет
+    отметку задачи: если ее нет дольше порога, цикл заблокирован
+    прямо сейчас - снимается стек потока цикла и имя обработчика
+    текущей задачи. Так видно, какой код блокирует цикл (например,
+    синхронные вызовы CardManager внутри async обработчиков)
+    """
+
+    def __init__(self, interval: float, threshold: float, report_interval: float,
+                 window: int = 2000):
+        self.interval = interval
+        self.threshold = threshold
+        self.report_interval = report_interval
+        self._lags: Deque[float] = deque(maxlen=window)
+        self._heartbeat = time.monotonic()
+        self._stall: Optional[Dict[str, Any]] = None
+        self._stop = threading.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+
+        # Метрики
+        self.blocks = 0
+        self.max_lag = 0.0
+        self.by_handler: Counter = Counter()
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=20)  # Последние блокировки со стеком
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = self._loop.create_task(self._probe())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def _current_handler(self) -> str:
+        """Обработчик (или корутина) задачи, которая сейчас держит цикл"""
+        try:
+            task = asyncio.current_task(self._loop)
+        except RuntimeError:
+            task = None
+        if task is None:
+            return "callback"  # Колбэк вне задачи (call_soon, транспорт)
+        handler = running_handlers.get(task)
+        if handler:
+            return handler
+        coro = task.get_coro()
+        return getattr(coro, "__qualname__", None) or task.get_name()
+
+    def _sample_stack(self) -> List[str]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return []
+        # Кадры самого asyncio (run_forever, _run_once) не информативны
+        frames = [f for f in traceback.extract_stack(frame) if "asyncio" not in f.filename]
+        return traceback.format_list(frames[-STACK_LIMIT:])
+
+    def _watch(self) -> None:
+        """Поток-сторож: снимок стека, пока цикл еще заблокирован"""
+        period = max(self.threshold / 2, 0.01)
+        while not self._stop.wait(period):
+            stalled = time.monotonic() - self._heartbeat - self.interval
+            if stalled < self.threshold or self._stall is not None:
+                continue
+            self._stall = {
+                "handler": self._current_handler(),
+                "stack": self._sample_stack(),
+            }
+
+    async def _probe(self) -> None:
+        next_report = time.monotonic() + self.report_interval
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+
+            lag = max(0.0, now - started - self.interval)
+            self._lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            LOOP_LAG_SECONDS.observe(lag)
+
+            stall, self._stall = self._stall, None
+            if lag >= self.threshold:
+                self._record_block(lag, stall)
+
+            if now >= next_report:
+                next_report = now + self.report_interval
+                stats = self.stats()
+                logger.info(
+                    f"Задержка цикла: p50={stats['lag_p50'] * 1000:.1f}мс "
+                    f"p95={stats['lag_p95'] * 1000:.1f}мс p99={stats['lag_p99'] * 1000:.1f}мс "
+                    f"max={stats['lag_max'] * 1000:.1f}мс, блокировок: {self.blocks}"
+                )
+
+    def _record_block(self, lag: float, stall: Optional[Dict[str, Any]]) -> None:
+        # Короткая блокировка могла закончиться до проверки сторожа - тогда без стека
+        handler = stall["handler"] if stall else "unknown"
+        stack = stall["stack"] if stall else []
+
+        self.blocks += 1
+        self.by_handler[handler] += 1
+        LOOP_BLOCKS.inc(handler=handler)
+        self.recent.append({"at": time.time(), "lag": lag, "handler": handler, "stack": stack})
+
+        message = f"Event loop заблокирован на {lag * 1000:.0f}мс, обработчик: {handler}"
+        if stack:
+            message += "\n" + "".join(stack).rstrip()
+        logger.warning(message)
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики монитора: перцентили по последним замерам"""
+        # Интерполированные перцентили, как в отчетах tools/ и benchmarks/
+        lags = list(self._lags)
+        return {
+            "lag_p50": percentile(lags, 50),
+            "lag_p95": percentile(lags, 95),
+            "lag_p99": percentile(lags, 99),
+            "lag_max": self.max_lag,
+            "blocks": self.blocks,
+        }
+
+    def top_handlers(self, limit: int = 10) -> List[tuple]:
+        """Обработчики с наибольшим числом блокировок"""
+        return self.by_handler.most_common(limit)
+
+    async def close(self) -> None:
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._watchdog:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+
+# Глобальный монитор задержки event loop
+loop_monitor = LoopLagMonitor(
+    Config.LOOP_MONITOR_INTERVAL,
+    Config.LOOP_LAG_THRESHOLD,
+    Config.LOOP_LAG_REPORT_INTERVAL
+)
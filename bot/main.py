@@ -14,16 +14,39 @@ from telegram.ext import (
 )
 
 from .config import Config, check_config
+from .sender import send_queue
+from .digest import moderation_digest
+from .outbox import notification_outbox
+from .broadcast import broadcasts
+from .message_index import message_index
+from .metrics import registry, build_metrics_server, instrument_application, InstrumentedRequest
+from .loop_monitor import loop_monitor
+from .tracing import trace_log
+from .recorder import update_recorder
+from .profiler import profiler, install_profile_signal
+from .memory import memory_inspector, install_memory_signal
+from .enrichment import profile_cache
+from .database import card_locks, write_fence
+from .webhook import run_webhook
+from .dispatcher import build_update_processor
+from .cluster import run_supervisor
+from .leader import run_with_leader_election
 from .handlers import (
     start_command, city_callback, handle_fio, handle_extra,
     handle_user_message, admin_info, admin_msg, admin_approve,
     admin_reject, admin_list_moscow, admin_list_nomoscow,
-    error_handler, SELECTING_CITY, ENTERING_FIO, ENTERING_EXTRA
+    admin_broadcast, admin_broadcast_status, admin_broadcast_cancel, moderation_callback,
+    admin_profile, admin_mem,
+    moderator_reply,
+    error_handler, user_sessions, SELECTING_CITY, ENTERING_FIO, ENTERING_EXTRA
 )
 
 
-def setup_logging():
-    """Настройка логирования с RotatingFileHandler"""
+def setup_logging(suffix: str = ""):
+    """
+    Настройка логирования с RotatingFileHandler.
+    suffix - для отдельных файлов логов процессов кластера (info-worker0.log)
+    """
     formatter = logging.Formatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'
@@ -34,7 +57,7 @@ def setup_logging():
 
     # info.log
     info_handler = RotatingFileHandler(
-        Config.LOGS_DIR / "info.log",
+        Config.LOGS_DIR / f"info{suffix}.log",
         maxBytes=10 * 1024 * 1024,
         backupCount=5,
         encoding='utf-8'
@@ -45,7 +68,7 @@ def setup_logging():
 
     # errors.log
     error_handler_file = RotatingFileHandler(
-        Config.LOGS_DIR / "errors.log",
+        Config.LOGS_DIR / f"errors{suffix}.log",
         maxBytes=10 * 1024 * 1024,
         backupCount=5,
         encoding='utf-8'
@@ -64,32 +87,75 @@ def setup_logging():
     return logging.getLogger(__name__)
 
 
-def main():
-    """Основная функция запуска бота (синхронная)"""
-    print(f"\n{'=' * 60}")
-    print(f"ЗАПУСК БОТА С python-telegram-bot 20.7")
-    print(f"Режим: {'РАЗРАБОТКИ' if Config.DEBUG else 'ПРОДАКШЕНА'}")
-    print(f"Директория данных: {Config.DATA_DIR}")
-    print(f"{'=' * 60}\n")
+def make_post_init(outbox_owner: bool):
+    """
+    post_init: запуск outbox; неотправленные уведомления и незавершенные
+    рассылки поднимает только процесс, обрабатывающий команды модераторов
+    """
+    async def post_init(application: Application) -> None:
+        await asyncio.to_thread(message_index.load)
+        if Config.LOOP_MONITOR:
+            loop_monitor.start()
+        install_profile_signal(application.bot)
+        install_memory_signal(application.bot)
+        if Config.METRICS_PORT:
+            server = build_metrics_server(Config.METRICS_LISTEN, Config.METRICS_PORT)
+            await server.start()
+            application.bot_data["metrics_server"] = server
+        if outbox_owner:
+            await notification_outbox.recover()
+            await broadcasts.resume(application.bot)
+        notification_outbox.start(application.bot)
+    return post_init
 
-    # Проверка конфигурации
-    if not check_config():
-        print("\n❌ Ошибки конфигурации. Проверьте .env файл")
-        return 1
 
-    # Настройка логирования
-    logger = setup_logging()
-    logger.info("Бот запускается...")
+async def post_stop(application: Application) -> None:
+    """Остановка фоновых задач бота"""
+    await broadcasts.close()
+    await notification_outbox.close()
+    await moderation_digest.close()
+    await send_queue.close()
+    await message_index.close()  # Результаты последних отправок
+    server = application.bot_data.pop("metrics_server", None)
+    if server:
+        await server.stop()
+    await loop_monitor.close()
+    await profiler.close()
 
-    try:
-        # Создаем Application
-        application = Application.builder().token(Config.BOT_TOKEN).build()
-        logger.info("Application создан")
-    except Exception as e:
-        logger.error(f"Ошибка создания бота: {e}")
-        print(f"\n❌ Ошибка создания бота: {e}")
-        return 1
 
+def register_collectors(application: Application) -> None:
+    """Метрики компонентов из их stats() - в реестр метрик"""
+    registry.register_collector("dispatcher", application.update_processor.stats)
+    registry.register_collector("send_queue", send_queue.stats)
+    registry.register_collector("digest", moderation_digest.stats)
+    registry.register_collector("outbox", notification_outbox.stats)
+    registry.register_collector("fence", write_fence.stats)
+    registry.register_collector("message_index", message_index.stats)
+    registry.register_collector("profile_cache", profile_cache.stats)
+    registry.register_collector("card_locks", lambda: {"held": len(card_locks)})
+    registry.register_collector("loop", loop_monitor.stats)
+    registry.register_collector("tracing", trace_log.stats)
+    registry.register_collector("recorder", update_recorder.stats)
+
+
+def track_structures(application: Application) -> None:
+    """Структуры, размеры которых показывает /mem"""
+    memory_inspector.track("user_sessions", lambda: user_sessions)
+    for handler in application.handlers.get(0, []):
+        if isinstance(handler, ConversationHandler):
+            memory_inspector.track(f"conversation:{handler.name or 'main'}", lambda h=handler: h._conversations)
+    memory_inspector.track("user_data", lambda: application.user_data)
+    memory_inspector.track("chat_data", lambda: application.chat_data)
+    memory_inspector.track("profile_cache", lambda: profile_cache)
+    memory_inspector.track("message_index", lambda: message_index)
+    memory_inspector.track("send_queue", lambda: send_queue)
+    # У диспетчера - только очереди ключей (sessions - тот же user_sessions)
+    memory_inspector.track("dispatcher_keys", lambda: application.update_processor._tails)
+    memory_inspector.track("card_locks", lambda: card_locks)
+
+
+def register_handlers(application: Application) -> None:
+    """Регистрация всех обработчиков бота"""
     # ConversationHandler для регистрации
     conv_handler = ConversationHandler(
         entry_points=[CommandHandler('start', start_command)],
@@ -102,35 +168,105 @@ def main():
         per_message=False,  # Явно указываем
     )
 
-    try:
-        # Регистрируем все обработчики
-        application.add_handler(conv_handler)
-        application.add_handler(
-            MessageHandler(filters.TEXT & ~filters.COMMAND, handle_user_message)
+    application.add_handler(conv_handler)
+    # Ответы модераторов на посты заявок - до обработчика сообщений пользователей
+    application.add_handler(
+        MessageHandler(
+            filters.Chat(Config.MODERATION_CHAT_ID) & filters.REPLY & ~filters.COMMAND,
+            moderator_reply
         )
-        application.add_handler(
-            MessageHandler(
-                filters.PHOTO | filters.Document.ALL | filters.VOICE | filters.VIDEO | filters.AUDIO,
-                handle_user_message
-            )
+    )
+    application.add_handler(
+        MessageHandler(filters.TEXT & ~filters.COMMAND, handle_user_message)
+    )
+    application.add_handler(
+        MessageHandler(
+            filters.PHOTO | filters.Document.ALL | filters.VOICE | filters.VIDEO | filters.AUDIO,
+            handle_user_message
         )
+    )
 
-        # Админ команды
-        application.add_handler(CommandHandler('info', admin_info))
-        application.add_handler(CommandHandler('msg', admin_msg))
-        application.add_handler(CommandHandler('approve', admin_approve))
-        application.add_handler(CommandHandler('reject', admin_reject))
-        application.add_handler(CommandHandler('list_moscow', admin_list_moscow))
-        application.add_handler(CommandHandler('list_nomoscow', admin_list_nomoscow))
+    # Админ команды
+    application.add_handler(CommandHandler('info', admin_info))
+    application.add_handler(CommandHandler('msg', admin_msg))
+    application.add_handler(CommandHandler('approve', admin_approve))
+    application.add_handler(CommandHandler('reject', admin_reject))
+    application.add_handler(CommandHandler('list_moscow', admin_list_moscow))
+    application.add_handler(CommandHandler('list_nomoscow', admin_list_nomoscow))
+    application.add_handler(CommandHandler('broadcast', admin_broadcast))
+    application.add_handler(CommandHandler('broadcast_status', admin_broadcast_status))
+    application.add_handler(CommandHandler('broadcast_cancel', admin_broadcast_cancel))
+    application.add_handler(CommandHandler('profile', admin_profile))
+    application.add_handler(CommandHandler('mem', admin_mem))
+    application.add_handler(CallbackQueryHandler(moderation_callback, pattern='^mod:'))
 
-        # Обработчик ошибок
-        application.add_error_handler(error_handler)
+    # Обработчик ошибок
+    application.add_error_handler(error_handler)
 
-        logger.info("Все обработчики зарегистрированы")
 
+def build_application(with_updater: bool = True, outbox_owner: bool = True) -> Application:
+    """
+    Создание Application со всеми обработчиками.
+    with_updater=False - обновления подаются извне (воркер кластера),
+    outbox_owner - процесс, обрабатывающий команды модераторов
+    """
+    builder = (
+        Application.builder()
+        .token(Config.BOT_TOKEN)
+        .base_url(Config.BOT_API_BASE_URL)
+        .request(InstrumentedRequest(connection_pool_size=256))
+        .concurrent_updates(build_update_processor(user_sessions))
+        .post_init(make_post_init(outbox_owner))
+        .post_stop(post_stop)
+    )
+    if with_updater:
+        builder = builder.get_updates_request(InstrumentedRequest(connection_pool_size=1))
+    else:
+        builder = builder.updater(None)
+
+    application = builder.build()
+    register_handlers(application)
+
+    # Время всех обработчиков, включая добавленные позже в register_handlers
+    instrument_application(application)
+    register_collectors(application)
+    track_structures(application)
+    return application
+
+
+def main():
+    """Основная функция запуска бота (синхронная)"""
+    print(f"\n{'=' * 60}")
+    print(f"ЗАПУСК БОТА С python-telegram-bot 20.7")
+    print(f"Режим: {'РАЗРАБОТКИ' if Config.DEBUG else 'ПРОДАКШЕНА'}")
+    print(f"Директория данных: {Config.DATA_DIR}")
+    print(f"{'=' * 60}\n")
+
+    # Проверка конфигурации
+    if not check_config():
+        print("\n❌ Ошибки конфигурации. Проверьте .env файл")
+        return 1
+
+    # Настройка логирования
+    logger = setup_logging()
+    logger.info("Бот запускается...")
+
+    # Кластер: этот процесс только принимает обновления и раздает воркерам
+    if Config.WORKERS > 1:
+        logger.info(f"Режим кластера: {Config.WORKERS} воркеров")
+        try:
+            return run_supervisor()
+        except Exception as e:
+            logger.error(f"Критическая ошибка кластера: {e}", exc_info=True)
+            return 1
+
+    try:
+        # Создаем Application
+        application = build_application()
+        logger.info("Application создан, все обработчики зарегистрированы")
     except Exception as e:
-        logger.error(f"Ошибка регистрации обработчиков: {e}")
-        print(f"\n❌ Ошибка настройки обработчиков: {e}")
+        logger.error(f"Ошибка создания бота: {e}")
+        print(f"\n❌ Ошибка создания бота: {e}")
         return 1
 
     # Запуск бота
@@ -156,7 +292,14 @@ def main():
             print("   3. Для остановки нажмите Ctrl+C\n")
 
         # ЗАПУСКАЕМ БОТА - СИНХРОННО
-        application.run_polling()
+        if Config.LEADER_ELECTION:
+            logger.info(f"Выбор лидера: lease {Config.LEADER_LEASE_FILE}")
+            return run_with_leader_election(application)
+        elif Config.UPDATE_MODE == "webhook":
+            logger.info(f"Режим webhook: {Config.WEBHOOK_LISTEN}:{Config.WEBHOOK_PORT}{Config.WEBHOOK_PATH}")
+            run_webhook(application)
+        else:
+            application.run_polling()
 
     except KeyboardInterrupt:
         logger.info("Бот остановлен пользователем")
@@ -0,0 +1,224 @@
+import asyncio
+import gc
+import logging
+import os
+import signal
+import sys
+import threading
+import tracemalloc
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from .config import Config
+from .sender import Priority, send_queue
+from .utils import split_long_message
+
+logger = logging.getLogger(__name__)
+
+CONTAINERS = (dict, list, tuple, set, frozenset, deque)
+
+
+def deep_sizeof(root: Any, max_objects: int = 200000) -> Tuple[int, int, bool]:
+    """
+    Оценка памяти структуры: (байт, объектов, обход прерван по лимиту).
+    Атрибуты обходятся только у самого root, дальше - встроенные контейнеры,
+    чтобы не уйти по ссылкам в Bot, httpx и прочие общие объекты
+    """
+    seen = set()
+    stack = [root]
+    total = 0
+    count = 0
+
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if count >= max_objects:
+            return total, count, True
+
+        total += sys.getsizeof(obj)
+        count += 1
+
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, CONTAINERS):
+            stack.extend(obj)
+        elif obj is root:
+            stack.extend(getattr(obj, "__dict__", {}).values())
+            for slot in getattr(type(obj), "__slots__", ()):
+                if hasattr(obj, slot):
+                    stack.append(getattr(obj, slot))
+
+    return total, count, False
+
+
+def process_rss() -> int:
+    """Резидентная память процесса, байт"""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Пик, а не текущая
+    except ImportError:  # Windows
+        return 0
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("Б", "КБ", "МБ"):
+        if abs(size) < 1024:
+            return f"{size:.0f}{unit}" if unit == "Б" else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}ГБ"
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    # Аллокации самого tracemalloc, отчета и импорта модулей - шум
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+
+
+class MemoryInspector:
+    """
+    Отчет о памяти по /mem и SIGUSR2: RSS, размеры структур бота
+    (сессии, состояния диалогов, кэши, индексы, очереди) и места аллокаций
+    из tracemalloc. Трассировка включается первым запросом и до /mem stop
+    не стоит ничего; каждый следующий отчет сравнивается с предыдущим снимком
+    """
+
+    def __init__(self, top: int, frames: int):
+        self.top = top
+        self.frames = frames
+        self._structures: Dict[str, Callable[[], Any]] = {}
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._previous_sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()  # Отчеты строятся в потоках, прошлый снимок - общий
+        self._tasks: Set[asyncio.Task] = set()
+
+    def track(self, name: str, get: Callable[[], Any]) -> None:
+        """Структура в отчете: name -> функция, возвращающая объект"""
+        self._structures[name] = get
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+        self._previous = None
+
+    def structure_sizes(self) -> List[str]:
+        lines = []
+        for name, get in self._structures.items():
+            try:
+                obj = get()
+                size, count, truncated = deep_sizeof(obj)
+            except RuntimeError as e:  # Структура изменилась во время обхода
+                lines.append(f"{name}: ошибка оценки ({e})")
+                continue
+
+            length = f", элементов: {len(obj)}" if hasattr(obj, "__len__") else ""
+            delta = ""
+            if name in self._previous_sizes:
+                delta = f" ({'+' if size >= self._previous_sizes[name] else ''}"
+                delta += f"{format_bytes(size - self._previous_sizes[name])})"
+            self._previous_sizes[name] = size
+            lines.append(
+                f"{name}: {'≥' if truncated else ''}{format_bytes(size)}{delta}"
+                f"{length}, объектов: {count}"
+            )
+        return lines
+
+    def report(self) -> str:
+        """
+        Текст отчета; первый вызов включает трассировку аллокаций.
+        Долгий (gc, обход структур, снимок) - из event loop только через report_async
+        """
+        with self._lock:
+            return self._report()
+
+    async def report_async(self) -> str:
+        """Отчет в потоке: event loop продолжает обрабатывать обновления"""
+        return await asyncio.to_thread(self.report)
+
+    def _report(self) -> str:
+        gc.collect()
+        lines = [
+            f"RSS: {format_bytes(process_rss())}, объектов gc: {len(gc.get_objects())}",
+            "",
+            "Структуры бота:",
+        ]
+        lines.extend(self.structure_sizes())
+
+        if not self.tracing:
+            tracemalloc.start(self.frames)
+            lines += ["", "Трассировка аллокаций включена. Повторите /mem для снимка, /mem stop - выключить"]
+            return "\n".join(lines)
+
+        snapshot = _snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        lines += ["", f"tracemalloc: {format_bytes(current)}, пик {format_bytes(peak)}", "Места аллокаций:"]
+        for stat in snapshot.statistics("lineno")[:self.top]:
+            frame = stat.traceback[0]
+            lines.append(
+                f"{format_bytes(stat.size)} ({stat.count}) "
+                f"{os.path.basename(frame.filename)}:{frame.lineno}"
+            )
+
+        if self._previous is not None:
+            lines += ["", "Изменения с прошлого снимка:"]
+            for stat in snapshot.compare_to(self._previous, "lineno")[:self.top]:
+                frame = stat.traceback[0]
+                lines.append(
+                    f"{'+' if stat.size_diff >= 0 else ''}{format_bytes(stat.size_diff)} "
+                    f"({stat.count_diff:+d}) {os.path.basename(frame.filename)}:{frame.lineno}"
+                )
+
+        self._previous = snapshot
+        return "\n".join(lines)
+
+    async def send_report(self, bot) -> None:
+        """Отчет в лог и в группу модерации"""
+        text = await self.report_async()
+        logger.info(f"Отчет о памяти:\n{text}")
+        for part in split_long_message(text, 3000):
+            try:
+                await send_queue.send_message(bot, Config.MODERATION_CHAT_ID, part, Priority.HIGH)
+            except Exception as e:
+                logger.error(f"Не удалось отправить отчет о памяти: {e}")
+                return
+
+    def schedule_report(self, bot) -> None:
+        """Отчет в фоне; ссылка на задачу хранится до завершения, иначе ее может собрать gc"""
+        task = asyncio.get_running_loop().create_task(self.send_report(bot))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+def install_memory_signal(bot) -> bool:
+    """SIGUSR2 - отчет о памяти в группу модерации (kill -USR2 <pid>)"""
+    sig = getattr(signal, "SIGUSR2", None)
+    if sig is None:
+        return False
+
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(sig, memory_inspector.schedule_report, bot)
+    except (NotImplementedError, RuntimeError):  # Windows
+        return False
+    return True
+
+
+# Глобальный инспектор памяти
+memory_inspector = MemoryInspector(Config.MEM_TOP_ALLOCATIONS, Config.MEM_TRACE_FRAMES)
@@ -0,0 +1,203 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from .config import Config
+from .database import named_lock
+
+logger = logging.getLogger(__name__)
+
+
+class MessageIndex:
+    """
+    Индекс message_id в группе модерации -> номер заявки.
+    В памяти - OrderedDict (поиск O(1), вытеснение старых с начала),
+    на диске - журнал JSON строк [message_id, номер, время], который
+    периодически сжимается. Журнал общий для процессов кластера:
+    при промахе процесс дочитывает чужие записи с последней позиции.
+    add вызывается из event loop: строки журнала копятся в памяти
+    и пишутся фоновой задачей в потоке (flock, запись, сжатие)
+    """
+
+    def __init__(self, path: Path, max_age: float, max_size: int):
+        self.path = path
+        self.max_age = max_age
+        self.max_size = max_size
+        self._index: "OrderedDict[int, Tuple[str, float]]" = OrderedDict()
+        self._offset = 0
+        self._inode = None
+        self._file_lines = 0
+        self._lock = threading.Lock()  # Индекс и позиция журнала: event loop и поток записи
+        self._pending: "deque[str]" = deque()
+        self._flush_task: Optional[asyncio.Task] = None
+
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _put(self, message_id: int, card_number: str, ts: float) -> None:
+        self._index[message_id] = (card_number, ts)
+        self._index.move_to_end(message_id)
+
+    def _evict(self) -> None:
+        """Вытеснение по возрасту и по размеру (старые - в начале)"""
+        deadline = time.time() - self.max_age
+        while self._index:
+            _, ts = next(iter(self._index.values()))
+            if len(self._index) <= self.max_size and ts >= deadline:
+                break
+            self._index.popitem(last=False)
+
+    def _read_new(self) -> int:
+        """Дочитывание журнала с последней позиции (после сжатия - с начала)"""
+        try:
+            with open(self.path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                if stat.st_ino != self._inode or stat.st_size < self._offset:
+                    self._inode = stat.st_ino
+                    self._offset = 0
+                    self._file_lines = 0
+
+                f.seek(self._offset)
+                read = 0
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # Строка еще дописывается
+                    self._offset += len(line)
+                    self._file_lines += 1
+                    try:
+                        message_id, card_number, ts = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._put(message_id, card_number, ts)
+                    read += 1
+                return read
+        except FileNotFoundError:
+            return 0
+
+    def load(self) -> int:
+        """Загрузка журнала при старте"""
+        with self._lock:
+            self._read_new()
+            self._evict()
+        logger.info(f"Индекс сообщений модерации: {len(self._index)} записей")
+        return len(self._index)
+
+    def add(self, message_id: int, card_number: str) -> None:
+        ts = time.time()
+        with self._lock:
+            self._put(message_id, card_number, ts)
+            self._evict()
+
+        self._pending.append(json.dumps([message_id, card_number, ts]) + "\n")
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:  # Вне event loop (утилиты) - пишем сразу
+            self.flush()
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._flush_pending())
+
+    async def _flush_pending(self) -> None:
+        while self._pending:
+            await asyncio.to_thread(self.flush)
+
+    def flush(self) -> None:
+        """Запись накопленных строк в журнал; блокирующая - из event loop только через поток"""
+        lines = []
+        while self._pending:
+            lines.append(self._pending.popleft())
+        if not lines:
+            return
+
+        try:
+            with named_lock("message_index"):
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write("".join(lines))
+            # Сдвигаем позицию за свои строки (и чужие, если были)
+            with self._lock:
+                self._read_new()
+        except OSError as e:
+            logger.error(f"Ошибка записи индекса сообщений: {e}")
+
+        # Журнал вырос вдвое относительно живых записей - сжимаем
+        if self._file_lines > 2 * len(self._index) + 1000:
+            self.compact()
+
+    def add_results(self, card_number: str, results: Iterable[Any]) -> None:
+        """Запись результатов отправки (Message, MessageId или их кортежи)"""
+        for result in results:
+            if isinstance(result, (list, tuple)):
+                self.add_results(card_number, result)
+            elif getattr(result, "message_id", None) is not None:
+                self.add(result.message_id, card_number)
+
+    def get(self, message_id: int) -> Optional[str]:
+        """Номер заявки по message_id; при промахе - дочитываем журнал"""
+        entry = self._index.get(message_id)
+        if entry is None:
+            with self._lock:
+                if self._read_new():
+                    self._evict()
+                entry = self._index.get(message_id)
+
+        if entry is None or entry[1] < time.time() - self.max_age:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry[0]
+
+    def compact(self) -> None:
+        """Перезапись журнала только живыми записями"""
+        with named_lock("message_index"):
+            with self._lock:
+                self._read_new()
+                self._evict()
+                items = list(self._index.items())
+
+            # Запись без self._lock: event loop в это время продолжает работать с индексом
+            temp_path = self.path.with_suffix('.tmp')
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for message_id, (card_number, ts) in items:
+                    f.write(json.dumps([message_id, card_number, ts]) + "\n")
+            os.replace(temp_path, self.path)
+
+            stat = os.stat(self.path)
+            with self._lock:
+                self._inode = stat.st_ino
+                self._offset = stat.st_size
+                self._file_lines = len(items)
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики индекса"""
+        return {
+            "size": len(self._index),
+            "file_lines": self._file_lines,
+            "hits": self.hits,
+            "misses": self.misses,
+            "pending": len(self._pending),
+        }
+
+    async def close(self) -> None:
+        """Дописать журнал при остановке"""
+        if self._flush_task:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await asyncio.to_thread(self.flush)
+
+
+# Глобальный индекс сообщений группы модерации
+message_index = MessageIndex(
+    Config.MESSAGE_INDEX_FILE,
+    Config.MESSAGE_INDEX_MAX_AGE,
+    Config.MESSAGE_INDEX_MAX_SIZE
+)
@@ -0,0 +1,266 @@
+import asyncio
+import bisect
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from telegram.request import HTTPXRequest
+
+from .http_server import HttpServer, Request, Response, text_response
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Счетчик с метками"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()  # inc вызывается и из потоков хранилища
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labels, key)} {value}"
+            for key, value in values
+        ]
+
+
+class Histogram:
+    """Гистограмма длительностей с метками (кумулятивные бакеты, как в Prometheus)"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS, trace: Optional[str] = None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.trace = trace  # Префикс span'а для замеров time() внутри trace обновления
+        self._series: Dict[LabelValues, list] = {}  # [счетчики бакетов..., +Inf], сумма
+        self._lock = threading.Lock()  # STORAGE_SECONDS наблюдается из потоков asyncio.to_thread
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bucket] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Замер блока: with HISTOGRAM.time(op="load"): ..."""
+        traced = span(f"{self.trace}.{'.'.join(map(str, labels.values()))}") if self.trace else nullcontext()
+        started = time.perf_counter()
+        try:
+            with traced:
+                yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = []
+        with self._lock:
+            series = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    Реестр метрик процесса. Кроме счетчиков и гистограмм принимает
+    коллекторы - функции stats() компонентов, их числовые поля
+    отдаются как gauge bot_<имя>_<поле>
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self.started = time.time()
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS, trace: Optional[str] = None) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help_text, labels, buckets, trace))
+
+    def register_collector(self, name: str, collect: Callable[[], Dict[str, Any]]) -> None:
+        self._collectors[name] = collect
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus (exposition format 0.0.4)"""
+        lines = [
+            "# TYPE bot_uptime_seconds gauge",
+            f"bot_uptime_seconds {time.time() - self.started:.3f}",
+        ]
+
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+
+        for name, collect in self._collectors.items():
+            try:
+                stats = collect()
+            except Exception as e:
+                logger.error(f"Ошибка сбора метрик {name}: {e}")
+                continue
+            for key, value in stats.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                metric_name = f"bot_{name}_{key}"
+                lines.append(f"# TYPE {metric_name} gauge")
+                lines.append(f"{metric_name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+# Глобальный реестр метрик
+registry = Registry()
+
+UPDATES_TOTAL = registry.counter("bot_updates_total", "Обработано обновлений")
+HANDLER_SECONDS = registry.histogram("bot_handler_seconds", "Время обработчика", ("handler",))
+HANDLER_ERRORS = registry.counter("bot_handler_errors_total", "Исключения в обработчиках", ("handler",))
+STORAGE_SECONDS = registry.histogram(
+    "bot_storage_seconds", "Операции хранилища карточек", ("op",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+    trace="storage"
+)
+TELEGRAM_SECONDS = registry.histogram("bot_telegram_api_seconds", "Вызовы Bot API", ("method",))
+TELEGRAM_RESPONSES = registry.counter(
+    "bot_telegram_api_responses_total", "Ответы Bot API по кодам", ("method", "code")
+)
+
+# Обработчик, выполняемый задачей (для монитора задержки цикла)
+running_handlers: Dict[asyncio.Task, str] = {}
+
+
+def instrumented(func: Callable = None, *, name: Optional[str] = None):
+    """
+    Декоратор async обработчика: время выполнения и исключения
+    в bot_handler_seconds / bot_handler_errors_total
+    """
+    if func is None:
+        return functools.partial(instrumented, name=name)
+
+    if getattr(func, "__instrumented__", False):
+        return func
+
+    handler_name = name or func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        task = asyncio.current_task()
+        outer = running_handlers.get(task)
+        running_handlers[task] = handler_name
+        started = time.perf_counter()
+        try:
+            with span(f"handler.{handler_name}"):
+                return await func(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=handler_name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, handler=handler_name)
+            if outer is None:
+                running_handlers.pop(task, None)
+            else:
+                running_handlers[task] = outer
+
+    wrapper.__instrumented__ = True
+    return wrapper
+
+
+def _handler_tree(handler) -> List[Any]:
+    """Обработчик и вложенные (ConversationHandler)"""
+    nested = [handler]
+    for attr in ("entry_points", "fallbacks"):
+        for child in getattr(handler, attr, None) or []:
+            nested.extend(_handler_tree(child))
+    for children in (getattr(handler, "states", None) or {}).values():
+        for child in children:
+            nested.extend(_handler_tree(child))
+    return nested
+
+
+def instrument_application(application) -> int:
+    """
+    Обертка всех зарегистрированных обработчиков декоратором instrumented:
+    новые обработчики попадают в метрики без изменений в коде
+    """
+    count = 0
+    for handlers in application.handlers.values():
+        for root in handlers:
+            for handler in _handler_tree(root):
+                callback = getattr(handler, "callback", None)
+                if callback is not None and not getattr(callback, "__instrumented__", False):
+                    handler.callback = instrumented(callback)
+                    count += 1
+    return count
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest с замером задержки Bot API по методам"""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs) -> Tuple[int, bytes]:
+        api_method = url.rsplit("/", 1)[-1]
+        started = time.perf_counter()
+        code = "error"
+        try:
+            with span(f"telegram.{api_method}") as traced:
+                code, payload = await super().do_request(url, method, *args, **kwargs)
+                if traced is not None:
+                    traced.attrs["code"] = code
+            return code, payload
+        finally:
+            TELEGRAM_SECONDS.observe(time.perf_counter() - started, method=api_method)
+            TELEGRAM_RESPONSES.inc(method=api_method, code=code)
+
+
+def build_metrics_server(host: str, port: int) -> HttpServer:
+    """HTTP сервер метрик: GET /metrics"""
+    server = HttpServer(host, port, max_connections=10)
+
+    async def handle_metrics(request: Request) -> Response:
+        return text_response(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+    server.route("GET", "/metrics", handle_metrics)
+    return server
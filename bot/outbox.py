@@ -0,0 +1,235 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+from .config import Config
+from .database import CardManager, write_fence
+from .sender import Priority, send_queue, retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+
+def create_outbox_entry(chat_id: int, text: str) -> Dict[str, Any]:
+    """Уведомление пользователю; пишется в карточку вместе с решением"""
+    return {
+        "id": uuid.uuid4().hex[:12],
+        "chat_id": chat_id,
+        "text": text,
+        "status": "pending",
+        "attempts": 0,
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "next_attempt_at": time.time(),
+        "last_error": ""
+    }
+
+
+def retry_delay(attempts: int) -> float:
+    """Экспоненциальная пауза с разбросом: base * 2^(n-1), не больше OUTBOX_RETRY_MAX"""
+    delay = min(Config.OUTBOX_RETRY_BASE * 2 ** (attempts - 1), Config.OUTBOX_RETRY_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class NotificationOutbox:
+    """
+    Доставка уведомлений из outbox карточек. Запись в outbox уже на диске,
+    поэтому команда модератора не ждет Telegram, а после рестарта
+    неотправленные уведомления поднимаются из карточек (recover)
+    """
+
+    def __init__(self):
+        self._heap: List[tuple] = []  # (время попытки, seq, номер карточки, id записи)
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._deliveries: Set[asyncio.Task] = set()
+        self._queued: Set[str] = set()  # id записей в очереди или в доставке
+        self.bot = None
+
+        # Метрики
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+
+    def schedule(self, card_number: str, entry: Dict[str, Any]) -> None:
+        """
+        Запланировать доставку записи (после того, как она записана в карточку).
+        Запись уже в очереди (recover и решение одновременно) - повторно не ставится,
+        иначе две доставки увидят pending и обе отправят уведомление
+        """
+        if entry["id"] in self._queued:
+            return
+        self._queued.add(entry["id"])
+        self._push(card_number, entry["id"], entry["next_attempt_at"])
+
+    def _push(self, card_number: str, entry_id: str, next_attempt_at: float) -> None:
+        heapq.heappush(self._heap, (next_attempt_at, next(self._seq), card_number, entry_id))
+        self._wakeup.set()
+
+    @staticmethod
+    def _pending_entries() -> List[tuple]:
+        """Неотправленные уведомления всех карточек"""
+        pending = []
+        for file_path in Config.CARDS_DIR.glob("*.json"):
+            card = CardManager.load_card(file_path.stem)
+            if not card:
+                continue
+            for entry in card.get("outbox", []):
+                if entry["status"] == "pending":
+                    pending.append((card["number"], entry))
+        return pending
+
+    async def recover(self) -> int:
+        """Загрузка неотправленных уведомлений после рестарта"""
+        pending = await asyncio.to_thread(self._pending_entries)
+        for card_number, entry in pending:
+            self.schedule(card_number, entry)
+        if pending:
+            logger.info(f"Outbox: восстановлено уведомлений: {len(pending)}")
+        return len(pending)
+
+    def start(self, bot) -> None:
+        self.bot = bot
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                # Ждем срока головы очереди или новой записи
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, card_number, entry_id = heapq.heappop(self._heap)
+            task = asyncio.create_task(self._deliver(card_number, entry_id))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+
+    @staticmethod
+    def _find_entry(card_number: str, entry_id: str) -> Optional[Dict[str, Any]]:
+        card = CardManager.load_card(card_number)
+        for entry in (card or {}).get("outbox", []):
+            if entry["id"] == entry_id:
+                return entry
+        return None
+
+    @staticmethod
+    async def _update_entry(card_number: str, entry_id: str, changes: Dict[str, Any]) -> bool:
+        def apply(card: dict) -> None:
+            for entry in card.get("outbox", []):
+                if entry["id"] == entry_id:
+                    entry.update(changes)
+
+        return await CardManager.modify_card_async(card_number, apply, fenced=True)
+
+    async def _deliver(self, card_number: str, entry_id: str) -> None:
+        rescheduled = False
+        try:
+            rescheduled = await self._attempt(card_number, entry_id)
+        finally:
+            if not rescheduled:
+                self._queued.discard(entry_id)
+
+    async def _attempt(self, card_number: str, entry_id: str) -> bool:
+        """Попытка доставки; True - запись снова в очереди"""
+        entry = await asyncio.to_thread(self._find_entry, card_number, entry_id)
+        if not entry or entry["status"] != "pending":
+            return False
+
+        # Без lease лидера не отправляем: уведомление доставит новый лидер
+        # (или этот процесс, если heartbeat восстановится)
+        if write_fence.epoch is not None and not await asyncio.to_thread(write_fence.check):
+            self._push(card_number, entry_id, time.time() + Config.LEADER_HEARTBEAT)
+            return True
+
+        attempts = entry.get("attempts", 0) + 1
+        try:
+            await send_queue.send_message(self.bot, entry["chat_id"], entry["text"], Priority.HIGH)
+        except (Forbidden, BadRequest) as e:
+            # Пользователь заблокировал бота или чат не существует - повтор не поможет
+            await self._give_up(card_number, entry, attempts, str(e))
+            return False
+        except Exception as e:
+            if attempts >= Config.OUTBOX_MAX_ATTEMPTS:
+                await self._give_up(card_number, entry, attempts, str(e))
+                return False
+
+            delay = retry_delay(attempts)
+            if isinstance(e, RetryAfter):
+                delay = max(delay, retry_after_seconds(e))
+
+            next_attempt_at = time.time() + delay
+            await self._update_entry(card_number, entry_id, {
+                "attempts": attempts,
+                "next_attempt_at": next_attempt_at,
+                "last_error": str(e)
+            })
+            self.retries += 1
+            logger.warning(f"Outbox: заявка {card_number}, попытка {attempts} неудачна ({e}), повтор через {delay:.0f}с")
+            self._push(card_number, entry_id, next_attempt_at)
+            return True
+
+        await self._update_entry(card_number, entry_id, {"status": "sent", "attempts": attempts})
+        self.sent += 1
+        return False
+
+    async def _give_up(self, card_number: str, entry: Dict[str, Any], attempts: int, error: str) -> None:
+        """Окончательная ошибка: отмечаем в карточке и сообщаем модераторам"""
+        await self._update_entry(card_number, entry["id"], {
+            "status": "failed",
+            "attempts": attempts,
+            "last_error": error
+        })
+        self.failed += 1
+        logger.error(f"Outbox: не удалось уведомить пользователя {entry['chat_id']} по заявке {card_number}: {error}")
+
+        try:
+            await send_queue.send_message(
+                self.bot,
+                Config.MODERATION_CHAT_ID,
+                f"Не удалось уведомить пользователя по заявке {card_number}: {error}",
+                Priority.HIGH
+            )
+        except Exception as e:
+            logger.error(f"Outbox: не удалось сообщить модераторам: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики outbox"""
+        return {
+            "scheduled": len(self._heap),
+            "in_flight": len(self._deliveries),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+        }
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """Остановка; неотправленное остается в карточках до следующего запуска"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._deliveries:
+            _, pending = await asyncio.wait(list(self._deliveries), timeout=timeout)
+            for task in pending:
+                task.cancel()
+
+
+# Глобальный outbox уведомлений
+notification_outbox = NotificationOutbox()
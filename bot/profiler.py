@@ -0,0 +1,210 @@
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from .config import Config
+from .sender import Priority, send_queue
+
+logger = logging.getLogger(__name__)
+
+MODES = ("stack", "cprofile")
+IDLE_FUNCTIONS = {"select", "poll", "epoll", "wait", "_worker"}  # Ожидание, а не работа
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{os.path.basename(code.co_filename)}:{name}"
+
+
+def collapse_stack(frame) -> List[str]:
+    """Стек от корня к листу: ["main.py:main", ..., "database.py:load_card"]"""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+class StackSampler:
+    """
+    Семплирующий профилировщик: отдельный поток каждые interval секунд
+    снимает стеки всех потоков процесса. Код бота не инструментируется,
+    поэтому накладные расходы - только на время профилирования
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples: Counter = Counter()  # "поток;кадр;кадр" -> число выборок
+        self.total = 0
+
+    def run(self, seconds: float, stop: threading.Event) -> None:
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        deadline = time.monotonic() + seconds
+
+        while time.monotonic() < deadline and not stop.is_set():
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack = [names.get(thread_id, str(thread_id))] + collapse_stack(frame)
+                self.samples[";".join(stack)] += 1
+            self.total += 1
+            time.sleep(self.interval)
+
+    def collapsed(self) -> str:
+        """Формат collapsed stacks (flamegraph.pl, speedscope)"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def top_functions(self, limit: int = 10) -> List[Tuple[str, int]]:
+        """Листовые функции по числу выборок, без ожидания в select/poll"""
+        leaves: Counter = Counter()
+        for stack, count in self.samples.items():
+            leaf = stack.rsplit(";", 1)[-1]
+            if leaf.rsplit(":", 1)[-1].rsplit(".", 1)[-1] not in IDLE_FUNCTIONS:
+                leaves[leaf] += count
+        return leaves.most_common(limit)
+
+
+class LiveProfiler:
+    """
+    Профилирование работающего бота по команде /profile или SIGUSR1.
+    Одновременно идет не больше одного профиля; длительность ограничена
+    PROFILE_MAX_SECONDS. Результат - файл в data/logs и документ в группу модерации
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self.bot = None
+
+    @property
+    def active(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, bot, seconds: float, mode: str = "stack") -> float:
+        """
+        Запуск профиля в фоне. Возвращает фактическую длительность;
+        ValueError - неизвестный режим, RuntimeError - профиль уже идет
+        """
+        if mode not in MODES:
+            raise ValueError(f"Неизвестный режим: {mode}. Варианты: {', '.join(MODES)}")
+        if self.active:
+            raise RuntimeError("Профилирование уже идет")
+
+        seconds = max(1.0, min(float(seconds), Config.PROFILE_MAX_SECONDS))
+        self.bot = bot
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._run(seconds, mode))
+        return seconds
+
+    async def _run(self, seconds: float, mode: str) -> None:
+        logger.info(f"Профилирование ({mode}) на {seconds:.0f}с")
+        try:
+            if mode == "cprofile":
+                content, summary = await self._run_cprofile(seconds)
+            else:
+                content, summary = await self._run_sampler(seconds)
+        except asyncio.CancelledError:
+            self._stop.set()
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка профилирования: {e}", exc_info=True)
+            return
+
+        path = Config.LOGS_DIR / f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{mode}.txt"
+        await asyncio.to_thread(path.write_text, content, encoding='utf-8')
+        logger.info(f"Профиль сохранен: {path}")
+        await self._deliver(path, summary)
+
+    async def _run_sampler(self, seconds: float) -> Tuple[str, str]:
+        sampler = StackSampler(Config.PROFILE_SAMPLE_INTERVAL)
+        await asyncio.to_thread(sampler.run, seconds, self._stop)
+
+        lines = [f"Профиль {seconds:.0f}с, выборок: {sampler.total}"]
+        for leaf, count in sampler.top_functions(5):
+            lines.append(f"{count * 100 / max(sampler.total, 1):.1f}% {leaf}")
+        return sampler.collapsed(), "\n".join(lines)
+
+    async def _run_cprofile(self, seconds: float) -> Tuple[str, str]:
+        """
+        cProfile потока event loop: точные счетчики вызовов,
+        но заметные накладные расходы на время профиля
+        """
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profile.disable()
+
+        stream = io.StringIO()
+        stats = pstats.Stats(profile, stream=stream).sort_stats("cumulative")
+        stats.print_stats(100)
+        stats.sort_stats("tottime").print_stats(30)
+
+        top = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:5]
+        lines = [f"cProfile {seconds:.0f}с, вызовов: {stats.total_calls}"]
+        for (filename, _, name), (_, _, tottime, _, _) in top:
+            lines.append(f"{tottime:.3f}с {os.path.basename(filename)}:{name}")
+        return stream.getvalue(), "\n".join(lines)
+
+    async def _deliver(self, path: Path, summary: str) -> None:
+        try:
+            await send_queue.submit(
+                self.bot.send_document,
+                Config.MODERATION_CHAT_ID,
+                Priority.HIGH,
+                document=path.read_bytes(),
+                filename=path.name,
+                caption=summary[:Config.MAX_CAPTION_LENGTH]
+            )
+        except Exception as e:
+            logger.error(f"Не удалось отправить профиль в группу модерации: {e}")
+
+    async def close(self) -> None:
+        if self.active:
+            self._stop.set()
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+
+def install_profile_signal(bot) -> bool:
+    """
+    SIGUSR1 запускает профиль на PROFILE_SIGNAL_SECONDS.
+    В кластере сигнал отправляется нужному воркеру: kill -USR1 <pid>
+    """
+    sig = getattr(signal, "SIGUSR1", None)
+    if sig is None:
+        return False
+
+    def on_signal() -> None:
+        try:
+            profiler.start(bot, Config.PROFILE_SIGNAL_SECONDS)
+        except RuntimeError as e:
+            logger.warning(f"SIGUSR1: {e}")
+
+    try:
+        asyncio.get_running_loop().add_signal_handler(sig, on_signal)
+    except (NotImplementedError, RuntimeError):  # Windows
+        return False
+    return True
+
+
+# Глобальный профилировщик
+profiler = LiveProfiler()
@@ -0,0 +1,149 @@
+"""
+Запись входящих обновлений в data/recordings/updates.jsonl (ротация как у логов)
+для воспроизведения нагрузки: python -m tools.replay.
+Строка - {"t": время получения, "update": Update.to_dict()} после обезличивания.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from telegram import Update
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+# Scrubber получает словарь обновления и возвращает его (можно измененный) или None - не записывать
+Scrubber = Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+NAME_FIELDS = {"first_name", "last_name", "username", "bio", "phone_number", "vcard", "email"}
+TEXT_FIELDS = {"text", "caption", "quote"}
+MASKED_FIELDS = NAME_FIELDS | TEXT_FIELDS
+ID_FIELDS = {"id", "user_id"}
+DROP_FIELDS = {"location", "venue", "live_period"}
+MIN_MASKED_DIGITS = 5  # Номера заявок (4 цифры) остаются, телефоны и id в текстах - нет
+
+
+def pseudonym(user_id: int) -> int:
+    """Стабильный псевдоним id пользователя (одинаковый во всех файлах записи)"""
+    digest = hashlib.blake2b(f"{Config.RECORD_SALT}:{user_id}".encode(), digest_size=8).digest()
+    return 1_000_000_000 + int.from_bytes(digest, "big") % 8_000_000_000
+
+
+def mask_text(text: str) -> str:
+    """
+    Буквы заменяются с сохранением регистра и алфавита, длинные числа - нулями.
+    Длина не меняется (entities остаются верными), команда в начале сохраняется
+    """
+    command = ""
+    if text.startswith("/"):
+        command, _, text = text.partition(" ")
+        command += " " if text else ""
+
+    chars = list(text)
+    digits = 0
+    for i, char in enumerate(chars + [" "]):
+        if char.isdigit():
+            digits += 1
+            continue
+        if digits >= MIN_MASKED_DIGITS:
+            chars[i - digits:i] = "0" * digits
+        digits = 0
+        if not char.isalpha():
+            continue
+        if "а" <= char.lower() <= "я" or char.lower() == "ё":
+            chars[i] = "А" if char.isupper() else "а"
+        else:
+            chars[i] = "X" if char.isupper() else "x"
+    return command + "".join(chars)
+
+
+def scrub_personal_data(data: Any) -> Any:
+    """
+    Обезличивание: имена, username, телефоны и тексты маскируются,
+    id пользователей заменяются псевдонимами, геопозиция удаляется.
+    Чаты групп (отрицательные id), file_id и callback_data не меняются
+    """
+    if isinstance(data, list):
+        return [scrub_personal_data(item) for item in data]
+    if not isinstance(data, dict):
+        return data
+
+    result = {}
+    for key, value in data.items():
+        if key in DROP_FIELDS:
+            continue
+        if key in ID_FIELDS and isinstance(value, int) and value > 0:
+            result[key] = pseudonym(value)
+        elif key in MASKED_FIELDS and isinstance(value, str):
+            result[key] = mask_text(value)
+        else:
+            result[key] = scrub_personal_data(value)
+    return result
+
+
+class UpdateRecorder:
+    """
+    Запись обновлений в JSONL. Обезличивание и фильтры - цепочка scrubbers
+    (add_scrubber); если любой вернул None, обновление не записывается
+    """
+
+    def __init__(self, path: Path, scrub: bool = True):
+        self.path = path
+        self.scrubbers: List[Scrubber] = [scrub_personal_data] if scrub else []
+        self._writer: Optional[logging.Logger] = None
+
+        # Метрики
+        self.recorded = 0
+        self.skipped = 0
+        self.errors = 0
+
+    def add_scrubber(self, scrubber: Scrubber) -> None:
+        self.scrubbers.append(scrubber)
+
+    def _logger(self) -> logging.Logger:
+        if self._writer is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            writer = logging.getLogger("bot.recordings")
+            writer.propagate = False
+            writer.setLevel(logging.INFO)
+            handler = RotatingFileHandler(
+                self.path, maxBytes=Config.RECORD_MAX_BYTES,
+                backupCount=Config.RECORD_BACKUP_COUNT, encoding='utf-8'
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            writer.addHandler(handler)
+            self._writer = writer
+        return self._writer
+
+    def record(self, update: object) -> None:
+        if not Config.RECORD_UPDATES or not isinstance(update, Update):
+            return
+
+        received = time.time()
+        try:
+            data: Optional[Dict[str, Any]] = update.to_dict()
+            for scrubber in self.scrubbers:
+                data = scrubber(data)
+                if data is None:
+                    self.skipped += 1
+                    return
+            self._logger().info(json.dumps(
+                {"t": round(received, 3), "update": data}, ensure_ascii=False, default=str
+            ))
+            self.recorded += 1
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Ошибка записи обновления {update.update_id}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"recorded": self.recorded, "skipped": self.skipped, "errors": self.errors}
+
+
+# Глобальная запись обновлений
+update_recorder = UpdateRecorder(Config.RECORD_FILE, Config.RECORD_SCRUB)
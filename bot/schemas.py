@@ -10,6 +10,7 @@ CARD_SCHEMA = {
     ],
     "properties": {
         "id": {"type": "integer", "minimum": 1},
+        "version": {"type": "integer", "minimum": 0},
         "number": {"type": "string", "pattern": "^\\d{4}$"},
         "city": {"type": "string", "enum": ["Москва", "Не Москва"]},
         "fio": {"type": "string"},
@@ -42,6 +43,23 @@ CARD_SCHEMA = {
             "type": "string",
             "enum": ["pending", "approved", "rejected"]
         },
+        "outbox": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["id", "chat_id", "text", "status"],
+                "properties": {
+                    "id": {"type": "string"},
+                    "chat_id": {"type": "integer"},
+                    "text": {"type": "string"},
+                    "status": {"type": "string", "enum": ["pending", "sent", "failed"]},
+                    "attempts": {"type": "integer", "minimum": 0},
+                    "created_at": {"type": "string", "format": "date-time"},
+                    "next_attempt_at": {"type": "number"},
+                    "last_error": {"type": "string"}
+                }
+            }
+        },
         "history": {
             "type": "array",
             "items": {
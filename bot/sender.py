@@ -0,0 +1,270 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from telegram.error import RetryAfter
+
+from .config import Config
+from .tracing import activate, current_span, hold, record_span, release
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Классы приоритета исходящих сообщений (меньше - важнее)"""
+    HIGH = 0    # Ответы модераторам, решения и уведомления о решениях
+    NORMAL = 1  # Карточки для модерации
+    LOW = 2     # Пересылка сообщений пользователей
+
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    """Время ожидания из RetryAfter (int или timedelta в разных версиях PTB)"""
+    delay = error.retry_after
+    if hasattr(delay, "total_seconds"):
+        return delay.total_seconds()
+    return float(delay)
+
+
+class TokenBucket:
+    """Token bucket с приоритетной очередью ожидающих"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate  # Токенов в секунду
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._waiters: List[tuple] = []  # Куча (priority, seq, future)
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def is_idle(self) -> bool:
+        """Ведро полное и никто не ждет"""
+        self._refill()
+        return not self._waiters and self.tokens >= self.capacity
+
+    async def acquire(self, priority: int = Priority.NORMAL) -> None:
+        """Получение токена; при нехватке первыми обслуживаются более важные"""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._grant()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Токен уже выдан, но ожидающий отменен - возвращаем токен
+            if future.done() and not future.cancelled():
+                self.tokens = min(self.capacity, self.tokens + 1)
+                self._grant()
+            raise
+
+    def _grant(self) -> None:
+        """Раздача токенов ожидающим в порядке приоритета"""
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+
+        self._refill()
+
+        while self._waiters:
+            future = self._waiters[0][2]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+
+            if self.tokens < 1:
+                delay = (1 - self.tokens) / self.rate
+                self._wakeup = asyncio.get_running_loop().call_later(delay, self._grant)
+                return
+
+            self.tokens -= 1
+            heapq.heappop(self._waiters)
+            future.set_result(None)
+
+
+class SendQueue:
+    """
+    Центральный планировщик исходящих вызовов Bot API.
+    Для каждого чата своя очередь (порядок внутри чата сохраняется с учетом
+    приоритета), лимиты - общий token bucket и token bucket на чат.
+    """
+
+    def __init__(self):
+        self.max_retries = Config.SEND_MAX_RETRIES
+        self._global = TokenBucket(Config.SEND_GLOBAL_RATE, Config.SEND_GLOBAL_RATE)
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._lanes: Dict[int, List[tuple]] = {}
+        self._lane_tasks: Dict[int, asyncio.Task] = {}
+        self._seq = itertools.count()
+        self._resumed = asyncio.Event()  # Сброшен - отправка приостановлена (пропущен heartbeat лидера)
+        self._resumed.set()
+
+        # Метрики
+        self.depth_by_priority: Dict[int, int] = {p: 0 for p in Priority}
+        self.max_depth = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.total_wait = 0.0
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if chat_id < 0:  # Группы и каналы
+                rate = Config.SEND_GROUP_RATE_PER_MINUTE / 60
+                capacity = Config.SEND_GROUP_BURST
+            else:  # Личные чаты
+                rate = Config.SEND_PRIVATE_RATE
+                capacity = Config.SEND_PRIVATE_BURST
+            bucket = TokenBucket(rate, capacity)
+            self._buckets[chat_id] = bucket
+        return bucket
+
+    def pause(self) -> None:
+        """Приостановка отправки: задания остаются в очередях"""
+        self._resumed.clear()
+
+    def resume(self) -> None:
+        self._resumed.set()
+
+    @property
+    def depth(self) -> int:
+        return sum(self.depth_by_priority.values())
+
+    def submit(self, func: Callable[..., Awaitable[Any]], chat_id: int,
+               priority: Priority = Priority.NORMAL, **kwargs) -> asyncio.Future:
+        """
+        Постановка вызова func(chat_id=chat_id, **kwargs) в очередь.
+        Возвращает future с результатом вызова (или исключением)
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        parent = current_span()
+        # Trace обновления ждет этот вызов, даже если обработчик не ждет future
+        hold(parent)
+        job = (int(priority), next(self._seq), time.monotonic(), func, chat_id, kwargs, future, parent)
+        heapq.heappush(self._lanes.setdefault(chat_id, []), job)
+
+        self.depth_by_priority[priority] += 1
+        depth = self.depth
+        self.max_depth = max(self.max_depth, depth)
+        if depth == Config.SEND_QUEUE_WARN_DEPTH:
+            logger.warning(f"Очередь отправки достигла {depth} сообщений")
+
+        if chat_id not in self._lane_tasks:
+            self._lane_tasks[chat_id] = loop.create_task(self._run_lane(chat_id))
+
+        return future
+
+    def send_message(self, bot, chat_id: int, text: str,
+                     priority: Priority = Priority.NORMAL, **kwargs) -> asyncio.Future:
+        """Отправка текста через очередь"""
+        return self.submit(bot.send_message, chat_id, priority, text=text, **kwargs)
+
+    async def _run_lane(self, chat_id: int) -> None:
+        """Обработчик очереди одного чата"""
+        lane = self._lanes[chat_id]
+        bucket = self._bucket(chat_id)
+
+        try:
+            while lane:
+                # Токены берем под приоритет головы очереди; пока ждем,
+                # вперед может встать более важное сообщение
+                await bucket.acquire(lane[0][0])
+                await self._global.acquire(lane[0][0])
+                await self._resumed.wait()
+
+                job = heapq.heappop(lane)
+                self.depth_by_priority[job[0]] -= 1
+                await self._execute(job)
+        finally:
+            self._lane_tasks.pop(chat_id, None)
+            if not lane:
+                self._lanes.pop(chat_id, None)
+                # Бакеты личных чатов не копим, если они уже восстановились
+                if chat_id > 0 and bucket.is_idle():
+                    self._buckets.pop(chat_id, None)
+
+    async def _execute(self, job: tuple) -> None:
+        """Выполнение задания очереди"""
+        *_, future, parent = job
+        try:
+            if future.done():  # Вызывающий отменил ожидание
+                return
+
+            # Вызов Bot API - в trace обновления, поставившего сообщение в очередь
+            with activate(parent):
+                await self._call(job)
+        finally:
+            release(parent)
+
+    async def _call(self, job: tuple) -> None:
+        """Вызов Bot API с обработкой RetryAfter"""
+        priority, _, enqueued, func, chat_id, kwargs, future, _ = job
+        waited = time.monotonic() - enqueued
+        self.total_wait += waited
+        record_span("send_queue.wait", waited, chat_id=chat_id, priority=priority)
+        error: Optional[Exception] = None
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = await func(chat_id=chat_id, **kwargs)
+            except RetryAfter as e:
+                error = e
+                self.retries += 1
+                delay = retry_after_seconds(e)
+                logger.warning(f"RetryAfter {delay}с для чата {chat_id} (попытка {attempt + 1})")
+                await asyncio.sleep(delay)
+                continue
+            except Exception as e:
+                error = e
+                break
+            else:
+                self.sent += 1
+                if not future.done():
+                    future.set_result(result)
+                return
+
+        self.failed += 1
+        logger.error(f"Не удалось отправить в чат {chat_id}: {error}")
+        if not future.done():
+            future.set_exception(error)
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики очереди"""
+        processed = self.sent + self.failed
+        return {
+            "depth": self.depth,
+            "depth_by_priority": {p.name: self.depth_by_priority[p] for p in Priority},
+            "max_depth": self.max_depth,
+            "active_chats": len(self._lane_tasks),
+            "paused": int(not self._resumed.is_set()),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "avg_wait": self.total_wait / processed if processed else 0.0,
+        }
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Дожидаемся отправки очереди при остановке, затем отменяем остаток"""
+        tasks = list(self._lane_tasks.values())
+        if not tasks:
+            return
+
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"При остановке не отправлено сообщений: {self.depth}")
+
+
+# Глобальная очередь отправки
+send_queue = SendQueue()
@@ -0,0 +1,29 @@
+"""
+Статистика выборок без зависимостей: перцентили для монитора event loop,
+нагрузочных тестов и бенчмарков. Модуль не импортирует Config
+"""
+
+from typing import Dict, List
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль q (0..100) с линейной интерполяцией"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """Сводка по выборке: количество, среднее, p50/p95/p99, максимум"""
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else 0.0,
+    }
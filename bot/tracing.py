@@ -0,0 +1,280 @@
+"""
+Трассировка обновлений: у каждого обновления свой trace, обработчики,
+операции хранилища и вызовы Bot API пишут в него дочерние span'ы.
+Медленные trace (дольше TRACE_SLOW_THRESHOLD) попадают в data/logs/traces.jsonl
+(у воркеров кластера - traces-worker<N>.jsonl). Trace пишется, когда завершены
+и обработчик, и поставленные им в очередь отправки вызовы Bot API.
+
+Самые медленные trace деревом:
+
+    python -m bot.tracing --top 10 --min-ms 500 --name /approve
+"""
+
+import argparse
+import json
+import logging
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+_current: ContextVar[Optional["Span"]] = ContextVar("trace_span", default=None)
+_NOOP = nullcontext()
+
+
+class Span:
+    """
+    Замер участка trace; дочерние span'ы - в children.
+    У корня pending - незавершенные задания очереди отправки (hold/release)
+    """
+
+    __slots__ = ("name", "trace_id", "attrs", "started", "duration", "children", "root", "pending")
+
+    def __init__(self, name: str, trace_id: str, attrs: Dict[str, Any], root: "Span" = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.attrs = attrs
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.children: List["Span"] = []
+        self.root = root or self
+        self.pending = 0
+
+    def end(self) -> float:
+        """Конец участка с учетом дочерних (отправка могла закончиться позже обработчика)"""
+        end = self.started + (self.duration or 0)
+        return max([end] + [child.end() for child in self.children])
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        data = {
+            "name": self.name,
+            "offset_ms": round((self.started - origin) * 1000, 3),
+            "duration_ms": round((self.duration or 0) * 1000, 3),
+        }
+        if self.attrs:
+            data["attrs"] = self.attrs
+        if self.children:
+            # Span'ы из потоков (asyncio.to_thread) могли добавиться не по порядку
+            children = sorted(self.children, key=lambda child: child.started)
+            data["children"] = [child.to_dict(origin) for child in children]
+        return data
+
+
+class TraceLog:
+    """Журнал медленных trace: JSON строка на trace, ротация как у логов"""
+
+    def __init__(self, path: Path, threshold: float):
+        self.path = path
+        self.threshold = threshold
+        self._writer: Optional[logging.Logger] = None
+
+        # Метрики
+        self.traces = 0
+        self.slow = 0
+
+    def _logger(self) -> logging.Logger:
+        if self._writer is None:
+            writer = logging.getLogger("bot.traces")
+            writer.propagate = False
+            writer.setLevel(logging.INFO)
+            handler = RotatingFileHandler(
+                self.path, maxBytes=10 * 1024 * 1024, backupCount=3, encoding='utf-8'
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            writer.addHandler(handler)
+            self._writer = writer
+        return self._writer
+
+    def finish(self, root: Span) -> None:
+        self.traces += 1
+        if root.end() - root.started < self.threshold:
+            return
+        self.slow += 1
+        record = {
+            "trace_id": root.trace_id,
+            "at": datetime.now().isoformat(timespec="milliseconds"),
+            **root.to_dict(root.started),
+        }
+        try:
+            self._logger().info(json.dumps(record, ensure_ascii=False, default=str))
+        except Exception as e:
+            logger.error(f"Ошибка записи trace: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"traces": self.traces, "slow": self.slow}
+
+
+# Глобальный журнал медленных trace
+trace_log = TraceLog(Config.TRACE_LOG_FILE, Config.TRACE_SLOW_THRESHOLD)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+@contextmanager
+def trace(name: str, **attrs) -> Iterator[Optional[Span]]:
+    """Корневой span обновления; по завершении - в журнал, если медленный"""
+    if not Config.TRACING:
+        yield None
+        return
+
+    root = Span(name, uuid.uuid4().hex[:16], attrs)
+    token = _current.set(root)
+    try:
+        yield root
+    finally:
+        root.duration = time.perf_counter() - root.started
+        _current.reset(token)
+        # Отправки в фоне еще идут - trace допишет последний release
+        if not root.pending:
+            trace_log.finish(root)
+
+
+def hold(span: Optional[Span]) -> None:
+    """Задание для span поставлено в очередь: trace не пишется до release"""
+    if span is not None:
+        span.root.pending += 1
+
+
+def release(span: Optional[Span]) -> None:
+    """Задание очереди выполнено; последнее после обработчика пишет trace"""
+    if span is None:
+        return
+    root = span.root
+    root.pending -= 1
+    if not root.pending and root.duration is not None:
+        trace_log.finish(root)
+
+
+@contextmanager
+def _child(parent: Span, name: str, attrs: Dict[str, Any]) -> Iterator[Span]:
+    child = Span(name, parent.trace_id, attrs, parent.root)
+    parent.children.append(child)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        child.duration = time.perf_counter() - child.started
+        _current.reset(token)
+
+
+def span(name: str, **attrs):
+    """
+    Дочерний span текущего trace. Вне trace - пустой контекст,
+    поэтому вызовы в фоновых задачах почти ничего не стоят
+    """
+    parent = _current.get()
+    if parent is None:
+        return _NOOP
+    return _child(parent, name, attrs)
+
+
+def record_span(name: str, duration: float, **attrs) -> None:
+    """Уже завершившийся участок (например, ожидание в очереди)"""
+    parent = _current.get()
+    if parent is None:
+        return
+    child = Span(name, parent.trace_id, attrs, parent.root)
+    child.started -= duration
+    child.duration = duration
+    parent.children.append(child)
+
+
+@contextmanager
+def activate(parent: Optional[Span]) -> Iterator[None]:
+    """
+    Продолжение trace в чужой задаче (очередь отправки): span'ы
+    внутри блока попадают в parent, а не в trace, создавший задачу
+    """
+    token = _current.set(parent)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+# ============================= CLI =============================
+
+def read_traces(paths: List[Path]) -> Iterator[Dict[str, Any]]:
+    for path in paths:
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            continue
+
+
+def format_attrs(attrs: Optional[Dict[str, Any]]) -> str:
+    return " ".join(f"{key}={value}" for key, value in (attrs or {}).items())
+
+
+def render_tree(node: Dict[str, Any], prefix: str = "", last: bool = True, root: bool = True) -> List[str]:
+    """Span и дочерние деревом: время от начала trace и длительность"""
+    label = f"{node['name']}  {node['duration_ms']:.1f}мс"
+    if not root:
+        label = f"+{node['offset_ms']:.1f}  {label}"
+    attrs = format_attrs(node.get("attrs"))
+    if attrs:
+        label += f"  [{attrs}]"
+
+    if root:
+        lines = [label]
+        child_prefix = ""
+    else:
+        lines = [f"{prefix}{'└─ ' if last else '├─ '}{label}"]
+        child_prefix = prefix + ("   " if last else "│  ")
+
+    children = node.get("children", [])
+    for i, child in enumerate(children):
+        lines.extend(render_tree(child, child_prefix, i == len(children) - 1, root=False))
+    return lines
+
+
+def main(args) -> int:
+    paths = [Path(args.file)] if args.file else sorted(
+        Config.TRACE_LOG_FILE.parent.glob(f"{Config.TRACE_LOG_FILE.stem}*.jsonl*")
+    )
+    traces = [
+        record for record in read_traces(paths)
+        if record.get("duration_ms", 0) >= args.min_ms
+        and (not args.name or args.name in record.get("name", "") + " " + format_attrs(record.get("attrs")))
+    ]
+    if not traces:
+        print("Медленных trace не найдено")
+        return 1
+
+    traces.sort(key=lambda record: record["duration_ms"], reverse=True)
+    for record in traces[:args.top]:
+        print(f"trace {record['trace_id']}  {record.get('at', '')}")
+        print("\n".join(render_tree(record)))
+        print()
+    return 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Самые медленные trace обновлений деревом")
+    parser.add_argument("file", nargs="?", help="журнал trace (по умолчанию data/logs/traces*.jsonl*)")
+    parser.add_argument("--top", type=int, default=10, help="сколько trace показать")
+    parser.add_argument("--min-ms", type=float, default=0, help="не короче, мс")
+    parser.add_argument("--name", default="", help="подстрока имени или атрибутов (например /approve)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(parse_args()))
@@ -3,6 +3,7 @@ import os
 from typing import List, Optional
 from telegram import User, Chat
 from .config import Config
+from .enrichment import profile_cache
 
 
 def validate_card_number(input_str: str) -> Optional[str]:
@@ -22,6 +23,46 @@ def validate_card_number(input_str: str) -> Optional[str]:
     return digits.zfill(4)
 
 
+CARD_RANGE_RE = re.compile(r"^(\d{1,4})(?:-(\d{1,4}))?$")
+
+
+def expand_card_token(token: str) -> Optional[List[str]]:
+    """Номер "12" или диапазон "20-35" -> список номеров; None - не номер"""
+    match = CARD_RANGE_RE.match(token)
+    if not match:
+        return None
+
+    first = int(match.group(1))
+    last = int(match.group(2) or first)
+    if first > last:
+        return None
+    return [str(n).zfill(4) for n in range(first, min(last, first + Config.BULK_MAX_CARDS) + 1)]
+
+
+def parse_card_numbers(args: List[str]) -> List[str]:
+    """
+    Разбор списка номеров и диапазонов: ["12", "15,20-35"] -> ["0012", "0015", "0020", ...].
+    Порядок сохраняется, повторы убираются; ValueError - если пакет некорректен
+    """
+    numbers = []
+    for token in ",".join(args).split(","):
+        token = token.strip()
+        if not token:
+            continue
+
+        expanded = expand_card_token(token)
+        if expanded is None:
+            raise ValueError(f"Неверный номер или диапазон: {token}")
+        numbers.extend(expanded)
+
+        if len(numbers) > Config.BULK_MAX_CARDS:
+            raise ValueError(f"Слишком много заявок, максимум {Config.BULK_MAX_CARDS}")
+
+    if not numbers:
+        raise ValueError("Не указаны номера заявок")
+    return list(dict.fromkeys(numbers))
+
+
 def split_long_message(text: str, max_length: int = None) -> List[str]:
     """Разделение длинного сообщения на части"""
     if max_length is None:
@@ -69,19 +110,9 @@ def get_user_metadata(user) -> dict:
 
 
 async def get_user_metadata_async(user: User, bot) -> dict:
-    """Получение метаданных пользователя с bio (асинхронная версия)"""
+    """Получение метаданных пользователя с bio и фото профиля (через кэш профилей)"""
     metadata = get_user_metadata(user)
-
-    # Пытаемся получить bio через getChat (асинхронно)
-    try:
-        chat = await bot.get_chat(user.id)
-        if chat.bio:
-            metadata["bio"] = chat.bio
-            metadata["additional_profile_info"] = chat.bio
-    except Exception as e:
-        # Если не удалось получить bio, оставляем пустым
-        pass
-
+    metadata.update(await profile_cache.get(bot, user.id))
     return metadata
 
 
@@ -0,0 +1,109 @@
+import asyncio
+import hmac
+import logging
+from typing import Awaitable, Callable, Optional
+
+from telegram import Update
+from telegram.ext import Application
+
+from .config import Config
+from .http_server import HttpServer, Request, Response, text_response
+from .lifecycle import run_application, stop_event_from_signals
+
+logger = logging.getLogger(__name__)
+
+
+def application_deliver(application: Application) -> Callable[[dict], Awaitable[None]]:
+    """Доставка обновления в очередь Application"""
+    async def deliver(data: dict) -> None:
+        await application.update_queue.put(Update.de_json(data, application.bot))
+    return deliver
+
+
+class WebhookServer:
+    """Прием обновлений от Telegram через webhook во встроенный HTTP сервер"""
+
+    def __init__(self, deliver: Callable[[dict], Awaitable[None]], host: str, port: int, path: str,
+                 secret: str = "", max_connections: int = 40):
+        self.deliver = deliver
+        self.secret = secret.encode("utf-8")
+        self.server = HttpServer(host, port, max_connections)
+        self.server.route("POST", path, self._handle_update)
+
+        # Метрики
+        self.received = 0
+        self.rejected = 0
+
+    @property
+    def port(self) -> int:
+        return self.server.port
+
+    async def start(self) -> None:
+        await self.server.start()
+
+    async def stop(self) -> None:
+        await self.server.stop()
+
+    async def _handle_update(self, request: Request) -> Response:
+        """Проверка secret token и передача обновления дальше"""
+        if self.secret:
+            token = request.headers.get("x-telegram-bot-api-secret-token", "").encode("latin-1")
+            if not hmac.compare_digest(token, self.secret):
+                self.rejected += 1
+                logger.warning("Webhook: запрос с неверным secret token")
+                return text_response("Forbidden", 403)
+
+        try:
+            data = request.json()
+            if not isinstance(data, dict) or "update_id" not in data:
+                raise ValueError("нет update_id")
+        except ValueError as e:
+            logger.error(f"Webhook: некорректное обновление: {e}")
+            return text_response("Bad Request", 400)
+
+        # Отвечаем сразу, обработка идет дальше по очереди
+        await self.deliver(data)
+        self.received += 1
+        return text_response("OK")
+
+
+async def set_webhook(bot) -> None:
+    """Регистрация webhook в Telegram по настройкам Config"""
+    await bot.set_webhook(
+        url=Config.WEBHOOK_URL,
+        secret_token=Config.WEBHOOK_SECRET or None,
+        max_connections=Config.WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=Update.ALL_TYPES
+    )
+    logger.info(f"Webhook установлен: {Config.WEBHOOK_URL}")
+
+
+def build_webhook_server(deliver: Callable[[dict], Awaitable[None]]) -> WebhookServer:
+    """Webhook сервер по настройкам Config"""
+    return WebhookServer(
+        deliver,
+        Config.WEBHOOK_LISTEN,
+        Config.WEBHOOK_PORT,
+        Config.WEBHOOK_PATH,
+        Config.WEBHOOK_SECRET,
+        Config.WEBHOOK_MAX_CONNECTIONS
+    )
+
+
+async def serve_webhook(application: Application, stop_event: Optional[asyncio.Event] = None) -> None:
+    """Работа Application в режиме webhook до сигнала остановки"""
+    if stop_event is None:
+        stop_event = stop_event_from_signals()
+
+    server = build_webhook_server(application_deliver(application))
+
+    async def setup() -> None:
+        await server.start()
+        await set_webhook(application.bot)
+
+    await run_application(application, stop_event, setup, server.stop)
+
+
+def run_webhook(application: Application) -> None:
+    """Запуск в режиме webhook (синхронная обертка, как run_polling)"""
+    asyncio.run(serve_webhook(application))
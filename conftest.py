@@ -0,0 +1,24 @@
+"""
+Общая настройка тестов: временный каталог данных на всю сессию pytest.
+Окружение выставляется до импорта тестовых модулей - Config читает его при импорте
+"""
+
+import os
+import shutil
+import tempfile
+
+import pytest
+
+os.environ.setdefault("BOT_TOKEN", "123:test")
+os.environ.setdefault("ENVIRONMENT", "test")
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="bot-test-")
+
+# Отдельный скрипт проверки окружения: python test_ptb20.py
+collect_ignore = ["test_ptb20.py"]
+
+
+@pytest.fixture(scope="session", autouse=True)
+def data_dir():
+    """Каталог данных сессии; удаляется после всех тестов"""
+    yield os.environ["DATA_DIR"]
+    shutil.rmtree(os.environ["DATA_DIR"], ignore_errors=True)
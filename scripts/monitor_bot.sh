@@ -5,6 +5,7 @@
 BOT_NAME="mybot"
 LOG_FILE="/opt/mybot/data/logs/health.log"
 STATUS_FILE="/var/www/html/status/health.json"
+METRICS_URL="http://127.0.0.1:9108/metrics"
 
 # Проверяем статус бота
 check_bot_status() {
@@ -25,6 +26,11 @@ check_cards_count() {
     ls -1 /var/lib/mybot/data/cards/*.json 2>/dev/null | wc -l
 }
 
+# Число обработанных обновлений из метрик бота
+check_updates_total() {
+    curl -s --max-time 2 "$METRICS_URL" | awk '$1 == "bot_updates_total" {print $2}' || echo "0"
+}
+
 # Проверяем размер логов
 check_logs_size() {
     du -sh /var/lib/mybot/data/logs/ | awk '{print $1}'
@@ -37,9 +43,10 @@ main() {
     MEMORY=$(check_memory)
     CARDS=$(check_cards_count)
     LOGS_SIZE=$(check_logs_size)
+    UPDATES=$(check_updates_total)
 
     # Записываем в лог
-    echo "[$TIMESTAMP] status=$STATUS, memory=${MEMORY}%, cards=$CARDS, logs=$LOGS_SIZE" >> $LOG_FILE
+    echo "[$TIMESTAMP] status=$STATUS, memory=${MEMORY}%, cards=$CARDS, logs=$LOGS_SIZE, updates=$UPDATES" >> $LOG_FILE
 
     # Создаем JSON для веб-интерфейса
     cat > $STATUS_FILE << EOF
@@ -49,6 +56,7 @@ main() {
     "memory_usage_percent": "$MEMORY",
     "cards_count": "$CARDS",
     "logs_size": "$LOGS_SIZE",
+    "updates_total": "$UPDATES",
     "python_version": "$(python3.13 --version 2>/dev/null | cut -d' ' -f2)",
     "uptime": "$(uptime -p)"
 }
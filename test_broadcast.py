@@ -0,0 +1,64 @@
+"""
+Тесты рассылок: продолжение с сохраненного курсора после рестарта
+"""
+
+import asyncio
+
+from bot.broadcast import BroadcastManager
+from bot.config import Config
+from bot.database import CardManager
+
+
+class FakeBot:
+    """Записывает отправленные сообщения по чатам"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((chat_id, text))
+        return text
+
+
+def test_resume_continues_from_cursor(monkeypatch):
+    """После рестарта рассылка отправляет только необработанным и завершается"""
+    monkeypatch.setattr(Config, "BROADCAST_BATCH_SIZE", 1)
+    user_ids = [401, 402, 403]
+    numbers = [
+        CardManager.create_card({"user_id": user_id, "username": "test"}, user_id, "Москва")["number"]
+        for user_id in user_ids
+    ]
+
+    manager = BroadcastManager()
+    job = {
+        "id": "1001",
+        "filter": "moscow",
+        "text": "Новости",
+        "admin_id": 1,
+        "created_at": "2024-01-01T00:00:00Z",
+        "status": "running",
+        "recipients": numbers,
+        "done": 1,  # Первому отправлено до рестарта
+        "sent": 1,
+        "failed": {},
+    }
+    assert manager.save(job)
+    assert manager.save({**job, "id": "1000", "status": "cancelled", "done": 0, "sent": 0})
+
+    async def run():
+        bot = FakeBot()
+        assert await manager.resume(bot) == 1
+        await asyncio.gather(*manager._tasks.values())
+        return bot
+
+    bot = asyncio.run(run())
+
+    assert [chat_id for chat_id, text in bot.sent if text == "Новости"] == user_ids[1:]
+    saved = manager.load("1001")
+    assert (saved["status"], saved["done"], saved["sent"], saved["failed"]) == ("done", 3, 3, {})
+    assert manager.load("1000")["status"] == "cancelled"
+
+    # Отчет модераторам и история только у получивших сообщение после рестарта
+    assert any(chat_id == Config.MODERATION_CHAT_ID for chat_id, _ in bot.sent)
+    histories = [len(CardManager.load_card(number)["history"]) for number in numbers]
+    assert histories[1] == histories[2] == histories[0] + 1
@@ -0,0 +1,74 @@
+"""
+Тесты пакетных команд: разбор списков номеров и пакетная запись
+"""
+
+import pytest
+
+from bot.config import Config
+from bot.database import CardManager
+from bot.utils import expand_card_token, parse_card_numbers
+
+
+def test_expand_token():
+    """Номер, диапазон, неверные токены"""
+    assert expand_card_token("12") == ["0012"]
+    assert expand_card_token("0012") == ["0012"]
+    assert expand_card_token("9-11") == ["0009", "0010", "0011"]
+    assert expand_card_token("7-7") == ["0007"]
+    assert expand_card_token("20-10") is None  # Обратный диапазон
+    assert expand_card_token("12345") is None  # Больше 4 цифр
+    for token in ("", "abc", "12a", "-5", "5-", "1--3", "1-2-3"):
+        assert expand_card_token(token) is None, token
+
+    # Диапазон обрезается до BULK_MAX_CARDS + 1: дальше сработает проверка пакета
+    assert len(expand_card_token("1-9999")) == Config.BULK_MAX_CARDS + 1
+
+
+def test_parse_numbers():
+    """Списки через пробел и запятую: порядок сохраняется, повторы и пустые токены убираются"""
+    assert parse_card_numbers(["12", "15,20-22"]) == ["0012", "0015", "0020", "0021", "0022"]
+    assert parse_card_numbers(["3, 1", " 2 "]) == ["0003", "0001", "0002"]
+    assert parse_card_numbers(["5", "4-6", "5"]) == ["0005", "0004", "0006"]
+    assert parse_card_numbers(["1,,2,"]) == ["0001", "0002"]
+    assert len(parse_card_numbers([f"1-{Config.BULK_MAX_CARDS}"])) == Config.BULK_MAX_CARDS
+
+
+@pytest.mark.parametrize("args, message", [
+    ([], "Не указаны"),
+    ([",", " , "], "Не указаны"),
+    (["12", "abc"], "Неверный номер или диапазон: abc"),
+    (["10-5"], "Неверный номер или диапазон: 10-5"),
+    ([f"1-{Config.BULK_MAX_CARDS + 1}"], "Слишком много"),
+    (["1-9999"], "Слишком много"),
+    ([f"1-{Config.BULK_MAX_CARDS}", "500"], "Слишком много"),
+])
+def test_parse_errors(args, message):
+    with pytest.raises(ValueError, match=message):
+        parse_card_numbers(args)
+
+
+def test_batch_all_or_nothing():
+    """Пакетная запись: отсутствующая или невалидная карточка - не пишется ни одна"""
+    numbers = [
+        CardManager.create_card({"user_id": user_id, "username": "test"}, user_id, "Москва")["number"]
+        for user_id in (101, 102, 103)
+    ]
+    paths = {number: Config.CARDS_DIR / f"{number}.json" for number in numbers}
+    before = {number: path.read_bytes() for number, path in paths.items()}
+    approve = ({"status": "approved", "decision": "approved"}, None, None)
+
+    results = CardManager.update_cards({**{number: approve for number in numbers}, "9999": approve})
+    assert not any(results.values())
+    assert {number: path.read_bytes() for number, path in paths.items()} == before
+
+    invalid = dict.fromkeys(numbers, approve)
+    invalid[numbers[-1]] = ({"decision": "maybe"}, None, None)
+    results = CardManager.update_cards(invalid)
+    assert not any(results.values())
+    assert {number: path.read_bytes() for number, path in paths.items()} == before
+
+    results = CardManager.update_cards({number: approve for number in numbers})
+    assert all(result is True for result in results.values())
+    for number in numbers:
+        card = CardManager.load_card(number)
+        assert card["decision"] == "approved" and card["version"] == 2
@@ -0,0 +1,117 @@
+"""
+Тесты записи карточек с проверкой версии (CAS) и повторами
+"""
+
+import threading
+
+import pytest
+
+from bot.config import Config
+from bot.database import SKIPPED, AtomicOperations, CardManager, VersionConflict
+from bot.schemas import create_history_entry
+
+
+def new_card(user_id: int = 100) -> str:
+    card = CardManager.create_card({"user_id": user_id, "username": "test"}, user_id, "Москва")
+    assert card
+    return card["number"]
+
+
+def note(text: str) -> dict:
+    return create_history_entry(source="system", entry_type="command", text=text)
+
+
+def test_write_conflict():
+    """Запись с устаревшей версией отклоняется, с текущей - проходит"""
+    card_number = new_card()
+    card = CardManager.load_card(card_number)
+
+    with pytest.raises(VersionConflict):
+        AtomicOperations.write_card_cas(card_number, dict(card), card["version"] + 5)
+
+    assert AtomicOperations.write_card_cas(card_number, card, card["version"])
+    assert CardManager.load_card(card_number)["version"] == 2
+
+
+def test_retry_after_conflict():
+    """Конкурирующая запись между чтением и записью - повтор по свежей карточке"""
+    card_number = new_card()
+    calls = 0
+
+    def apply(card: dict) -> None:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            # Другой писатель успевает записать после нашего чтения
+            assert CardManager.update_card(card_number, {"fio": "Конкурент"}, note("чужая запись"))
+        card["extra"] = "наше дополнение"
+
+    assert CardManager.modify_card(card_number, apply) is True
+    card = CardManager.load_card(card_number)
+
+    assert calls == 2
+    assert card["fio"] == "Конкурент" and card["extra"] == "наше дополнение"
+    assert card["version"] == 3
+
+
+def test_locked_fallback():
+    """После CARD_UPDATE_RETRIES конфликтов запись идет под блокировкой"""
+    card_number = new_card()
+    calls = 0
+
+    def apply(card: dict) -> None:
+        nonlocal calls
+        calls += 1
+        # Мешаем только оптимистичным попыткам: под блокировкой запись из apply зависла бы
+        if calls <= Config.CARD_UPDATE_RETRIES:
+            assert CardManager.update_card(card_number, {}, note(f"помеха {calls}"))
+        card["history"].append(note("наша запись"))
+
+    assert CardManager.modify_card(card_number, apply) is True
+    card = CardManager.load_card(card_number)
+    texts = [entry["text"] for entry in card["history"]]
+
+    assert calls == Config.CARD_UPDATE_RETRIES + 1
+    assert texts.count("наша запись") == 1
+    assert all(f"помеха {i}" in texts for i in range(1, Config.CARD_UPDATE_RETRIES + 1))
+    assert card["version"] == 1 + Config.CARD_UPDATE_RETRIES + 1
+
+
+def test_concurrent_writers():
+    """Параллельные писатели в потоках не теряют записи истории"""
+    card_number = new_card()
+    threads_count, writes = 8, 10
+    failures = []
+
+    def writer(index: int) -> None:
+        for i in range(writes):
+            if not CardManager.update_card(card_number, {}, note(f"{index}:{i}")):
+                failures.append((index, i))
+
+    threads = [threading.Thread(target=writer, args=(index,)) for index in range(threads_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    card = CardManager.load_card(card_number)
+    written = [entry["text"] for entry in card["history"][1:]]
+
+    assert not failures
+    assert sorted(written) == sorted(f"{index}:{i}" for index in range(threads_count) for i in range(writes))
+    assert card["version"] == 1 + threads_count * writes
+
+
+def test_skipped():
+    """apply вернул SKIPPED - карточка не пишется; нет карточки - False"""
+    card_number = new_card()
+    path = Config.CARDS_DIR / f"{card_number}.json"
+    before = path.read_bytes()
+
+    def apply(card: dict) -> str:
+        card["fio"] = "Не должно сохраниться"
+        return SKIPPED
+
+    assert CardManager.modify_card(card_number, apply) == SKIPPED
+    assert path.read_bytes() == before
+    assert CardManager.modify_card("9999", apply) is False
@@ -0,0 +1,125 @@
+"""
+Тесты диспетчера обновлений: порядок по ключам и лимит параллельности
+"""
+
+import asyncio
+
+from telegram import Update
+
+from bot.dispatcher import KeyedUpdateProcessor
+from tools.fake_bot_api import make_message_update
+
+MODERATION_CHAT_ID = -1001234567890
+
+
+def message(update_id: int, user_id: int, text: str, chat_id: int = None) -> Update:
+    return Update.de_json(make_message_update(update_id, user_id, text, chat_id), None)
+
+
+def callback(update_id: int, user_id: int, data: str) -> Update:
+    """Нажатие кнопки под постом в группе модерации"""
+    prompt = {"message_id": 5, "date": 0, "chat": {"id": MODERATION_CHAT_ID, "type": "supergroup"}}
+    return Update.de_json({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": "Модератор"},
+            "chat_instance": str(MODERATION_CHAT_ID),
+            "message": prompt,
+            "data": data,
+        },
+    }, None)
+
+
+async def run_all(processor: KeyedUpdateProcessor, updates, handler) -> list:
+    """Подача обновлений в порядке списка, как это делает Application"""
+    tasks = [
+        asyncio.create_task(processor.do_process_update(update, handler(update)))
+        for update in updates
+    ]
+    return await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def test_keys():
+    """Ключи: пользователь, его заявка, номера и диапазоны из команд"""
+    processor = KeyedUpdateProcessor(4, 100, {100: {"card_number": "0012"}})
+
+    assert processor.update_keys(message(1, 100, "Когда будет решение?")) == ["card:0012", "user:100"]
+
+    keys = processor.update_keys(message(2, 900, "/approve 12 14-15 готово", MODERATION_CHAT_ID))
+    assert keys == ["card:0012", "card:0014", "card:0015", "user:900"]
+
+    keys = processor.update_keys(callback(3, 900, "mod:reject:0015"))
+    assert keys == ["card:0015", "user:900"]
+
+
+def test_order_per_user():
+    """Обновления одного пользователя - строго по порядку, даже если первое дольше"""
+    processor = KeyedUpdateProcessor(8, 100)
+    finished = []
+
+    def handler(update: Update):
+        async def handle():
+            # Первые сообщения обрабатываются дольше последующих
+            await asyncio.sleep(0.05 / update.update_id)
+            finished.append(update.update_id)
+        return handle()
+
+    asyncio.run(run_all(processor, [message(i, 100, f"сообщение {i}") for i in range(1, 6)], handler))
+    assert finished == [1, 2, 3, 4, 5]
+
+
+def test_shared_card():
+    """Команда модератора ждет сообщение пользователя по той же заявке"""
+    processor = KeyedUpdateProcessor(8, 100, {100: {"card_number": "0012"}})
+    events = []
+
+    def handler(update: Update):
+        async def handle():
+            events.append(("start", update.update_id))
+            await asyncio.sleep(0.05 if update.update_id == 1 else 0)
+            events.append(("end", update.update_id))
+        return handle()
+
+    asyncio.run(run_all(processor, [
+        message(1, 100, "Дополнение к заявке"),
+        message(2, 900, "/approve 12", MODERATION_CHAT_ID),
+    ], handler))
+    assert events == [("start", 1), ("end", 1), ("start", 2), ("end", 2)]
+
+
+def test_concurrency_limit():
+    """Разные пользователи - параллельно, но не больше concurrency обработчиков"""
+    processor = KeyedUpdateProcessor(3, 100)
+    active = 0
+    peak = 0
+
+    def handler(update: Update):
+        async def handle():
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.02)
+            active -= 1
+        return handle()
+
+    asyncio.run(run_all(processor, [message(i, 100 + i, "привет") for i in range(1, 10)], handler))
+    assert peak == 3
+    assert processor.stats()["keys"] == 0  # Очереди ключей очищены
+
+
+def test_failed_handler():
+    """Ошибка обработчика не блокирует следующие обновления того же пользователя"""
+    processor = KeyedUpdateProcessor(4, 100)
+    finished = []
+
+    def handler(update: Update):
+        async def handle():
+            if update.update_id == 1:
+                raise RuntimeError("сбой обработчика")
+            finished.append(update.update_id)
+        return handle()
+
+    results = asyncio.run(run_all(processor, [message(1, 100, "a"), message(2, 100, "b")], handler))
+    assert isinstance(results[0], RuntimeError)
+    assert finished == [2]
@@ -0,0 +1,93 @@
+"""
+Тесты выбора лидера: захват и перехват lease, рост epoch, fencing записей
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from bot.config import Config
+from bot.database import CardManager, write_fence
+from bot.leader import LeaderLease, keep_leadership, resume_work
+from bot.sender import send_queue
+
+TTL = 0.3
+
+
+@pytest.fixture
+def lease_file():
+    """Файл lease и fencing процесса сбрасываются после теста"""
+    yield Config.LEADER_LEASE_FILE
+    write_fence.epoch = None
+    resume_work()
+    Config.LEADER_LEASE_FILE.unlink(missing_ok=True)
+
+
+def test_takeover_increments_epoch(lease_file):
+    """Продление сохраняет epoch, перехват после истечения и release - увеличивают"""
+    first = LeaderLease(lease_file, TTL)
+    second = LeaderLease(lease_file, TTL)
+
+    assert first.try_acquire() and first.epoch == 1
+    assert not second.try_acquire()
+    assert first.try_acquire() and first.epoch == 1
+
+    time.sleep(TTL + 0.05)
+    assert second.try_acquire() and second.epoch == 2
+    assert not first.try_acquire()
+
+    second.release()
+    assert second.read() == {"holder": None, "epoch": 2, "expires_at": 0}
+    assert not second.try_acquire()  # После release процесс не продлевает lease
+
+    third = LeaderLease(lease_file, TTL)
+    assert third.try_acquire() and third.epoch == 3
+
+
+def test_fenced_write_after_takeover(lease_file):
+    """Прежний лидер со старым epoch не пишет решения, новый - пишет"""
+    number = CardManager.create_card({"user_id": 301, "username": "test"}, 301, "Москва")["number"]
+    first = LeaderLease(lease_file, TTL)
+    second = LeaderLease(lease_file, TTL)
+
+    assert first.try_acquire()
+    write_fence.epoch = first.epoch
+    assert CardManager.modify_card(number, lambda card: card.update(status="approved"), fenced=True) is True
+
+    time.sleep(TTL + 0.05)
+    assert second.try_acquire()
+
+    rejected = write_fence.rejected
+    assert CardManager.modify_card(number, lambda card: card.update(status="rejected"), fenced=True) is False
+    assert write_fence.rejected == rejected + 1
+    assert CardManager.load_card(number)["status"] == "approved"
+
+    # Нефенсированные записи (данные пользователя) не зависят от lease
+    assert CardManager.modify_card(number, lambda card: card.update(city="Не Москва")) is True
+
+    write_fence.epoch = second.epoch
+    assert CardManager.modify_card(number, lambda card: card.update(status="rejected"), fenced=True) is True
+    assert CardManager.load_card(number)["status"] == "rejected"
+
+
+def test_keep_leadership_stops_on_lost_lease(lease_file, monkeypatch):
+    """Перехваченный lease: отправка приостановлена, процесс останавливается"""
+    monkeypatch.setattr(Config, "LEADER_HEARTBEAT", 0.01)
+    lease = LeaderLease(lease_file, TTL)
+    other = LeaderLease(lease_file, TTL)
+
+    async def run():
+        assert await asyncio.to_thread(lease.try_acquire)
+        write_fence.epoch = lease.epoch
+        lease_file.unlink()  # Другой процесс захватил освободившийся lease
+        assert await asyncio.to_thread(other.try_acquire)
+
+        stop_event = asyncio.Event()
+        await asyncio.wait_for(keep_leadership(lease, stop_event), 5)
+        return stop_event.is_set()
+
+    assert asyncio.run(run())
+    assert lease.lost
+    assert write_fence.suspended and not write_fence.check()
+    assert send_queue.stats()["paused"] == 1
@@ -0,0 +1,140 @@
+"""
+Тесты outbox уведомлений: повторы, отказ, fencing и дедупликация
+"""
+
+import asyncio
+import time
+
+from telegram.error import Forbidden, NetworkError
+
+from bot.config import Config
+from bot.database import CardManager, write_fence
+from bot.outbox import NotificationOutbox, create_outbox_entry, retry_delay
+
+USER_ID = 100
+
+
+class FakeBot:
+    """Бот, который бросает заданные ошибки, затем отправляет"""
+
+    def __init__(self, *errors: Exception):
+        self.errors = list(errors)
+        self.sent = []
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((chat_id, text))
+        return True
+
+
+def card_with_entry(attempts: int = 0) -> tuple:
+    """Карточка с одним неотправленным уведомлением: (номер, запись)"""
+    card = CardManager.create_card({"user_id": USER_ID, "username": "test"}, USER_ID, "Москва")
+    entry = create_outbox_entry(USER_ID, "Заявка одобрена")
+    entry["attempts"] = attempts
+    assert CardManager.update_card(card["number"], {}, None, entry)
+    return card["number"], entry
+
+
+def stored_entry(card_number: str) -> dict:
+    return CardManager.load_card(card_number)["outbox"][0]
+
+
+def test_retry_then_sent():
+    """Сетевая ошибка - повтор позже, следующая попытка - sent, дальше ничего не шлется"""
+    card_number, entry = card_with_entry()
+    outbox = NotificationOutbox()
+    outbox.bot = FakeBot(NetworkError("сеть недоступна"))
+
+    asyncio.run(outbox._deliver(card_number, entry["id"]))
+    stored = stored_entry(card_number)
+    assert stored["status"] == "pending" and stored["attempts"] == 1
+    assert stored["next_attempt_at"] > time.time()
+    assert "сеть недоступна" in stored["last_error"]
+    assert outbox.stats()["retries"] == 1 and outbox.stats()["scheduled"] == 1
+
+    asyncio.run(outbox._deliver(card_number, entry["id"]))
+    stored = stored_entry(card_number)
+    assert stored["status"] == "sent" and stored["attempts"] == 2
+    assert outbox.bot.sent == [(USER_ID, "Заявка одобрена")]
+
+    asyncio.run(outbox._deliver(card_number, entry["id"]))
+    assert len(outbox.bot.sent) == 1
+
+
+def test_forbidden_gives_up():
+    """Пользователь заблокировал бота - без повторов, модераторам сообщение"""
+    card_number, entry = card_with_entry()
+    outbox = NotificationOutbox()
+    outbox.bot = FakeBot(Forbidden("bot was blocked by the user"))
+
+    asyncio.run(outbox._deliver(card_number, entry["id"]))
+    stored = stored_entry(card_number)
+    assert stored["status"] == "failed" and stored["attempts"] == 1
+    assert outbox.stats()["failed"] == 1 and outbox.stats()["scheduled"] == 0
+    assert [chat_id for chat_id, _ in outbox.bot.sent] == [Config.MODERATION_CHAT_ID]
+
+
+def test_max_attempts_gives_up():
+    """Последняя разрешенная попытка неудачна - отказ"""
+    card_number, entry = card_with_entry(attempts=Config.OUTBOX_MAX_ATTEMPTS - 1)
+    outbox = NotificationOutbox()
+    outbox.bot = FakeBot(NetworkError("сеть недоступна"))
+
+    asyncio.run(outbox._deliver(card_number, entry["id"]))
+    stored = stored_entry(card_number)
+    assert stored["status"] == "failed"
+    assert stored["attempts"] == Config.OUTBOX_MAX_ATTEMPTS
+    assert outbox.stats()["retries"] == 0
+
+
+def test_fenced_delivery():
+    """Без lease лидера уведомление не отправляется и откладывается"""
+    card_number, entry = card_with_entry()
+    outbox = NotificationOutbox()
+    outbox.bot = FakeBot()
+
+    write_fence.epoch = 7  # Lease на диске нет - процесс не лидер
+    try:
+        asyncio.run(outbox._deliver(card_number, entry["id"]))
+    finally:
+        write_fence.epoch = None
+
+    assert outbox.bot.sent == []
+    assert stored_entry(card_number)["status"] == "pending"
+    assert outbox.stats()["scheduled"] == 1
+
+
+def test_duplicate_schedule_sends_once():
+    """Запись, поставленная дважды (recover и решение), доставляется один раз"""
+    card_number, entry = card_with_entry()
+    outbox = NotificationOutbox()
+
+    async def run() -> None:
+        outbox.schedule(card_number, entry)
+        outbox.schedule(card_number, entry)
+        assert outbox.stats()["scheduled"] == 1
+
+        outbox.start(FakeBot())
+        for _ in range(200):
+            if stored_entry(card_number)["status"] == "sent":
+                break
+            await asyncio.sleep(0.01)
+        await outbox.close()
+
+        # После доставки id освобожден: повторная постановка снова допускается
+        outbox.schedule(card_number, entry)
+        assert outbox.stats()["scheduled"] == 1
+
+    asyncio.run(run())
+    assert outbox.bot.sent == [(USER_ID, "Заявка одобрена")]
+    assert stored_entry(card_number)["status"] == "sent"
+
+
+def test_retry_delay():
+    """Пауза растет вдвое, с разбросом ±20% и ограничена OUTBOX_RETRY_MAX"""
+    for attempts in range(1, 20):
+        expected = min(Config.OUTBOX_RETRY_BASE * 2 ** (attempts - 1), Config.OUTBOX_RETRY_MAX)
+        for _ in range(20):
+            assert expected * 0.8 <= retry_delay(attempts) <= expected * 1.2
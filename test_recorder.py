@@ -0,0 +1,78 @@
+"""
+Тесты записи обновлений: обезличивание и цепочка scrubbers
+"""
+
+import json
+
+from telegram import Update
+
+from bot.config import Config
+from bot.recorder import UpdateRecorder, mask_text, pseudonym, scrub_personal_data
+from tools.fake_bot_api import make_callback_update, make_message_update
+
+USER_ID = 100
+MODERATION_CHAT_ID = -1001234567890
+
+
+def test_mask_text():
+    """Маска сохраняет длину, регистр, алфавит, команду и номера заявок"""
+    for text in ("Иванов Иван", "John Smith", "ёЁ Ü", "тел. +7 912 3456789", "/approve 12 ок", ""):
+        assert len(mask_text(text)) == len(text), text
+
+    assert mask_text("Иванов Ivan") == "Аааааа Xxxx"
+    assert mask_text("/approve 0012 готово") == "/approve 0012 аааааа"
+    assert mask_text("/start") == "/start"
+    assert mask_text("Заявка 0042, тел 89123456789") == "Аааааа 0042, ааа 00000000000"
+    assert mask_text("код 12345 и 1234") == "ааа 00000 а 1234"
+    assert mask_text("89123456789") == "00000000000"  # Число в конце строки
+
+
+def test_scrub_message():
+    """Имена, тексты и id пользователя обезличены, группа и разметка сохранены, геопозиция удалена"""
+    data = make_message_update(1, USER_ID, "/approve 12 Иванов", MODERATION_CHAT_ID)
+    data["message"]["location"] = {"latitude": 55.75, "longitude": 37.61}
+    data["message"]["contact"] = {"phone_number": "+79123456789", "first_name": "Иван", "user_id": USER_ID}
+    message = scrub_personal_data(data)["message"]
+
+    assert message["from"]["id"] == pseudonym(USER_ID) != USER_ID
+    assert message["contact"]["user_id"] == pseudonym(USER_ID)
+    # В имени 3 цифры - меньше MIN_MASKED_DIGITS, остаются
+    assert message["from"]["first_name"] == "Xxxx100" and message["from"]["username"] == "xxxx100"
+    assert message["contact"]["phone_number"] == "+00000000000"
+    assert message["chat"] == data["message"]["chat"]
+    assert message["text"] == "/approve 12 Аааааа"
+    assert message["entities"] == data["message"]["entities"]
+    assert "location" not in message
+    assert message["message_id"] == 1
+    assert data["message"]["from"]["id"] == USER_ID  # Исходный словарь не изменен
+
+
+def test_scrub_private_chat_and_callback():
+    """Личный чат - тот же псевдоним, что у пользователя; callback_data не меняется"""
+    private = scrub_personal_data(make_message_update(2, USER_ID, "Привет"))["message"]
+    assert private["chat"]["id"] == private["from"]["id"] == pseudonym(USER_ID)
+
+    prompt = {"message_id": 5, "date": 0, "chat": {"id": MODERATION_CHAT_ID, "type": "supergroup"}}
+    callback = scrub_personal_data(make_callback_update(3, USER_ID, "mod:approve:0012", prompt))
+    assert callback["callback_query"]["data"] == "mod:approve:0012"
+    assert callback["callback_query"]["from"]["id"] == pseudonym(USER_ID)
+
+    assert pseudonym(USER_ID) == pseudonym(USER_ID) != pseudonym(USER_ID + 1)
+
+
+def test_recorder_chain(monkeypatch):
+    """Цепочка scrubbers: None - обновление не записывается"""
+    monkeypatch.setattr(Config, "RECORD_UPDATES", True)
+    recorder = UpdateRecorder(Config.RECORDINGS_DIR / "test.jsonl")
+    recorder.add_scrubber(lambda data: None if "/skip" in data["message"]["text"] else data)
+
+    recorder.record(Update.de_json(make_message_update(1, USER_ID, "Иванов Иван"), None))
+    recorder.record(Update.de_json(make_message_update(2, USER_ID, "/skip"), None))
+    recorder.record("не обновление")
+
+    with open(recorder.path, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+
+    assert recorder.stats() == {"recorded": 1, "skipped": 1, "errors": 0}
+    assert [line["update"]["update_id"] for line in lines] == [1]
+    assert lines[0]["update"]["message"]["text"] == "Аааааа Аааа"
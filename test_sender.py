@@ -0,0 +1,115 @@
+"""
+Тесты очереди отправки: приоритеты, лимиты, RetryAfter
+"""
+
+import asyncio
+import time
+
+import pytest
+from telegram.error import BadRequest, RetryAfter
+
+from bot.config import Config
+from bot.sender import Priority, SendQueue, TokenBucket
+
+
+class FakeApi:
+    """Вызов Bot API: записывает текст и время вызова, может падать заданными ошибками"""
+
+    def __init__(self, errors=()):
+        self.calls = []
+        self.errors = list(errors)
+
+    async def send_message(self, chat_id, text):
+        self.calls.append((text, time.monotonic()))
+        if self.errors:
+            raise self.errors.pop(0)
+        return text
+
+
+def test_bucket_serves_priority_first():
+    """Пустое ведро: ожидающие получают токены по приоритету, внутри - по порядку"""
+    async def run():
+        bucket = TokenBucket(rate=50, capacity=1)
+        await bucket.acquire()
+        order = []
+
+        async def wait(name, priority):
+            await bucket.acquire(priority)
+            order.append(name)
+
+        await asyncio.gather(
+            wait("low", Priority.LOW),
+            wait("normal", Priority.NORMAL),
+            wait("high-1", Priority.HIGH),
+            wait("high-2", Priority.HIGH),
+        )
+        return order
+
+    assert asyncio.run(run()) == ["high-1", "high-2", "normal", "low"]
+
+
+def test_queue_priority_within_chat():
+    """Накопленные в очереди чата сообщения уходят по приоритету"""
+    async def run():
+        queue = SendQueue()
+        api = FakeApi()
+        # Обработчик очереди чата запустится после постановки всех трех
+        futures = [
+            queue.send_message(api, 1, "low", Priority.LOW),
+            queue.send_message(api, 1, "normal", Priority.NORMAL),
+            queue.send_message(api, 1, "high", Priority.HIGH),
+        ]
+        assert queue.stats()["depth_by_priority"] == {"HIGH": 1, "NORMAL": 1, "LOW": 1}
+        await asyncio.gather(*futures)
+        return [text for text, _ in api.calls]
+
+    assert asyncio.run(run()) == ["high", "normal", "low"]
+
+
+def test_private_chat_rate_limit(monkeypatch):
+    """Личный чат: BURST сообщений сразу, дальше не чаще SEND_PRIVATE_RATE в секунду"""
+    monkeypatch.setattr(Config, "SEND_PRIVATE_RATE", 20.0)
+    monkeypatch.setattr(Config, "SEND_PRIVATE_BURST", 2)
+
+    async def run():
+        queue = SendQueue()
+        api = FakeApi()
+        await asyncio.gather(*(queue.send_message(api, 7, str(i)) for i in range(6)))
+        return [at for _, at in api.calls]
+
+    times = asyncio.run(run())
+    assert times[1] - times[0] < 0.04
+    # k-е сообщение после BURST ждет (k - BURST + 1) токенов
+    for k in range(2, len(times)):
+        assert times[k] - times[0] >= (k - 1) / 20 - 0.005, times
+
+
+def test_retry_after_and_failure():
+    """RetryAfter повторяется и считается; прочие ошибки - в future и в failed"""
+    async def run():
+        queue = SendQueue()
+        retried = FakeApi([RetryAfter(0)])
+        assert await queue.send_message(retried, 1, "ok") == "ok"
+
+        broken = FakeApi([BadRequest("Chat not found")])
+        with pytest.raises(BadRequest):
+            await queue.send_message(broken, 2, "lost")
+        return queue.stats(), len(retried.calls)
+
+    stats, calls = asyncio.run(run())
+    assert calls == 2
+    assert (stats["sent"], stats["failed"], stats["retries"]) == (1, 1, 1)
+
+
+def test_retries_exhausted():
+    """После max_retries повторов RetryAfter отдается вызывающему"""
+    async def run():
+        queue = SendQueue()
+        queue.max_retries = 1
+        api = FakeApi([RetryAfter(0), RetryAfter(0)])
+        with pytest.raises(RetryAfter):
+            await queue.send_message(api, 1, "x")
+        return queue.stats()
+
+    stats = asyncio.run(run())
+    assert (stats["sent"], stats["failed"], stats["retries"]) == (0, 1, 2)
@@ -0,0 +1,43 @@
+"""
+Тесты приема webhook: проверка secret token и разбор обновлений
+"""
+
+import asyncio
+
+import httpx
+
+from bot.webhook import WebhookServer
+from tools.fake_bot_api import make_message_update
+
+SECRET = "test_secret"
+PATH = "/telegram"
+
+
+def test_secret_token_and_bad_requests():
+    """Без секрета и с неверным секретом - 403, без update_id - 400, доставляются только валидные"""
+    async def run():
+        delivered = []
+
+        async def deliver(data):
+            delivered.append(data["update_id"])
+
+        server = WebhookServer(deliver, "127.0.0.1", 0, PATH, SECRET)
+        await server.start()
+        url = f"http://127.0.0.1:{server.port}{PATH}"
+        update = make_message_update(1, 1, "webhook")
+        try:
+            async with httpx.AsyncClient() as client:
+                codes = [
+                    (await client.post(url, json=update)).status_code,
+                    (await client.post(url, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"})).status_code,
+                    (await client.post(url, json={"foo": 1}, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})).status_code,
+                    (await client.post(url, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})).status_code,
+                ]
+        finally:
+            await server.stop()
+        return codes, delivered, server
+
+    codes, delivered, server = asyncio.run(run())
+    assert codes == [403, 403, 400, 200]
+    assert delivered == [1]
+    assert (server.received, server.rejected) == (1, 2)
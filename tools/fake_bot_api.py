@@ -0,0 +1,408 @@
+"""
+Локальная заглушка Telegram Bot API для самопроверок и нагрузочных тестов.
+Приложение подключается к ней через base_url:
+    Application.builder().token(FAKE_TOKEN).base_url(api.base_url)
+
+Все, что бот отправляет в чат, попадает в почтовый ящик чата:
+    await api.expect(("chat", chat_id), timeout)
+"""
+
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import deque
+from email.parser import BytesParser
+from email.policy import HTTP
+from typing import Any, Deque, Dict, Hashable, List, Optional
+from urllib.parse import parse_qsl
+
+from bot.http_server import HttpServer, Request, Response, json_response
+
+FAKE_TOKEN = "123456:FAKE-TOKEN"
+FAKE_BOT = {
+    "id": 123456,
+    "is_bot": True,
+    "first_name": "Fake",
+    "username": "fake_bot",
+    "can_join_groups": True,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False,
+}
+
+
+# Методы, которые Telegram ограничивает по частоте (для инъекции 429)
+SEND_METHODS = {
+    "sendMessage", "sendPhoto", "sendDocument", "forwardMessage", "forwardMessages",
+    "copyMessage", "editMessageText", "editMessageCaption", "editMessageReplyMarkup",
+}
+MAILBOX_SIZE = 1000  # Непрочитанных сообщений на ключ почтового ящика
+
+
+def parse_params(request: Request) -> Dict[str, Any]:
+    """Параметры вызова: PTB шлет form-urlencoded (файлы - multipart), значения - JSON"""
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("application/json"):
+        return request.json()
+
+    if content_type.startswith("multipart/form-data"):
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + request.body
+        )
+        pairs = []
+        for part in message.iter_parts():
+            if part.get_filename():
+                pairs.append((part.get_param("name", header="content-disposition"), part.get_filename()))
+            else:
+                pairs.append((part.get_param("name", header="content-disposition"), part.get_content()))
+    else:
+        pairs = parse_qsl(request.body.decode("utf-8"), keep_blank_values=True)
+
+    params = {}
+    for key, value in pairs:
+        try:
+            params[key] = json.loads(value)
+        except ValueError:
+            params[key] = value
+    return params
+
+
+def make_chat(chat_id: int) -> dict:
+    if chat_id > 0:
+        return {"id": chat_id, "type": "private", "first_name": f"User{chat_id}"}
+    return {"id": chat_id, "type": "supergroup", "title": "Модерация"}
+
+
+def make_photo(file_id: str) -> List[dict]:
+    return [{"file_id": file_id, "file_unique_id": f"u{file_id}", "width": 640, "height": 640}]
+
+
+class FakeBotApi:
+    """
+    Заглушка Bot API: getMe, getUpdates (long polling), вебхук, отправка
+    и редактирование сообщений, пересылка, реакции, getChat,
+    getUserProfilePhotos, answerCallbackQuery.
+    latency - задержка сети в одну сторону; flood_rate - доля вызовов
+    отправки, получающих 429 Too Many Requests с retry_after секунд
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 flood_rate: float = 0.0, retry_after: int = 1):
+        self.latency = latency  # Задержка в одну сторону, секунд (имитация сети)
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.server = HttpServer(host, port, max_connections=1000)
+        self.server.route("POST", "/bot", self._dispatch, prefix=True)
+        self.server.route("GET", "/bot", self._dispatch, prefix=True)
+
+        self.methods = {
+            "getMe": self.get_me,
+            "getUpdates": self.get_updates,
+            "setWebhook": self.set_webhook,
+            "deleteWebhook": self.delete_webhook,
+            "sendMessage": self.send_message,
+            "sendPhoto": self.send_photo,
+            "sendDocument": self.send_document,
+            "forwardMessage": self.forward_message,
+            "forwardMessages": self.forward_messages,
+            "copyMessage": self.copy_message,
+            "editMessageText": self.edit_message,
+            "editMessageCaption": self.edit_message,
+            "editMessageReplyMarkup": self.edit_message,
+            "setMessageReaction": self.set_message_reaction,
+            "answerCallbackQuery": self.answer_callback_query,
+            "getChat": self.get_chat,
+            "getUserProfilePhotos": self.get_user_profile_photos,
+        }
+
+        self.calls: Dict[str, int] = {}
+        self.flooded: Dict[str, int] = {}  # Отданные 429 по методам
+        self.webhook: Dict[str, Any] = {}
+        self._updates: List[dict] = []
+        self._new_updates = asyncio.Event()
+        self._next_update_id = 1
+        self._message_ids: Dict[int, itertools.count] = {}
+        self._mail: Dict[Hashable, Deque[Any]] = {}
+        self._waiters: Dict[Hashable, Deque[asyncio.Future]] = {}
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.server.host}:{self.server.port}/bot"
+
+    async def start(self) -> None:
+        await self.server.start()
+
+    async def stop(self) -> None:
+        await self.server.stop()
+
+    def push_update(self, update: dict) -> int:
+        """Добавление обновления в очередь getUpdates; возвращает update_id"""
+        if "update_id" not in update:
+            update = dict(update, update_id=self._next_update_id)
+        self._next_update_id = max(self._next_update_id, update["update_id"]) + 1
+        self._updates.append(update)
+        self._new_updates.set()
+        return update["update_id"]
+
+    async def _dispatch(self, request: Request) -> Response:
+        # Путь: /bot<token>/<method>
+        method = request.path.rsplit("/", 1)[-1]
+        handler = self.methods.get(method)
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+        # Запрос "идет" до сервера и ответ обратно - по latency в каждую сторону
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if handler is None:
+            response = json_response({"ok": False, "error_code": 404, "description": "Not Found"}, 404)
+        elif method in SEND_METHODS and self.flood_rate and random.random() < self.flood_rate:
+            self.flooded[method] = self.flooded.get(method, 0) + 1
+            response = json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after}
+            }, 429)
+        else:
+            result = await handler(parse_params(request))
+            if isinstance(result, tuple):  # Готовый ответ (например, ошибка)
+                response = result
+            else:
+                response = json_response({"ok": True, "result": result})
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return response
+
+    # ------------------------- почтовые ящики -------------------------
+
+    def _notify(self, key: Hashable, payload: Any) -> None:
+        """Доставка ожидающему expect(key) или в ящик до первого запроса"""
+        waiters = self._waiters.get(key)
+        while waiters:
+            future = waiters.popleft()
+            if not future.done():
+                future.set_result(payload)
+                return
+        self._mail.setdefault(key, deque(maxlen=MAILBOX_SIZE)).append(payload)
+
+    async def expect(self, key: Hashable, timeout: float) -> Optional[Any]:
+        """
+        Следующее событие по ключу или None по таймауту. Ключи:
+        ("chat", chat_id) - {"method", "message"} всего, что бот показал в чате;
+        ("forward", from_chat_id, message_id) - пересылка сообщения;
+        ("callback", callback_query_id) - ответ на нажатие кнопки
+        """
+        mail = self._mail.get(key)
+        if mail:
+            return mail.popleft()
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, deque()).append(future)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            waiters = self._waiters.get(key)
+            if waiters is not None and not waiters:
+                del self._waiters[key]
+
+    # ------------------------- сообщения -------------------------
+
+    def _message(self, chat_id: int, message_id: int = None, **fields) -> dict:
+        if message_id is None:
+            message_id = next(self._message_ids.setdefault(chat_id, itertools.count(1_000_000)))
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": make_chat(chat_id),
+            "from": FAKE_BOT,
+        }
+        message.update({key: value for key, value in fields.items() if value is not None})
+        return message
+
+    def _show(self, method: str, chat_id: int, message: dict) -> None:
+        self._notify(("chat", chat_id), {"method": method, "message": message})
+
+    @staticmethod
+    def _reply_to(params: dict, chat_id: int) -> Optional[dict]:
+        reply = params.get("reply_parameters") or {}
+        message_id = reply.get("message_id") or params.get("reply_to_message_id")
+        if not message_id:
+            return None
+        return {"message_id": message_id, "date": int(time.time()), "chat": make_chat(chat_id)}
+
+    async def send_message(self, params: dict):
+        chat_id = int(params["chat_id"])
+        message = self._message(
+            chat_id,
+            text=str(params.get("text", "")),
+            reply_markup=params.get("reply_markup"),
+            reply_to_message=self._reply_to(params, chat_id)
+        )
+        self._show("sendMessage", chat_id, message)
+        return message
+
+    async def send_photo(self, params: dict):
+        chat_id = int(params["chat_id"])
+        message = self._message(
+            chat_id,
+            photo=make_photo(str(params.get("photo"))),
+            caption=params.get("caption"),
+            reply_markup=params.get("reply_markup")
+        )
+        self._show("sendPhoto", chat_id, message)
+        return message
+
+    async def send_document(self, params: dict):
+        chat_id = int(params["chat_id"])
+        name = str(params.get("document"))
+        message = self._message(
+            chat_id,
+            document={"file_id": f"doc-{name}", "file_unique_id": f"udoc-{name}", "file_name": name},
+            caption=params.get("caption")
+        )
+        self._show("sendDocument", chat_id, message)
+        return message
+
+    async def forward_message(self, params: dict):
+        chat_id, from_chat_id = int(params["chat_id"]), int(params["from_chat_id"])
+        message = self._message(chat_id, text=f"forwarded {params['message_id']}")
+        self._show("forwardMessage", chat_id, message)
+        self._notify(("forward", from_chat_id, int(params["message_id"])), message)
+        return message
+
+    async def forward_messages(self, params: dict):
+        chat_id, from_chat_id = int(params["chat_id"]), int(params["from_chat_id"])
+        results = []
+        for source_id in params["message_ids"]:
+            message = self._message(chat_id, text=f"forwarded {source_id}")
+            self._show("forwardMessages", chat_id, message)
+            self._notify(("forward", from_chat_id, int(source_id)), message)
+            results.append({"message_id": message["message_id"]})
+        return results
+
+    async def copy_message(self, params: dict):
+        chat_id = int(params["chat_id"])
+        message = self._message(chat_id, text=f"copy {params['message_id']}", caption=params.get("caption"))
+        self._show("copyMessage", chat_id, message)
+        return {"message_id": message["message_id"]}
+
+    async def edit_message(self, params: dict):
+        if "chat_id" not in params:  # inline сообщение
+            return True
+        chat_id = int(params["chat_id"])
+        message = self._message(
+            chat_id,
+            int(params["message_id"]),
+            text=params.get("text"),
+            caption=params.get("caption"),
+            reply_markup=params.get("reply_markup")
+        )
+        self._show("editMessage", chat_id, message)
+        return message
+
+    async def set_message_reaction(self, params: dict):
+        return True
+
+    async def answer_callback_query(self, params: dict):
+        self._notify(("callback", str(params["callback_query_id"])), params)
+        return True
+
+    async def get_chat(self, params: dict):
+        chat_id = int(params["chat_id"])
+        chat = dict(make_chat(chat_id), accent_color_id=0, max_reaction_count=11)
+        if chat_id > 0:
+            chat["bio"] = f"bio пользователя {chat_id}"
+        return chat
+
+    async def get_user_profile_photos(self, params: dict):
+        user_id = int(params["user_id"])
+        return {"total_count": 1, "photos": [make_photo(f"profile-{user_id}")]}
+
+    async def get_me(self, params: dict):
+        return FAKE_BOT
+
+    async def get_updates(self, params: dict):
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+
+        # Подтвержденные обновления удаляем
+        self._updates = [u for u in self._updates if u["update_id"] >= offset]
+
+        deadline = time.monotonic() + timeout
+        while not self._updates:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), remaining)
+            except asyncio.TimeoutError:
+                return []
+
+        return self._updates[:limit]
+
+    async def set_webhook(self, params: dict):
+        self.webhook = params
+        return True
+
+    async def delete_webhook(self, params: dict):
+        self.webhook = {}
+        return True
+
+
+def make_user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+
+def make_message_update(update_id: int, user_id: int, text: str, chat_id: int = None,
+                        reply_to: dict = None) -> dict:
+    """Обновление с текстовым сообщением от пользователя (команды размечаются)"""
+    chat_id = chat_id or user_id
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": make_chat(chat_id),
+        "from": make_user(user_id),
+        "text": text,
+    }
+    if text.startswith("/"):
+        command_length = len(text.split(" ", 1)[0])
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": command_length}]
+    if reply_to:
+        message["reply_to_message"] = reply_to
+
+    return {"update_id": update_id, "message": message}
+
+
+def make_photo_update(update_id: int, user_id: int, file_id: str, caption: str = "") -> dict:
+    """Фото от пользователя в личном чате"""
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": make_chat(user_id),
+        "from": make_user(user_id),
+        "photo": make_photo(file_id),
+    }
+    if caption:
+        message["caption"] = caption
+    return {"update_id": update_id, "message": message}
+
+
+def make_callback_update(update_id: int, user_id: int, data: str, message: dict) -> dict:
+    """Нажатие inline кнопки под сообщением бота message"""
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": make_user(user_id),
+            "chat_instance": str(message["chat"]["id"]),
+            "message": message,
+            "data": data,
+        },
+    }
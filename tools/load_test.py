@@ -0,0 +1,418 @@
+"""
+Сквозной нагрузочный тест бота на локальной заглушке Bot API.
+
+Бот запускается отдельным процессом (python -m bot.main) с временным
+каталогом данных и BOT_API_BASE_URL на заглушку. Заявители проходят
+/start -> город -> ФИО -> extra -> медиа и ждут решения; модераторы
+решают заявки кнопками и командами, отвечают на посты и запрашивают /info.
+
+    python -m tools.load_test --applicants 1000 --concurrency 200
+    python -m tools.load_test --applicants 300 --latency 0.05 --flood-rate 0.02 --output load.json
+
+По умолчанию лимиты отправки бота подняты, чтобы мерить сам бот;
+--telegram-limits оставляет настоящие лимиты Telegram (30/с, 20/мин в группу).
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import signal
+import sys
+import tempfile
+import shutil
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from bot.stats import summarize
+from tools.fake_bot_api import (
+    FakeBotApi, FAKE_TOKEN, make_callback_update, make_message_update, make_photo_update
+)
+
+MODERATION_CHAT_ID = -1001234567890
+MODERATOR_BASE_ID = 900_000
+APPLICANT_BASE_ID = 1_000_000
+CARD_KEYBOARD_RE = re.compile(r"^mod:approve:(\d+)$")
+USER_ID_RE = re.compile(r"user_id: (\d+)")
+DECISION_RE = re.compile(r"заявка \[\d+\] (одобрена|отклонена)", re.IGNORECASE)
+
+
+def message_text(event: dict) -> str:
+    message = event["message"]
+    return message.get("text") or message.get("caption") or ""
+
+
+def keyboard_data(message: dict) -> List[str]:
+    markup = message.get("reply_markup") or {}
+    return [
+        button.get("callback_data", "")
+        for row in markup.get("inline_keyboard", [])
+        for button in row
+    ]
+
+
+class LoadTest:
+    """Заявители, модераторы и замеры задержек по шагам"""
+
+    def __init__(self, api: FakeBotApi, args):
+        self.api = api
+        self.args = args
+        self._update_ids = itertools.count(1)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.timeouts: Dict[str, int] = defaultdict(int)
+        self.updates_sent = 0
+        self.completed = 0
+
+        self._decided_at: Dict[int, float] = {}  # user_id -> время решения модератора
+        self._pending_replies: Dict[int, tuple] = {}  # message_id команды -> (шаг, время)
+        self._posts: asyncio.Queue = asyncio.Queue()
+        self._stop = asyncio.Event()
+
+    def push(self, update: dict) -> float:
+        self.api.push_update(update)
+        self.updates_sent += 1
+        return time.perf_counter()
+
+    def next_id(self) -> int:
+        return next(self._update_ids)
+
+    # ------------------------- заявитель -------------------------
+
+    async def wait_chat(self, user_id: int, backlog: Deque[dict], step: str, started: Optional[float],
+                        predicate: Callable[[dict], bool], timeout: float) -> Optional[dict]:
+        """
+        Ожидание сообщения бота в чате; посторонние откладываются в backlog.
+        Задержка шага - от started до сообщения (и из backlog); started None - без замера
+        """
+        for event in list(backlog):
+            if predicate(event):
+                backlog.remove(event)
+                self._record(step, started, event)
+                return event
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            event = await self.api.expect(("chat", user_id), remaining) if remaining > 0 else None
+            if event is None:
+                self.timeouts[step] += 1
+                return None
+            if predicate(event):
+                self._record(step, started, event)
+                return event
+            event["received"] = time.perf_counter()
+            backlog.append(event)
+
+    def _record(self, step: str, started: Optional[float], event: dict) -> None:
+        """Задержка до получения сообщения; для отложенных - до момента, когда оно пришло"""
+        if started is not None:
+            self.latencies[step].append(max(0.0, event.get("received", time.perf_counter()) - started))
+
+    async def applicant(self, index: int) -> None:
+        user_id = APPLICANT_BASE_ID + index
+        timeout = self.args.timeout
+        backlog: Deque[dict] = deque()
+
+        started = self.push(make_message_update(self.next_id(), user_id, "/start"))
+        prompt = await self.wait_chat(
+            user_id, backlog, "start", started,
+            lambda e: e["method"] == "sendMessage" and "city_Москва" in keyboard_data(e["message"]), timeout
+        )
+        if not prompt:
+            return
+
+        city = "city_Москва" if index % 2 else "city_Не Москва"
+        started = self.push(make_callback_update(self.next_id(), user_id, city, prompt["message"]))
+        if not await self.wait_chat(user_id, backlog, "city", started,
+                                    lambda e: e["method"] == "editMessage", timeout):
+            return
+
+        await asyncio.sleep(self.args.think)
+        started = self.push(make_message_update(self.next_id(), user_id, f"Тестов Тест {index}"))
+        if not await self.wait_chat(user_id, backlog, "fio", started,
+                                    lambda e: e["method"] == "sendMessage", timeout):
+            return
+
+        await asyncio.sleep(self.args.think)
+        started = self.push(make_message_update(self.next_id(), user_id, "Играю в баскетбол 5 лет"))
+        if not await self.wait_chat(user_id, backlog, "extra", started,
+                                    lambda e: "модерац" in message_text(e), timeout):
+            return
+
+        # Медиа уходят в группу модерации пересылкой (через дайджест)
+        for n in range(self.args.media):
+            update_id = self.next_id()
+            started = self.push(make_photo_update(update_id, user_id, f"photo-{user_id}-{n}", f"фото {n}"))
+            forwarded = await self.api.expect(("forward", user_id, update_id), timeout)
+            if forwarded is None:
+                self.timeouts["media"] += 1
+            else:
+                self.latencies["media"].append(time.perf_counter() - started)
+
+        # Решение модератора: уведомление из outbox. Задержка - строка notify
+        # (от действия модератора); здесь считаются только таймауты
+        event = await self.wait_chat(
+            user_id, backlog, "decision", None,
+            lambda e: bool(DECISION_RE.search(message_text(e))), self.args.decision_timeout
+        )
+        if event and user_id in self._decided_at:
+            self.latencies["notify"].append(time.perf_counter() - self._decided_at.pop(user_id))
+        if event:
+            self.completed += 1
+
+    async def run_applicants(self) -> None:
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        interval = 1 / self.args.rate if self.args.rate else 0
+
+        async def run(index: int) -> None:
+            async with semaphore:
+                try:
+                    await self.applicant(index)
+                except Exception as e:
+                    print(f"Заявитель {index}: {e!r}", file=sys.stderr)
+
+        tasks = []
+        for index in range(self.args.applicants):
+            tasks.append(asyncio.create_task(run(index)))
+            if interval:
+                await asyncio.sleep(interval)
+        await asyncio.gather(*tasks)
+
+    # ------------------------- модераторы -------------------------
+
+    async def watch_moderation_chat(self) -> None:
+        """Посты заявок - в очередь решений; ответы на команды - в замеры"""
+        while not self._stop.is_set():
+            event = await self.api.expect(("chat", MODERATION_CHAT_ID), 0.5)
+            if event is None:
+                continue
+            message = event["message"]
+
+            reply_to = (message.get("reply_to_message") or {}).get("message_id")
+            if reply_to in self._pending_replies:
+                step, started = self._pending_replies.pop(reply_to)
+                self.latencies[step].append(time.perf_counter() - started)
+                continue
+
+            if event["method"] in ("sendMessage", "sendPhoto"):
+                for data in keyboard_data(message):
+                    match = CARD_KEYBOARD_RE.match(data)
+                    if match:
+                        user = USER_ID_RE.search(message_text(event))
+                        await self._posts.put((match.group(1), int(user.group(1)) if user else 0, message))
+
+    async def moderator(self, index: int) -> None:
+        moderator_id = MODERATOR_BASE_ID + index
+        rng = random.Random(index)
+
+        while True:
+            card_number, user_id, post = await self._posts.get()
+            await asyncio.sleep(self.args.moderator_delay)
+
+            if rng.random() < self.args.info_rate:
+                update_id = self.next_id()
+                self._pending_replies[update_id] = ("info", time.perf_counter())
+                self.push(make_message_update(update_id, moderator_id, f"/info {card_number}", MODERATION_CHAT_ID))
+
+            if rng.random() < self.args.reply_rate:
+                # Ответ на пост уходит заявителю, бот ставит реакцию
+                self.push(make_message_update(
+                    self.next_id(), moderator_id, "Уточните, пожалуйста, рост", MODERATION_CHAT_ID, reply_to=post
+                ))
+
+            action = "approve" if rng.random() < self.args.approve_share else "reject"
+            self._decided_at[user_id] = time.perf_counter()
+            update_id = self.next_id()
+            if rng.random() < self.args.button_share:
+                started = self.push(make_callback_update(
+                    update_id, moderator_id, f"mod:{action}:{card_number}", post
+                ))
+                if await self.api.expect(("callback", str(update_id)), self.args.timeout) is None:
+                    self.timeouts["button"] += 1
+                else:
+                    self.latencies["button"].append(time.perf_counter() - started)
+            else:
+                self._pending_replies[update_id] = ("command", time.perf_counter())
+                self.push(make_message_update(
+                    update_id, moderator_id, f"/{action} {card_number}", MODERATION_CHAT_ID
+                ))
+
+    # ------------------------- прогон -------------------------
+
+    async def run(self) -> float:
+        watcher = asyncio.create_task(self.watch_moderation_chat())
+        moderators = [asyncio.create_task(self.moderator(i)) for i in range(self.args.moderators)]
+
+        started = time.perf_counter()
+        await self.run_applicants()
+        elapsed = time.perf_counter() - started
+
+        self._stop.set()
+        for task in moderators:
+            task.cancel()
+        await asyncio.gather(watcher, *moderators, return_exceptions=True)
+        self.timeouts["command"] += len(self._pending_replies)
+        return elapsed
+
+
+def bot_environment(api: FakeBotApi, data_dir: Path, args) -> Dict[str, str]:
+    env = dict(
+        os.environ,
+        BOT_TOKEN=FAKE_TOKEN,
+        BOT_API_BASE_URL=api.base_url,
+        MODERATION_CHAT_ID=str(MODERATION_CHAT_ID),
+        DATA_DIR=str(data_dir),
+        ENVIRONMENT="production",
+        UPDATE_MODE="polling",
+        WORKERS=str(args.workers),
+        LEADER_ELECTION="0",
+        METRICS_PORT=str(args.metrics_port),
+        DIGEST_WINDOW=str(args.digest_window),
+        PYTHONUNBUFFERED="1",
+    )
+    if not args.telegram_limits:
+        env.update(SEND_GLOBAL_RATE="100000", SEND_GROUP_RATE_PER_MINUTE="6000000")
+    return env
+
+
+async def start_bot(api: FakeBotApi, data_dir: Path, args):
+    """Запуск python -m bot.main и ожидание первого getUpdates"""
+    log = open(data_dir / "bot-stdout.log", "wb")
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "bot.main",
+        cwd=Path(__file__).parent.parent,
+        env=bot_environment(api, data_dir, args),
+        stdout=log, stderr=asyncio.subprocess.STDOUT
+    )
+
+    deadline = time.monotonic() + args.startup_timeout
+    while not api.calls.get("getUpdates"):
+        if process.returncode is not None or time.monotonic() > deadline:
+            log.close()
+            output = (data_dir / "bot-stdout.log").read_text(encoding="utf-8", errors="replace")
+            raise RuntimeError(f"Бот не запустился:\n{output[-3000:]}")
+        await asyncio.sleep(0.1)
+    return process, log
+
+
+async def stop_bot(process) -> int:
+    if process.returncode is None:
+        process.send_signal(signal.SIGTERM)
+        try:
+            await asyncio.wait_for(process.wait(), 20)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+    return process.returncode
+
+
+def build_report(test: LoadTest, api: FakeBotApi, elapsed: float, args) -> Dict[str, Any]:
+    steps = {}
+    for step, values in test.latencies.items():
+        if values:
+            steps[step] = {key: round(value * 1000, 2) if key != "count" else value
+                           for key, value in summarize(values).items()}
+    return {
+        "applicants": args.applicants,
+        "completed": test.completed,
+        "elapsed_s": round(elapsed, 2),
+        "updates": test.updates_sent,
+        "updates_per_sec": round(test.updates_sent / elapsed, 1) if elapsed else 0,
+        "applicants_per_sec": round(test.completed / elapsed, 2) if elapsed else 0,
+        "latency_ms": steps,
+        "timeouts": {step: count for step, count in test.timeouts.items() if count},
+        "api_calls": dict(sorted(api.calls.items())),
+        "flooded": dict(api.flooded),
+        "settings": {
+            key: value for key, value in vars(args).items() if key not in ("output", "data_dir", "keep")
+        },
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\nЗаявителей: {report['completed']}/{report['applicants']} за {report['elapsed_s']}с")
+    print(f"Обновлений: {report['updates']} ({report['updates_per_sec']}/с), "
+          f"заявителей в секунду: {report['applicants_per_sec']}")
+
+    print(f"\n{'шаг':<14}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  мс")
+    for step, stats in report["latency_ms"].items():
+        print(f"{step:<14}{stats['count']:>7}{stats['p50']:>10.1f}{stats['p95']:>10.1f}"
+              f"{stats['p99']:>10.1f}{stats['max']:>10.1f}")
+
+    if report["timeouts"]:
+        print(f"\nТаймауты: {report['timeouts']}")
+    if report["flooded"]:
+        print(f"Отдано 429: {report['flooded']}")
+    print(f"Вызовы Bot API: {report['api_calls']}")
+
+
+async def main(args) -> int:
+    # Удаляется после прогона только созданный здесь временный каталог
+    created = not args.data_dir
+    data_dir = Path(tempfile.mkdtemp(prefix="bot-load-")) if created else Path(args.data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+
+    api = FakeBotApi(latency=args.latency, flood_rate=args.flood_rate, retry_after=args.retry_after)
+    await api.start()
+    print(f"Заглушка Bot API: {api.base_url}, данные бота: {data_dir}")
+
+    process = log = None
+    try:
+        process, log = await start_bot(api, data_dir, args)
+        test = LoadTest(api, args)
+        elapsed = await test.run()
+    finally:
+        if process:
+            code = await stop_bot(process)
+            print(f"Бот остановлен (код {code})")
+        if log:
+            log.close()
+        await api.stop()
+
+    report = build_report(test, api, elapsed, args)
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\nОтчет: {args.output}")
+
+    if created and not args.keep:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return 0 if report["completed"] == args.applicants else 1
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота на заглушке Bot API")
+    parser.add_argument("--applicants", type=int, default=200, help="заявителей")
+    parser.add_argument("--concurrency", type=int, default=50, help="заявителей одновременно")
+    parser.add_argument("--rate", type=float, default=0, help="новых заявителей в секунду (0 - без паузы)")
+    parser.add_argument("--media", type=int, default=2, help="фото от каждого заявителя")
+    parser.add_argument("--think", type=float, default=0.0, help="пауза заявителя между шагами, секунд")
+    parser.add_argument("--moderators", type=int, default=2)
+    parser.add_argument("--moderator-delay", type=float, default=0.0, help="пауза модератора перед решением")
+    parser.add_argument("--button-share", type=float, default=0.5, help="доля решений кнопкой (иначе командой)")
+    parser.add_argument("--approve-share", type=float, default=0.8)
+    parser.add_argument("--info-rate", type=float, default=0.2, help="доля заявок с /info")
+    parser.add_argument("--reply-rate", type=float, default=0.2, help="доля заявок с ответом на пост")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка сети в одну сторону, секунд")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="доля вызовов отправки с ответом 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after в ответах 429, секунд")
+    parser.add_argument("--telegram-limits", action="store_true", help="настоящие лимиты отправки Telegram")
+    parser.add_argument("--digest-window", type=float, default=1.0, help="окно дайджеста бота, секунд")
+    parser.add_argument("--workers", type=int, default=1, help="воркеров бота (кластер при > 1)")
+    parser.add_argument("--metrics-port", type=int, default=0, help="порт метрик бота (0 - выключены)")
+    parser.add_argument("--timeout", type=float, default=30, help="ожидание ответа на шаг, секунд")
+    parser.add_argument("--decision-timeout", type=float, default=120, help="ожидание решения, секунд")
+    parser.add_argument("--startup-timeout", type=float, default=30)
+    parser.add_argument("--data-dir", help="каталог данных бота (по умолчанию временный)")
+    parser.add_argument("--keep", action="store_true", help="не удалять временный каталог данных")
+    parser.add_argument("--output", help="отчет в JSON")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main(parse_args())))
@@ -0,0 +1,275 @@
+"""
+Воспроизведение записанных обновлений (RECORD_UPDATES=1) через все обработчики
+бота: временный каталог данных, Bot API - локальная заглушка.
+Отчет - пропускная способность и задержка обработки по видам обновлений.
+
+    python -m tools.replay                                  # data/recordings/updates*.jsonl*
+    python -m tools.replay day.jsonl --speed 10             # в 10 раз быстрее записи
+    python -m tools.replay day.jsonl --speed 0 --seed-data backup/data --output replay.json
+
+--speed 1 - темп записи, 0 - без пауз. --seed-data копирует снимок data/
+(карточки, счетчик) во временный каталог: воспроизведение идет поверх него,
+рабочие данные не затрагиваются.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from bot.stats import summarize
+from tools.fake_bot_api import FakeBotApi, FAKE_TOKEN
+
+DEFAULT_RECORDINGS = Path(__file__).parent.parent / "data" / "recordings"
+
+
+def read_records(paths: List[Path]) -> List[Tuple[float, Dict[str, Any]]]:
+    """Записи всех файлов (включая ротированные и файлы воркеров) по времени получения"""
+    records = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    records.append((float(record["t"]), record["update"]))
+                except (ValueError, KeyError, TypeError):
+                    continue
+    records.sort(key=lambda record: record[0])
+    return records
+
+
+def find_recordings(files: List[str]) -> List[Path]:
+    if files:
+        return [Path(file) for file in files]
+    return sorted(DEFAULT_RECORDINGS.glob("updates*.jsonl*"))
+
+
+def detect_moderation_chat(records: List[Tuple[float, Dict[str, Any]]]) -> Optional[int]:
+    """Группа модерации - самый частый групповой чат с командами модераторов"""
+    chats: Counter = Counter()
+    for _, data in records:
+        message = data.get("message") or {}
+        chat_id = (message.get("chat") or {}).get("id", 0)
+        if chat_id < 0 and (message.get("text") or "").startswith("/"):
+            chats[chat_id] += 1
+    return chats.most_common(1)[0][0] if chats else None
+
+
+def update_kind(update) -> str:
+    """Вид обновления для отчета: команда, префикс кнопки, текст или медиа"""
+    if update.callback_query:
+        data = update.callback_query.data or ""
+        return "callback " + data.split(":", 1)[0].split("_", 1)[0]
+    message = update.effective_message
+    if message is None:
+        return "other"
+    if message.text:
+        if message.text.startswith("/"):
+            return message.text.split(maxsplit=1)[0].split("@", 1)[0]
+        return "text"
+    return "media"
+
+
+class Replayer:
+    """Подача записи в update_queue с исходными интервалами и замер обработки"""
+
+    def __init__(self, application, speed: float):
+        self.application = application
+        self.speed = speed
+        self.fed_at: Dict[int, Tuple[float, str]] = {}
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.feed_lag: List[float] = []
+        self.drained = asyncio.Event()
+        self.fed = 0
+        self._feeding = True
+
+        # Время от постановки в очередь до завершения обработчиков обновления
+        processor = application.update_processor
+        process = processor.do_process_update
+
+        async def timed(update, coroutine) -> None:
+            try:
+                await process(update, coroutine)
+            finally:
+                fed = self.fed_at.pop(getattr(update, "update_id", None), None)
+                if fed:
+                    self.latencies[fed[1]].append(time.perf_counter() - fed[0])
+                if not self._feeding and not self.fed_at:
+                    self.drained.set()
+
+        processor.do_process_update = timed
+
+    async def feed(self, records: Iterator[Tuple[float, Dict[str, Any]]]) -> None:
+        from telegram import Update
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        origin = None
+        for received, data in records:
+            origin = received if origin is None else origin
+            if self.speed:
+                delay = (received - origin) / self.speed - (loop.time() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    self.feed_lag.append(-delay)
+
+            update = Update.de_json(data, self.application.bot)
+            self.fed_at[update.update_id] = (time.perf_counter(), update_kind(update))
+            await self.application.update_queue.put(update)
+            self.fed += 1
+
+        self._feeding = False
+        if not self.fed_at:
+            self.drained.set()
+
+
+async def replay(records, args) -> Dict[str, Any]:
+    api = FakeBotApi(latency=args.latency)
+    await api.start()
+    os.environ["BOT_API_BASE_URL"] = api.base_url
+
+    # Импорт после настройки окружения: Config читает его при импорте
+    from bot.main import build_application, setup_logging
+    from bot.metrics import HANDLER_ERRORS
+
+    setup_logging()
+    application = build_application(with_updater=False)
+    replayer = Replayer(application, args.speed)
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+    started = time.perf_counter()
+    try:
+        await replayer.feed(records)
+        try:
+            await asyncio.wait_for(replayer.drained.wait(), args.drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"Не обработано за {args.drain_timeout}с: {len(replayer.fed_at)}", file=sys.stderr)
+        elapsed = time.perf_counter() - started
+    finally:
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        await api.stop()
+
+    def to_ms(values: List[float]) -> Dict[str, float]:
+        return {key: value if key == "count" else round(value * 1000, 2)
+                for key, value in summarize(values).items()}
+
+    all_latencies = [value for values in replayer.latencies.values() for value in values]
+    recorded_span = records[-1][0] - records[0][0] if records else 0
+    return {
+        "updates": replayer.fed,
+        "processed": len(all_latencies),
+        "unfinished": len(replayer.fed_at),
+        "recorded_span_s": round(recorded_span, 2),
+        "elapsed_s": round(elapsed, 2),
+        "speed": args.speed,
+        "updates_per_sec": round(len(all_latencies) / elapsed, 1) if elapsed else 0,
+        "latency_ms": to_ms(all_latencies) if all_latencies else {},
+        "by_kind_ms": {
+            kind: to_ms(values)
+            for kind, values in sorted(replayer.latencies.items(), key=lambda item: -len(item[1]))
+        },
+        "feed_lag_ms": to_ms(replayer.feed_lag) if replayer.feed_lag else {},
+        "handler_errors": int(sum(HANDLER_ERRORS._values.values())),
+        "api_calls": dict(sorted(api.calls.items())),
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\nОбновлений: {report['processed']}/{report['updates']} за {report['elapsed_s']}с "
+          f"(запись: {report['recorded_span_s']}с, скорость x{report['speed'] or 'max'})")
+    print(f"Пропускная способность: {report['updates_per_sec']} обновлений/с, "
+          f"ошибок обработчиков: {report['handler_errors']}")
+
+    rows = [("все", report["latency_ms"])] + list(report["by_kind_ms"].items())
+    print(f"\n{'вид':<24}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  мс")
+    for kind, stats in rows:
+        if stats:
+            print(f"{kind[:23]:<24}{stats['count']:>7}{stats['p50']:>10.1f}{stats['p95']:>10.1f}"
+                  f"{stats['p99']:>10.1f}{stats['max']:>10.1f}")
+
+    if report["feed_lag_ms"]:
+        print(f"\nОтставание подачи от темпа записи: p99 {report['feed_lag_ms']['p99']:.1f}мс")
+    print(f"Вызовы Bot API: {report['api_calls']}")
+
+
+def main(args) -> int:
+    paths = find_recordings(args.files)
+    records = read_records(paths)[:args.limit or None]
+    if not records:
+        print("Записей обновлений не найдено (RECORD_UPDATES=1 в .env бота)")
+        return 1
+
+    # Удаляется после прогона только созданный здесь временный каталог;
+    # снимок копируется лишь в пустой каталог, чтобы не смешать его с чужими данными
+    created = not args.data_dir
+    data_dir = Path(tempfile.mkdtemp(prefix="bot-replay-")) if created else Path(args.data_dir)
+    if args.seed_data and not created and data_dir.exists() and any(data_dir.iterdir()):
+        print(f"Каталог {data_dir} не пуст: для --seed-data укажите пустой или новый каталог")
+        return 1
+    if args.seed_data:
+        shutil.copytree(args.seed_data, data_dir, dirs_exist_ok=True,
+                        ignore=shutil.ignore_patterns("logs", "recordings", "*.lease"))
+
+    moderation_chat = args.moderation_chat_id or detect_moderation_chat(records)
+    os.environ.update(
+        DATA_DIR=str(data_dir),
+        BOT_TOKEN=FAKE_TOKEN,
+        ENVIRONMENT="replay",
+        RECORD_UPDATES="0",
+        METRICS_PORT="0",
+        LEADER_ELECTION="0",
+        WORKERS="1",
+    )
+    if moderation_chat:
+        os.environ["MODERATION_CHAT_ID"] = str(moderation_chat)
+    if not args.telegram_limits:
+        os.environ.update(SEND_GLOBAL_RATE="100000", SEND_GROUP_RATE_PER_MINUTE="6000000")
+
+    print(f"Файлов: {len(paths)}, обновлений: {len(records)}, группа модерации: {moderation_chat}")
+    print(f"Каталог данных: {data_dir}")
+    try:
+        report = asyncio.run(replay(records, args))
+    finally:
+        if created and not args.keep:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"\nОтчет: {args.output}")
+    return 0 if not report["unfinished"] else 1
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных обновлений")
+    parser.add_argument("files", nargs="*", help="файлы записи (по умолчанию data/recordings/updates*.jsonl*)")
+    parser.add_argument("--speed", type=float, default=1.0, help="ускорение относительно записи (0 - без пауз)")
+    parser.add_argument("--limit", type=int, default=0, help="не больше N обновлений")
+    parser.add_argument("--seed-data", help="снимок data/, поверх которого идет воспроизведение")
+    parser.add_argument("--moderation-chat-id", type=int, help="группа модерации (по умолчанию - из записи)")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка заглушки Bot API, секунд")
+    parser.add_argument("--telegram-limits", action="store_true", help="настоящие лимиты отправки Telegram")
+    parser.add_argument("--drain-timeout", type=float, default=120, help="ожидание обработки после подачи, секунд")
+    parser.add_argument("--data-dir", help="каталог данных (по умолчанию временный)")
+    parser.add_argument("--keep", action="store_true", help="не удалять временный каталог данных")
+    parser.add_argument("--output", help="отчет в JSON")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(parse_args()))
@@ -0,0 +1,154 @@
+"""
+Самопроверка режима webhook и сравнение задержки доставки обновлений
+webhook против polling на локальной заглушке Bot API.
+
+    python -m tools.webhook_selftest --updates 500 --rate 200 --rtt 0.05
+
+--rtt имитирует сетевую задержку до Telegram: запрос к заглушке и ответ
+идут по rtt/2 каждый, доставка webhook задерживается на rtt/2.
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Dict, List
+
+import httpx
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+
+from bot.stats import summarize
+from bot.webhook import WebhookServer, application_deliver
+from tools.fake_bot_api import FakeBotApi, FAKE_TOKEN, make_message_update
+
+SECRET = "selftest_secret"
+PATH = "/telegram"
+
+
+class LatencyRecorder:
+    """Время от отправки обновления до вызова обработчика"""
+
+    def __init__(self):
+        self.sent_at: Dict[int, float] = {}
+        self.latencies: List[float] = []
+        self.done = asyncio.Event()
+        self.expected = 0
+
+    def reset(self, expected: int) -> None:
+        self.sent_at.clear()
+        self.latencies = []
+        self.expected = expected
+        self.done.clear()
+
+    async def handle(self, update: Update, context) -> None:
+        sent = self.sent_at.pop(update.update_id, None)
+        if sent is not None:
+            self.latencies.append(time.perf_counter() - sent)
+        if len(self.latencies) >= self.expected:
+            self.done.set()
+
+
+async def check_secret(client: httpx.AsyncClient, url: str) -> bool:
+    """Запрос без секрета и с неверным секретом должен получить 403"""
+    update = make_message_update(1, 1, "secret check")
+    missing = await client.post(url, json=update)
+    wrong = await client.post(url, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"})
+    return missing.status_code == 403 and wrong.status_code == 403
+
+
+async def run_webhook_phase(application: Application, recorder: LatencyRecorder, args) -> dict:
+    server = WebhookServer(application_deliver(application), "127.0.0.1", 0, PATH, SECRET, args.max_connections)
+    await server.start()
+    url = f"http://127.0.0.1:{server.port}{PATH}"
+
+    limits = httpx.Limits(max_connections=args.max_connections)
+    async with httpx.AsyncClient(limits=limits) as client:
+        secret_ok = await check_secret(client, url)
+
+        recorder.reset(args.updates)
+        headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+
+        async def deliver(update: dict) -> None:
+            recorder.sent_at[update["update_id"]] = time.perf_counter()
+            await asyncio.sleep(args.rtt / 2)
+            response = await client.post(url, json=update, headers=headers)
+            response.raise_for_status()
+
+        tasks = []
+        for i in range(args.updates):
+            update = make_message_update(10_000 + i, 1000 + i % 50, f"webhook {i}")
+            tasks.append(asyncio.create_task(deliver(update)))
+            await asyncio.sleep(1 / args.rate)
+
+        await asyncio.gather(*tasks)
+        await asyncio.wait_for(recorder.done.wait(), args.timeout)
+
+    await server.stop()
+    return {"secret_ok": secret_ok, "rejected": server.rejected, **summarize(recorder.latencies)}
+
+
+async def run_polling_phase(application: Application, api: FakeBotApi, recorder: LatencyRecorder, args) -> dict:
+    recorder.reset(args.updates)
+    await application.updater.start_polling(poll_interval=0, timeout=10)
+
+    for i in range(args.updates):
+        update = make_message_update(20_000 + i, 1000 + i % 50, f"polling {i}")
+        recorder.sent_at[update["update_id"]] = time.perf_counter()
+        api.push_update(update)
+        await asyncio.sleep(1 / args.rate)
+
+    await asyncio.wait_for(recorder.done.wait(), args.timeout)
+    await application.updater.stop()
+    return {"get_updates_calls": api.calls.get("getUpdates", 0), **summarize(recorder.latencies)}
+
+
+def print_report(name: str, result: dict) -> None:
+    print(f"\n{name}:")
+    for key, value in result.items():
+        if isinstance(value, float):
+            print(f"  {key}: {value * 1000:.2f} мс")
+        else:
+            print(f"  {key}: {value}")
+
+
+async def main(args) -> int:
+    api = FakeBotApi(latency=args.rtt / 2)
+    await api.start()
+
+    recorder = LatencyRecorder()
+    application = Application.builder().token(FAKE_TOKEN).base_url(api.base_url).build()
+    application.add_handler(TypeHandler(Update, recorder.handle))
+
+    try:
+        async with application:
+            await application.start()
+            webhook = await run_webhook_phase(application, recorder, args)
+            polling = await run_polling_phase(application, api, recorder, args)
+            await application.stop()
+    finally:
+        await api.stop()
+
+    print(f"Обновлений: {args.updates}, темп: {args.rate}/с, RTT: {args.rtt * 1000:.0f} мс")
+    print_report("Webhook", webhook)
+    print_report("Polling", polling)
+
+    if not webhook["secret_ok"]:
+        print("\n❌ Webhook принял запрос без верного secret token")
+        return 1
+
+    print("\n✅ Самопроверка webhook пройдена")
+    return 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Самопроверка webhook и сравнение с polling")
+    parser.add_argument("--updates", type=int, default=300, help="обновлений на каждый режим")
+    parser.add_argument("--rate", type=float, default=200, help="обновлений в секунду")
+    parser.add_argument("--rtt", type=float, default=0.05, help="имитируемый RTT до Telegram, секунд")
+    parser.add_argument("--max-connections", type=int, default=40)
+    parser.add_argument("--timeout", type=float, default=60)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main(parse_args())))